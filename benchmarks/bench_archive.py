@@ -0,0 +1,169 @@
+"""
+Primary database size and query latency before and after archiving
+inactive conversations (python manage.py archive_conversations).
+
+Seeds --conversations conversations of --messages messages each, of which
+--inactive (fraction) are older than the archive threshold, then measures
+the database size, a session's chat page, the sidebar query and a full
+message count; archives (and vacuums), measures again, and times the lazy
+restore of an archived conversation. Also checks that live traffic keeps
+going while the archive job runs (--live-writers threads sending messages).
+
+    python benchmarks/bench_archive.py --conversations 20000 --messages 40 --inactive 0.8
+    DB_PROFILE=postgres python benchmarks/bench_archive.py
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+from datetime import timedelta
+
+from common import Timer, setup_django, setup_test_database, summarize
+
+work_dir = tempfile.mkdtemp(prefix='farmbuddy-archive-')
+os.environ['CHAT_ARCHIVE_DB'] = os.path.join(work_dir, 'archive.sqlite3')
+setup_django()
+from django.conf import settings
+
+# A file, not memory: its size is what we measure
+teardown = setup_test_database(
+    os.path.join(work_dir, 'bench.sqlite3') if settings.DB_PROFILE == 'sqlite' else None)
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.utils import timezone
+
+from chat.archive import conversation_archive
+from chat.models import Conversation, Message
+
+
+def database_size():
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT pg_total_relation_size('chat_message') + pg_total_relation_size('chat_conversation')")
+            return cursor.fetchone()[0]
+        cursor.execute("PRAGMA page_count")
+        pages = cursor.fetchone()[0]
+        cursor.execute("PRAGMA page_size")
+        return pages * cursor.fetchone()[0]
+
+
+def seed(args, session_key):
+    rng = random.Random(11)
+    now = timezone.now()
+    with Timer() as timer:
+        for start in range(0, args.conversations, args.batch_size):
+            count = min(args.batch_size, args.conversations - start)
+            conversations = []
+            for i in range(start, start + count):
+                inactive = rng.random() < args.inactive
+                age = timedelta(days=rng.randrange(args.days + 1, args.days * 4) if inactive
+                                else rng.randrange(args.days))
+                conversations.append(Conversation(
+                    session_key=session_key if i % 500 == 0 else f"s{i % 5000:039d}",
+                    title=f"Chat {i}", created_at=now - age))
+            conversations = Conversation.objects.bulk_create(conversations)
+            Message.objects.bulk_create([
+                Message(conversation=conversation, role='user' if j % 2 == 0 else 'assistant',
+                        content=f"Question {j}: when should I apply NPK 15-15-15 to maize on sandy loam? " * 4,
+                        created_at=conversation.created_at + timedelta(minutes=j))
+                for conversation in conversations for j in range(args.messages)], batch_size=5000)
+            # updated_at is auto_now: backdate it like real inactivity
+            for conversation in conversations:
+                Conversation.objects.filter(id=conversation.id).update(
+                    updated_at=conversation.created_at + timedelta(minutes=args.messages))
+    print(f"seeded {args.conversations} conversations, {args.conversations * args.messages} messages "
+          f"in {timer.elapsed:.0f}s")
+
+
+def measure(label, args, client, conversation, session_key):
+    print(f"--- {label}: database {database_size() / (1024 * 1024):.1f}MB, "
+          f"{Message.objects.count()} message rows")
+    timings = []
+    for _ in range(args.repeat):
+        cache.clear()
+        with Timer() as timer:
+            client.get(f'/chat/{conversation.id}/')
+        timings.append(timer.elapsed)
+    summarize("chat page", timings)
+
+    for name, query in [
+        ("sidebar", lambda: list(Conversation.objects.filter(session_key=session_key)
+                                 .order_by('-updated_at').values('id', 'title')[:20])),
+        ("message count", lambda: Message.objects.count()),
+        ("messages LIKE scan", lambda: Message.objects.filter(content__contains='irrigation').exists()),
+    ]:
+        timings = []
+        for _ in range(args.repeat):
+            with Timer() as timer:
+                query()
+            timings.append(timer.elapsed)
+        summarize(name, timings)
+
+
+def live_writer(conversation_id, stop, timings):
+    close_old_connections()
+    while not stop.is_set():
+        with Timer() as timer:
+            Message.objects.create(conversation_id=conversation_id, role='user', content="Is it going to rain?")
+        timings.append(timer.elapsed)
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--conversations', type=int, default=5000)
+    parser.add_argument('--messages', type=int, default=40, help='messages per conversation')
+    parser.add_argument('--inactive', type=float, default=0.8, help='fraction of conversations to archive')
+    parser.add_argument('--days', type=int, default=settings.CHAT_ARCHIVE_AFTER_DAYS)
+    parser.add_argument('--archive-batch', type=int, default=100)
+    parser.add_argument('--live-writers', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    client = Client()
+    session = client.session
+    session.save()
+    seed(args, session.session_key)
+    live = Conversation.objects.filter(session_key=session.session_key, archived_at__isnull=True) \
+        .order_by('-updated_at').first()
+    measure("before", args, client, live, session.session_key)
+
+    stop = threading.Event()
+    write_timings = []
+    writers = [threading.Thread(target=live_writer, args=(live.id, stop, write_timings))
+               for _ in range(args.live_writers)]
+    for writer in writers:
+        writer.start()
+    with Timer() as timer:
+        call_command('archive_conversations', days=args.days, batch_size=args.archive_batch, pause=0)
+    stop.set()
+    for writer in writers:
+        writer.join()
+    print(f"archive job: {timer.elapsed:.1f}s")
+    summarize("live inserts during the job", write_timings)
+
+    call_command('archive_conversations', days=args.days, vacuum=True, max_batches=1)  # nothing left: just VACUUM
+    conversations, messages, compressed = conversation_archive.stats()
+    print(f"archive: {conversations} conversations, {messages} messages, "
+          f"{compressed / (1024 * 1024):.1f}MB compressed "
+          f"({os.path.getsize(conversation_archive.path) / (1024 * 1024):.1f}MB file)")
+    measure("after", args, client, live, session.session_key)
+
+    timings = []
+    for conversation in Conversation.objects.filter(archived_at__isnull=False)[:args.repeat]:
+        with Timer() as timer:
+            conversation_archive.restore(conversation)
+        timings.append(timer.elapsed)
+    summarize(f"lazy restore ({args.messages} messages)", timings)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
@@ -0,0 +1,161 @@
+"""
+Mix voice-note and text traffic through the Telegram bot and compare one
+shared thread pool (the previous run_in_executor(None, ...) behaviour) with
+the per-workload executors in utils.executors.
+
+Speech-to-text is replaced by CPU work of --stt-ms per note and Gemini by a
+--llm-ms wait, so the numbers show scheduling, not model speed. Reports
+latency per traffic type, shed requests and executor queue times.
+
+    python benchmarks/bench_bot_executors.py --texts 100 --voices 60
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import time
+
+from common import FakeTelegramAPI, setup_test_database, summarize
+
+teardown = setup_test_database()
+
+from django.test import override_settings
+from telegram import Update
+
+import chat.telegram_bot as telegram_bot
+from utils.executors import BoundedExecutor
+
+TOKEN = "123456:benchmark"
+
+
+class FakeSpeechEngine:
+    def __init__(self, cpu_seconds):
+        self.cpu_seconds = cpu_seconds
+
+    def transcribe(self, audio_bytes, language='en'):
+        # hashlib releases the GIL on large buffers, like ffmpeg/torch work would
+        block = os.urandom(1024 * 1024)
+        deadline = time.perf_counter() + self.cpu_seconds
+        while time.perf_counter() < deadline:
+            hashlib.sha256(block).digest()
+        return "How do I treat maize rust?"
+
+
+def fake_gemini(seconds):
+    def ask_gemini(history, weather_context=None, stream=False, language='en'):
+        time.sleep(seconds)
+        answer = f"Answer to: {history[-1]['content']}"
+        return iter([answer]) if stream else answer
+    return ask_gemini
+
+
+def make_update(update_id, chat_id, voice):
+    message = {
+        'message_id': update_id, 'date': int(time.time()),
+        'chat': {'id': chat_id, 'type': 'private'},
+        'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Farmer'},
+    }
+    if voice:
+        message['voice'] = {'file_id': 'voice', 'file_unique_id': 'voice', 'duration': 8}
+    else:
+        message['text'] = "When should I plant cassava?"
+    return {'update_id': update_id, 'message': message}
+
+
+def is_final(text):
+    return text.startswith("Answer to:") or text == telegram_bot.BUSY_MESSAGE or text.startswith(("Error", "Sorry"))
+
+
+async def run_traffic(api, args, label, chat_offset):
+    bot = telegram_bot.FarmBuddyBot()
+    application = bot.build_application(TOKEN, webhook=True)
+    kinds = ['voice'] * args.voices + ['text'] * args.texts
+    random.Random(3).shuffle(kinds)
+
+    sent = {}
+    async with application:
+        await application.start()
+        for i, kind in enumerate(kinds):
+            chat_id = chat_offset + i
+            sent[chat_id] = (kind, time.perf_counter())
+            await application.update_queue.put(Update.de_json(make_update(chat_id, chat_id, kind == 'voice'),
+                                                              application.bot))
+            await asyncio.sleep(args.interval)
+
+        deadline = time.perf_counter() + args.timeout
+        pending = set(sent)
+        while pending and time.perf_counter() < deadline:
+            pending = {c for c in pending if not any(is_final(text) for _, text in api.replies.get(c, []))}
+            await asyncio.sleep(0.05)
+        await application.stop()
+    bot.sessions.close()
+
+    latencies = {'text': [], 'voice': []}
+    shed = {'text': 0, 'voice': 0}
+    for chat_id, (kind, started) in sent.items():
+        final = [(t, text) for t, text in api.replies.get(chat_id, []) if is_final(text)]
+        if not final:
+            continue
+        if final[0][1] == telegram_bot.BUSY_MESSAGE:
+            shed[kind] += 1
+        else:
+            latencies[kind].append(final[0][0] - started)
+
+    print(f"--- {label}")
+    for kind in ('text', 'voice'):
+        summarize(f"{kind} reply latency", latencies[kind])
+        print(f"{kind}: shed {shed[kind]}")
+
+
+def use_executors(llm, audio, weather):
+    telegram_bot.llm_executor = llm
+    telegram_bot.audio_executor = audio
+    telegram_bot.weather_executor = weather
+
+
+async def run(api, args):
+    shared = BoundedExecutor("shared", min(32, (os.cpu_count() or 1) + 4), 10 ** 9)
+    use_executors(shared, shared, shared)
+    await run_traffic(api, args, "shared default-style pool", 100000)
+    print(shared.stats())
+
+    llm = BoundedExecutor("llm", args.llm_workers, args.llm_queue)
+    audio = BoundedExecutor("audio", args.audio_workers, args.audio_queue)
+    use_executors(llm, audio, BoundedExecutor("weather", 8, 32))
+    await run_traffic(api, args, "per-workload executors", 200000)
+    print(llm.stats())
+    print(audio.stats())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--texts', type=int, default=100)
+    parser.add_argument('--voices', type=int, default=60)
+    parser.add_argument('--interval', type=float, default=0.01, help='seconds between incoming updates')
+    parser.add_argument('--llm-ms', type=float, default=300)
+    parser.add_argument('--stt-ms', type=float, default=500)
+    parser.add_argument('--llm-workers', type=int, default=16)
+    parser.add_argument('--llm-queue', type=int, default=64)
+    parser.add_argument('--audio-workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--audio-queue', type=int, default=8)
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    api = FakeTelegramAPI().start()
+    api.files = {'voice': b'OggS' + bytes(4000)}
+    os.environ['TELEGRAM_BOT_TOKEN'] = TOKEN
+    telegram_bot.ask_gemini = fake_gemini(args.llm_ms / 1000)
+    engine = FakeSpeechEngine(args.stt_ms / 1000)
+    telegram_bot.get_speech_engine = lambda name=None: engine
+
+    with override_settings(TELEGRAM_API_URL=api.url, TELEGRAM_STREAM_REPLIES=False):
+        asyncio.run(run(api, args))
+    api.shutdown()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
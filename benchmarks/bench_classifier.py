@@ -0,0 +1,77 @@
+"""
+Benchmark the local plant disease pre-classifier on CPU: throughput
+(images/sec, single and batched) and top-1/top-k accuracy on a labelled sample
+set laid out as one folder per label:
+
+    samples/plants/tomato_early_blight/*.jpg
+    samples/plants/cassava_mosaic_disease/*.jpg
+
+    PLANT_CLASSIFIER_MODEL=models/plant.onnx PLANT_CLASSIFIER_LABELS=models/labels.txt \\
+        python benchmarks/bench_classifier.py samples/plants --batch-size 16
+"""
+import argparse
+import os
+import time
+
+from common import summarize
+
+from utils.image_processing import preprocess_image
+from utils.plant_classifier import (
+    PLANT_CLASSIFIER_LABELS, PLANT_CLASSIFIER_MODEL, SHORT_CIRCUIT_CONFIDENCE,
+    TOP_K, load_plant_classifier, normalize_label, templated_answer,
+)
+
+
+def load_samples(root):
+    samples = []
+    for label in sorted(os.listdir(root)):
+        folder = os.path.join(root, label)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            samples.append((normalize_label(label), preprocess_image(os.path.join(folder, name)).image))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('samples')
+    parser.add_argument('--batch-size', type=int, default=16)
+    args = parser.parse_args()
+
+    if not PLANT_CLASSIFIER_MODEL:
+        parser.error("Set PLANT_CLASSIFIER_MODEL and PLANT_CLASSIFIER_LABELS")
+
+    classifier = load_plant_classifier(PLANT_CLASSIFIER_MODEL, PLANT_CLASSIFIER_LABELS)
+    samples = load_samples(args.samples)
+    images = [img for _, img in samples]
+    print(f"{len(samples)} images, {len(set(label for label, _ in samples))} labels")
+
+    classifier.predict(images[:1])  # warm up
+
+    latencies = []
+    predictions = []
+    for img in images:
+        started = time.perf_counter()
+        predictions.append(classifier.predict([img])[0])
+        latencies.append(time.perf_counter() - started)
+    summarize("single image", latencies)
+    print(f"single-image throughput: {len(images) / sum(latencies):.1f} images/sec")
+
+    started = time.perf_counter()
+    for i in range(0, len(images), args.batch_size):
+        classifier.predict(images[i:i + args.batch_size])
+    elapsed = time.perf_counter() - started
+    print(f"batched ({args.batch_size}) throughput: {len(images) / elapsed:.1f} images/sec")
+
+    top1 = sum(pred[0][0] == label for (label, _), pred in zip(samples, predictions))
+    topk = sum(label in [p[0] for p in pred] for (label, _), pred in zip(samples, predictions))
+    short_circuited = [(label, pred) for (label, _), pred in zip(samples, predictions) if templated_answer(pred)]
+    short_correct = sum(pred[0][0] == label for label, pred in short_circuited)
+    print(f"top-1 accuracy: {top1 / len(samples):.1%}, top-{TOP_K} accuracy: {topk / len(samples):.1%}")
+    print(f"templated answers (confidence >= {SHORT_CIRCUIT_CONFIDENCE}): {len(short_circuited) / len(samples):.1%} "
+          f"of images, {short_correct / max(len(short_circuited), 1):.1%} correct")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Append + fetch throughput of the conversation service (chat.conversation_service)
+under concurrent access, as used by send_message, upload_image and the bot.
+
+One operation is one chat turn: fetch the history window, append the
+question, append the answer. Compared with the previous web path (insert,
+then read the whole history from the table) at the same concurrency, and
+with the bot's async handlers (aappend/awindow over many Telegram chats).
+
+    python benchmarks/bench_conversations.py --threads 8 --conversations 200 --history 200
+    CHAT_WRITE_BEHIND=True python benchmarks/bench_conversations.py
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from common import setup_django, setup_test_database
+
+setup_django()
+from django.conf import settings
+
+# A file, not memory: concurrent connections have to share it
+teardown = setup_test_database(
+    os.path.join(tempfile.mkdtemp(prefix='farmbuddy-conv-'), 'bench.sqlite3') if settings.DB_PROFILE == 'sqlite' else None)
+
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from chat.conversation_service import ConversationService
+from chat.message_buffer import message_buffer
+from chat.models import Conversation, Message
+
+ANSWER = "Plant cassava cuttings at a 45 degree angle, 1m apart, at the start of the rains. " * 6
+
+
+def seed(args):
+    now = timezone.now()
+    conversations = Conversation.objects.bulk_create(
+        [Conversation(session_key=f"s{i:039d}", title=f"Chat {i}") for i in range(args.conversations)])
+    Message.objects.bulk_create(
+        [Message(conversation=conversation, role='user' if j % 2 == 0 else 'assistant',
+                 content=ANSWER if j % 2 else f"Question {j} about cassava",
+                 created_at=now - timedelta(minutes=args.history - j))
+         for conversation in conversations for j in range(args.history)], batch_size=5000)
+    return conversations
+
+
+def run_threads(label, args, conversations, turn):
+    """args.threads threads doing args.operations turns in total on random conversations"""
+    per_thread = args.operations // args.threads
+    errors = []
+
+    def worker(seed):
+        close_old_connections()
+        rng = random.Random(seed)
+        try:
+            for i in range(per_thread):
+                # Most turns come from a few active conversations, as in real traffic
+                pool = conversations[:max(1, len(conversations) // 10)] if rng.random() < 0.8 else conversations
+                turn(rng.choice(pool), i)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<40} {per_thread * args.threads / elapsed:8.0f} turns/s"
+          + (f"  ({len(errors)} errors: {errors[0]})" if errors else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--conversations', type=int, default=200)
+    parser.add_argument('--history', type=int, default=100, help='messages already in each conversation')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--operations', type=int, default=4000, help='turns per run')
+    parser.add_argument('--chats', type=int, default=500, help='Telegram chats in the async run')
+    args = parser.parse_args()
+
+    conversations = seed(args)
+    print(f"database: {connection.vendor}, write-behind: {message_buffer.enabled}, "
+          f"{args.conversations} conversations x {args.history} messages, {args.threads} threads")
+
+    def before(conversation, i):
+        # Previous web path: insert, then the whole history from the table
+        message_buffer.add(conversation, 'user', f"question {i}")
+        message_buffer.history(conversation)
+        message_buffer.add(conversation, 'assistant', ANSWER)
+
+    run_threads("before: insert + full history", args, conversations, before)
+
+    service = ConversationService()
+
+    def after(conversation, i):
+        service.append(conversation, 'user', f"question {i}")
+        service.window(conversation)
+        service.append(conversation, 'assistant', ANSWER)
+
+    run_threads("after: service, cold start", args, conversations, after)
+    run_threads("after: service, warm", args, conversations, after)
+    print(f"windows in memory: {len(service)}")
+
+    async def bot_turns():
+        rng = random.Random(3)
+        chats = [rng.randrange(10 ** 9) for _ in range(args.chats)]
+        semaphore = asyncio.Semaphore(settings.TELEGRAM_MAX_CONCURRENT_UPDATES)
+
+        async def turn(chat_id, i):
+            async with semaphore:
+                conversation = await service.atelegram_conversation(chat_id)
+                await service.acontext(conversation)
+                await service.awindow(conversation)
+                await service.aappend(conversation, 'user', f"question {i}")
+                await service.aappend(conversation, 'assistant', ANSWER)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(turn(rng.choice(chats), i) for i in range(args.operations)))
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(bot_turns())
+    print(f"{'after: bot handlers (async)':<40} {args.operations / elapsed:8.0f} turns/s")
+    message_buffer.close()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
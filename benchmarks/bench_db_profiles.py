@@ -0,0 +1,148 @@
+"""
+Simultaneous streamed conversations against the configured database profile
+(DB_PROFILE=sqlite or postgres). Each conversation does what send_message
+does per turn: save the question, read the history, stream an answer
+(--chunk-ms per chunk, no database work) and save it. Readers load chat
+pages at the same time. Reports write and read latency, throughput and
+"database is locked" errors.
+
+--untuned runs the same load with the previous settings (SQLite: rollback
+journal, 5s timeout, deferred transactions; Postgres: a new connection per
+request, no pool).
+
+    python benchmarks/bench_db_profiles.py --conversations 32 --turns 5
+    python benchmarks/bench_db_profiles.py --conversations 32 --turns 5 --untuned
+    DB_PROFILE=postgres DB_POOL=True python benchmarks/bench_db_profiles.py
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from common import Timer, setup_django, setup_test_database, summarize
+
+setup_django()
+from django.conf import settings
+
+# SQLite runs its tests in memory by default, which hides file locking
+teardown = setup_test_database(
+    os.path.join(tempfile.mkdtemp(prefix='farmbuddy-db-'), 'bench.sqlite3') if settings.DB_PROFILE == 'sqlite' else None)
+
+from django.db import OperationalError, connection
+
+from chat.models import Conversation, Message
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.writes = []
+        self.reads = []
+        self.errors = {}
+
+    def record(self, kind, fn):
+        try:
+            with Timer() as timer:
+                fn()
+        except OperationalError as e:
+            with self.lock:
+                self.errors[str(e)] = self.errors.get(str(e), 0) + 1
+            return
+        with self.lock:
+            getattr(self, kind).append(timer.elapsed)
+
+
+def untune():
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=DELETE")
+        connection.settings_dict['OPTIONS'] = {}
+    else:
+        connection.settings_dict['OPTIONS'].pop('pool', None)
+        connection.settings_dict['CONN_MAX_AGE'] = 0
+    connection.close()
+
+
+def conversation_worker(index, args, results, start):
+    start.wait()
+    try:
+        conversation = Conversation.objects.create(session_key=f"bench{index:035d}")
+        for turn in range(args.turns):
+            results.record('writes', lambda: Message.objects.create(
+                conversation=conversation, role='user', content=f"Question {turn}: how do I store yams?"))
+            results.record('reads', lambda: list(conversation.messages.all().values('role', 'content')))
+            for _ in range(args.chunks):
+                time.sleep(args.chunk_ms / 1000)
+            results.record('writes', lambda: Message.objects.create(
+                conversation=conversation, role='assistant', content="Keep yams in a cool, dry barn. " * 20))
+            results.record('reads', lambda: conversation.messages.count())
+    finally:
+        connection.close()
+
+
+def reader_worker(args, results, start, stop):
+    start.wait()
+    try:
+        while not stop.is_set():
+            conversation = Conversation.objects.order_by('?').first()
+            if conversation is None:
+                time.sleep(0.01)
+                continue
+            results.record('reads', lambda: list(conversation.messages.order_by('-created_at', '-id')[:51]))
+            results.record('reads', lambda: list(
+                Conversation.objects.filter(session_key=conversation.session_key).values('id', 'title')[:20]))
+            time.sleep(args.read_interval)
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--conversations', type=int, default=32, help='simultaneous streamed conversations')
+    parser.add_argument('--turns', type=int, default=5)
+    parser.add_argument('--chunks', type=int, default=20)
+    parser.add_argument('--chunk-ms', type=float, default=25)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--read-interval', type=float, default=0.005)
+    parser.add_argument('--untuned', action='store_true', help='use the previous database settings')
+    args = parser.parse_args()
+
+    if args.untuned:
+        untune()
+    settings_dict = connection.settings_dict
+    print(f"database: {connection.vendor} options={settings_dict['OPTIONS']} "
+          f"CONN_MAX_AGE={settings_dict['CONN_MAX_AGE']}")
+
+    results = Results()
+    start, stop = threading.Event(), threading.Event()
+    writers = [threading.Thread(target=conversation_worker, args=(i, args, results, start))
+               for i in range(args.conversations)]
+    readers = [threading.Thread(target=reader_worker, args=(args, results, start, stop)) for _ in range(args.readers)]
+    for thread in writers + readers:
+        thread.start()
+
+    started = time.perf_counter()
+    start.set()
+    for thread in writers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in readers:
+        thread.join()
+
+    summarize("message write", results.writes)
+    summarize("read", results.reads)
+    print(f"{len(results.writes)} writes, {len(results.reads)} reads in {elapsed:.1f}s "
+          f"({len(results.writes) / elapsed:.0f} writes/s, {len(results.reads) / elapsed:.0f} reads/s)")
+    expected = args.conversations * args.turns * 2
+    print(f"failed writes: {expected - len(results.writes)}/{expected}")
+    for error, count in results.errors.items():
+        print(f"  {count} x {error}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
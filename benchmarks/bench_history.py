@@ -0,0 +1,120 @@
+"""
+Compare the chat page for a long conversation before and after lazy history
+loading: HTML size, server render time and the markdown parsing chat.js does
+on load (timed with marked in Node), plus the cost of paging the whole
+history through the history API.
+
+Time to interactive is estimated as server time + transfer at --kbps +
+markdown parsing; browser layout is not included.
+
+    python benchmarks/bench_history.py --messages 5000 --kbps 1000
+"""
+import argparse
+import json
+import os
+import subprocess
+from types import SimpleNamespace
+
+from common import Timer, setup_test_database, summarize
+
+teardown = setup_test_database()
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.test import Client
+
+from chat.models import Conversation, Message
+
+SAMPLE_ANSWER = """**Cassava planting tips**
+
+1. Plant at the start of the rainy season.
+2. Use healthy stems 20-25 cm long with 5-7 nodes.
+3. Space plants *1m x 1m* apart.
+
+- Weed at 4 and 8 weeks
+- Apply NPK 15:15:15 at 8 weeks
+"""
+
+
+def seed(session_key, count):
+    conversation = Conversation.objects.create(session_key=session_key, title="Long conversation")
+    Message.objects.bulk_create(
+        [Message(conversation=conversation, role='user' if i % 2 == 0 else 'assistant',
+                 content=f"Question {i}: when should I plant cassava?" if i % 2 == 0 else SAMPLE_ANSWER)
+         for i in range(count)],
+        batch_size=1000)
+    return conversation
+
+
+def markdown_time(messages):
+    """Milliseconds for marked.parse over the messages' content, measured in Node"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'render_markdown.js')
+    result = subprocess.run(['node', script], input=json.dumps([m.content for m in messages]),
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)['ms']
+
+
+def report(label, html_bytes, server_seconds, markdown_ms, kbps):
+    transfer_ms = html_bytes * 8 / kbps
+    print(f"{label}: html={html_bytes / 1024:.0f}KB server={server_seconds * 1000:.0f}ms "
+          f"transfer={transfer_ms:.0f}ms markdown={markdown_ms:.0f}ms "
+          f"time to interactive ~{server_seconds * 1000 + transfer_ms + markdown_ms:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--kbps', type=float, default=1000, help='client bandwidth for the transfer estimate')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    client = Client()
+    session = client.session
+    session.save()
+    conversation = seed(session.session_key, args.messages)
+
+    # Before: every message rendered into the page
+    timings = []
+    for _ in range(args.repeat):
+        with Timer() as timer:
+            messages = list(conversation.messages.all())
+            cache.clear()
+            html = render_to_string('chat/index.html', {
+                'current_conversation': conversation, 'session_key': session.session_key,
+                'page': SimpleNamespace(messages=messages, history_cursor=''),
+                'conversations': Conversation.objects.filter(session_key=session.session_key).values('id', 'title')[:20],
+            })
+        timings.append(timer.elapsed)
+    summarize("full page render (before)", timings)
+    report("before", len(html.encode()), sorted(timings)[len(timings) // 2], markdown_time(messages), args.kbps)
+
+    # After: the newest page only (first visits: no cached fragments)
+    timings = []
+    for _ in range(args.repeat):
+        cache.clear()
+        with Timer() as timer:
+            response = client.get(f'/chat/{conversation.id}/')
+        timings.append(timer.elapsed)
+    summarize("lazy page render (after)", timings)
+    report("after", len(response.content), sorted(timings)[len(timings) // 2],
+           markdown_time(response.context['page'].messages), args.kbps)
+
+    # Scrolling all the way back
+    cursor = response.context['page'].history_cursor
+    timings = []
+    loaded = len(response.context['page'].messages)
+    while cursor:
+        with Timer() as timer:
+            page = client.get(f'/chat/api/history/{conversation.id}/', {'before': cursor}).json()
+        timings.append(timer.elapsed)
+        loaded += len(page['messages'])
+        cursor = page['before']
+    summarize("history page", timings)
+    print(f"loaded {loaded}/{args.messages} messages in {len(timings) + 1} requests")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
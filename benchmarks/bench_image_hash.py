@@ -0,0 +1,92 @@
+"""
+Benchmark the perceptual-hash diagnosis cache on synthetic images.
+
+Builds an index of --index-size hashes (a set of generated "leaf" images plus
+random filler hashes), then queries with augmented copies (JPEG re-encode,
+resize, brightness, small crop) and with unrelated images to report lookup
+time, hit rate and false-positive rate.
+
+    python benchmarks/bench_image_hash.py --index-size 500000
+"""
+import argparse
+import io
+import random
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance
+
+from common import summarize
+
+from utils.image_hash import HashIndex, dhash
+
+
+def synthetic_leaf(seed, size=512):
+    rng = random.Random(seed)
+    img = Image.new('RGB', (size, size), (rng.randint(60, 120), rng.randint(120, 200), rng.randint(40, 90)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(rng.randint(5, 25)):
+        x, y = rng.randint(0, size), rng.randint(0, size)
+        r = rng.randint(5, 60)
+        color = (rng.randint(80, 200), rng.randint(60, 140), rng.randint(0, 60))
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=color)
+    return img
+
+
+def augment(img, rng):
+    w, h = img.size
+    crop = rng.uniform(0, 0.05)
+    img = img.crop((int(w * crop), int(h * crop), int(w * (1 - crop)), int(h * (1 - crop))))
+    scale = rng.uniform(0.4, 1.0)
+    img = img.resize((max(16, int(w * scale)), max(16, int(h * scale))))
+    img = ImageEnhance.Brightness(img).enhance(rng.uniform(0.85, 1.15))
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=rng.randint(40, 90))
+    buffer.seek(0)
+    return Image.open(buffer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--index-size', type=int, default=200000)
+    parser.add_argument('--originals', type=int, default=500)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--max-distance', type=int, default=6)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    index = HashIndex()
+
+    originals = [synthetic_leaf(i) for i in range(args.originals)]
+    index.add_many(range(args.originals), [dhash(img) for img in originals])
+
+    filler = args.index_size - args.originals
+    if filler > 0:
+        random_hashes = np.random.default_rng(0).integers(0, 2 ** 63, size=filler, dtype=np.int64)
+        index.add_many(range(args.originals, args.index_size), random_hashes.tolist())
+    print(f"index: {len(index)} hashes ({len(index) * 16 / 1024 / 1024:.1f}MB incl. ids)")
+
+    lookups, hits, correct = [], 0, 0
+    for _ in range(args.queries):
+        source = rng.randrange(args.originals)
+        query = dhash(augment(originals[source], rng))
+        started = time.perf_counter()
+        match = index.nearest(query, args.max_distance)
+        lookups.append(time.perf_counter() - started)
+        if match:
+            hits += 1
+            correct += match[0] == source
+
+    false_positives = 0
+    for i in range(args.queries):
+        unrelated = synthetic_leaf(10 ** 6 + i)
+        if index.nearest(dhash(unrelated), args.max_distance):
+            false_positives += 1
+
+    summarize("lookup", lookups)
+    print(f"hit rate on augmented copies: {hits / args.queries:.1%} (correct match {correct / args.queries:.1%})")
+    print(f"false positive rate on unrelated images: {false_positives / args.queries:.1%}")
+
+
+if __name__ == '__main__':
+    main()
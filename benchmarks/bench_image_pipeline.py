@@ -0,0 +1,76 @@
+"""
+Benchmark image preprocessing before vision analysis.
+
+For each photo: upload bytes (original vs model payload), decode time (full
+decode vs draft-mode preprocess) and, with --server, end-to-end diagnosis
+latency through /chat/upload/.
+
+    python benchmarks/bench_image_pipeline.py samples/leaves/*.jpg --server
+"""
+import argparse
+import json
+import os
+import time
+
+from common import DEFAULT_BASE_URL, get_session, summarize
+
+from PIL import Image, ImageOps
+
+from utils.image_processing import VISION_IMAGE_SIZE, preprocess_image
+
+
+def full_decode(path):
+    """What the old path did: decode at full resolution"""
+    started = time.perf_counter()
+    img = Image.open(path)
+    img = ImageOps.exif_transpose(img)
+    img.load()
+    img.thumbnail((VISION_IMAGE_SIZE, VISION_IMAGE_SIZE))
+    return time.perf_counter() - started
+
+
+def diagnose(session, base_url, path):
+    started = time.perf_counter()
+    with open(path, 'rb') as f:
+        response = session.post(f"{base_url}/chat/upload/", files={'image': f}, stream=True)
+    first = None
+    for line in response.iter_lines():
+        if not line:
+            continue
+        if first is None:
+            first = time.perf_counter() - started
+        if json.loads(line).get('success') is not None:
+            break
+    return first, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('images', nargs='+')
+    parser.add_argument('--server', action='store_true', help='also measure /chat/upload/ latency')
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL)
+    args = parser.parse_args()
+
+    full_times, draft_times = [], []
+    original_bytes = payload_bytes = 0
+    for path in args.images:
+        full_times.append(full_decode(path))
+        prepared = preprocess_image(path)
+        draft_times.append(prepared.decode_seconds)
+        original_bytes += os.path.getsize(path)
+        payload_bytes += len(prepared.model_bytes)
+
+    print(f"upload bytes: original={original_bytes / 1024:.0f}KB payload={payload_bytes / 1024:.0f}KB "
+          f"({payload_bytes / max(original_bytes, 1):.0%})")
+    summarize("full decode", full_times)
+    summarize("draft preprocess", draft_times)
+
+    if args.server:
+        session = get_session(args.base_url)
+        results = [diagnose(session, args.base_url, path) for path in args.images]
+        summarize("time to first chunk", [r[0] for r in results if r[0] is not None])
+        summarize("end-to-end diagnosis", [r[1] for r in results])
+
+
+if __name__ == '__main__':
+    main()
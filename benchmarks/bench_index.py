@@ -0,0 +1,116 @@
+"""
+Benchmark the chat index page with millions of conversations from other
+sessions in the table: page latency for one session with a long
+conversation, the sidebar query compared with the old global query, and
+the query plans.
+
+    python benchmarks/bench_index.py --conversations 2000000 --sessions 200000 --messages 2000
+"""
+import argparse
+import random
+from datetime import timedelta
+
+from common import Timer, setup_test_database, summarize
+
+teardown = setup_test_database()
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+
+from chat.models import Conversation, Message
+
+
+def seed(args, session_key):
+    rng = random.Random(5)
+    now = timezone.now()
+    batch = []
+    with Timer() as timer:
+        for i in range(args.conversations):
+            created = now - timedelta(seconds=rng.randrange(90 * 24 * 3600))
+            batch.append(Conversation(session_key=f"s{rng.randrange(args.sessions):039d}", title=f"Chat {i}",
+                                      created_at=created))
+            if len(batch) == args.batch_size:
+                Conversation.objects.bulk_create(batch)
+                batch = []
+        Conversation.objects.bulk_create(batch)
+
+        # The benchmarked session: a few conversations, one of them long
+        mine = Conversation.objects.bulk_create(
+            [Conversation(session_key=session_key, title=f"Mine {i}") for i in range(args.own_conversations)])
+        started = now - timedelta(days=30)
+        Message.objects.bulk_create(
+            [Message(conversation=mine[0], role='user' if i % 2 == 0 else 'assistant',
+                     content=f"Message {i} about cassava planting and fertilizer " * 3,
+                     created_at=started + timedelta(seconds=i * 30))
+             for i in range(args.messages)],
+            batch_size=args.batch_size)
+    print(f"seeded {args.conversations} conversations and {args.messages} messages in {timer.elapsed:.0f}s")
+    return mine[0]
+
+
+def time_query(label, queryset, repeat):
+    timings = []
+    for _ in range(repeat):
+        with Timer() as timer:
+            list(queryset)
+        timings.append(timer.elapsed)
+    summarize(label, timings)
+
+
+def explain(label, queryset):
+    print(f"{label} plan: {queryset.explain()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--conversations', type=int, default=1000000)
+    parser.add_argument('--sessions', type=int, default=100000)
+    parser.add_argument('--own-conversations', type=int, default=30)
+    parser.add_argument('--messages', type=int, default=2000, help='messages in the open conversation')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    client = Client()
+    session = client.session
+    session.save()
+    session_key = session.session_key
+    conversation = seed(args, session_key)
+
+    timings = []
+    for _ in range(args.repeat):
+        cache.clear()  # measure the queries, not the fragment cache
+        with Timer() as timer:
+            response = client.get(f'/chat/{conversation.id}/')
+        assert response.status_code == 200
+        timings.append(timer.elapsed)
+    summarize("index page", timings)
+    print(f"page size: {len(response.content) / 1024:.0f}KB")
+
+    cursor = response.context['page'].history_cursor
+    timings = []
+    for _ in range(args.repeat):
+        with Timer() as timer:
+            client.get(f'/chat/api/history/{conversation.id}/', {'before': cursor})
+        timings.append(timer.elapsed)
+    summarize("earlier messages page", timings)
+
+    old_sidebar = Conversation.objects.all().order_by('-updated_at')[:20]
+    new_sidebar = Conversation.objects.filter(session_key=session_key).order_by('-updated_at').values('id', 'title')[:20]
+    time_query("sidebar, all conversations (before)", old_sidebar, args.repeat)
+    time_query("sidebar, session-scoped (after)", new_sidebar, args.repeat)
+    time_query("messages, whole conversation (before)", conversation.messages.all(), args.repeat)
+    time_query("messages, latest page (after)", conversation.messages.order_by('-created_at', '-id')[:51], args.repeat)
+
+    explain("session sidebar", new_sidebar)
+    explain("message page", conversation.messages.order_by('-created_at', '-id')[:51])
+    print(f"database: {connection.vendor}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
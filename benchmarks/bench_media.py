@@ -0,0 +1,106 @@
+"""
+Benchmark chat page weight and media disk usage before and after thumbnailing
+and compaction, on a seeded dataset of legacy full-size uploads.
+
+    python benchmarks/bench_media.py --conversations 20 --images 10
+"""
+import argparse
+import io
+import os
+import random
+import tempfile
+from datetime import timedelta
+
+from common import setup_test_database
+
+teardown = setup_test_database()
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import Client, override_settings
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from chat.models import Conversation, Message
+
+
+def legacy_photo(seed, size=(3000, 2250)):
+    """A large camera-style JPEG like the ones stored before thumbnailing"""
+    rng = random.Random(seed)
+    img = Image.new('RGB', size, (rng.randint(40, 120), rng.randint(100, 200), rng.randint(30, 90)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(200):
+        x, y = rng.randint(0, size[0]), rng.randint(0, size[1])
+        r = rng.randint(10, 120)
+        draw.ellipse((x - r, y - r, x + r, y + r),
+                     fill=(rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=95)
+    return buffer.getvalue()
+
+
+def disk_usage(root):
+    total = 0
+    for folder, _, files in os.walk(root):
+        total += sum(os.path.getsize(os.path.join(folder, name)) for name in files)
+    return total
+
+
+def page_weight(client, media_root, conversation):
+    """HTML bytes plus every image referenced by the page"""
+    response = client.get(f'/chat/{conversation.id}/')
+    html = response.content.decode()
+    image_bytes = 0
+    for message in conversation.messages.exclude(image=''):
+        name = message.thumbnail.name if message.thumbnail else message.image.name
+        assert name in html
+        image_bytes += os.path.getsize(os.path.join(media_root, name))
+    return len(response.content), image_bytes
+
+
+def report(label, client, media_root, conversations):
+    html, images = zip(*(page_weight(client, media_root, c) for c in conversations))
+    print(f"{label}: page weight {sum(html) / len(html) / 1024:.0f}KB HTML + "
+          f"{sum(images) / len(images) / 1024:.0f}KB images per conversation, "
+          f"disk {disk_usage(media_root) / 1024 / 1024:.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--conversations', type=int, default=10)
+    parser.add_argument('--images', type=int, default=10, help='images per conversation')
+    parser.add_argument('--duplicates', type=float, default=0.2, help='share of re-sent identical photos')
+    args = parser.parse_args()
+
+    media_root = tempfile.mkdtemp(prefix='farmbuddy-media-')
+    with override_settings(MEDIA_ROOT=media_root):
+        rng = random.Random(1)
+        old = timezone.now() - timedelta(days=90)
+        photos = []
+        conversations = []
+        for c in range(args.conversations):
+            conversation = Conversation.objects.create(title=f"Seeded {c}")
+            conversations.append(conversation)
+            for i in range(args.images):
+                if photos and rng.random() < args.duplicates:
+                    data = rng.choice(photos)
+                else:
+                    data = legacy_photo(c * 1000 + i)
+                    photos.append(data)
+                message = Message(conversation=conversation, role='user', content='[Plant image]', created_at=old)
+                message.image.save(f'leaf_{c}_{i}.jpg', ContentFile(data), save=False)
+                message.save()
+                Message.objects.create(conversation=conversation, role='assistant', content='Diagnosis ' * 50,
+                                       created_at=old)
+
+        client = Client()
+        report("before", client, media_root, conversations)
+        call_command('compact_images', days=30, prune_orphans=True)
+        report("after", client, media_root, conversations)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
@@ -0,0 +1,126 @@
+"""
+Chat message writes at high rates with and without the write-behind buffer
+(chat.message_buffer). Each simulated request does the database work of
+send_message: save the question, read the history, save the answer. No Gemini
+calls.
+
+Reports request-side database time, messages/s, and the write statements and
+transactions that reached the database.
+
+    python benchmarks/bench_message_buffer.py --threads 16 --requests 200
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from common import Timer, setup_django, setup_test_database, summarize
+
+setup_django()
+from django.conf import settings
+
+teardown = setup_test_database(
+    os.path.join(tempfile.mkdtemp(prefix='farmbuddy-db-'), 'bench.sqlite3') if settings.DB_PROFILE == 'sqlite' else None)
+
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from chat.message_buffer import MessageBuffer
+from chat.models import Conversation, Message
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class StatementCounter:
+    """execute_wrapper counting write statements and the transactions they ran in"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.transactions = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(WRITES):
+            with self.lock:
+                self.writes += 1
+                # Outside atomic() every statement commits on its own
+                if not context['connection'].in_atomic_block:
+                    self.transactions += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+def simulate(buffer, conversations, args, timings, lock):
+    local = []
+    try:
+        for i in range(args.requests):
+            conversation = conversations[i % len(conversations)]
+            with Timer() as timer:
+                buffer.add(conversation, 'user', f"Question {i}: how much fertilizer for maize?")
+                buffer.history(conversation)
+                buffer.add(conversation, 'assistant', "Apply 2 bags of NPK 15:15:15 per hectare at planting. " * 5)
+            local.append(timer.elapsed)
+    finally:
+        connection.close()
+    with lock:
+        timings.extend(local)
+
+
+def run(label, buffer, args, counter):
+    conversations = Conversation.objects.bulk_create(
+        [Conversation(session_key=f"bench{i:035d}") for i in range(args.conversations)])
+    before = Message.objects.count()
+    counter.writes = counter.transactions = 0
+    flushes = []
+    flush = buffer.flush
+    buffer.flush = lambda: flushes.append(flush()) or flushes[-1]
+
+    timings, lock = [], threading.Lock()
+    threads = [threading.Thread(target=simulate, args=(buffer, conversations[n::args.threads], args, timings, lock))
+               for n in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    buffer.close()
+    elapsed = time.perf_counter() - started
+
+    written = Message.objects.count() - before
+    # Each flush is one transaction (bulk_create + UPDATE in atomic())
+    transactions = counter.transactions + sum(1 for n in flushes if n)
+    print(f"--- {label}")
+    summarize("request db time", timings)
+    print(f"{written} messages in {elapsed:.2f}s = {written / elapsed:.0f} messages/s")
+    print(f"write statements: {counter.writes}, transactions: {transactions} "
+          f"({transactions / elapsed:.0f}/s), flushes: {sum(1 for n in flushes if n)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200, help='requests per thread')
+    parser.add_argument('--conversations', type=int, default=256)
+    parser.add_argument('--flush-interval', type=float, default=1.0)
+    parser.add_argument('--flush-batch', type=int, default=200)
+    args = parser.parse_args()
+
+    counter = StatementCounter()
+    counter.install(connection=connection)
+    connection_created.connect(counter.install)
+
+    run("direct writes (before)", MessageBuffer(enabled=False), args, counter)
+    run("write-behind (after)",
+        MessageBuffer(enabled=True, flush_interval=args.flush_interval, flush_batch=args.flush_batch), args, counter)
+    print(f"database: {connection.vendor}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
@@ -0,0 +1,112 @@
+"""
+Repeat-load time and data transferred for the chat page on a throttled
+connection, with and without the offline service worker (chat/sw.js).
+
+There is no browser here, so the network is modelled: each round trip
+costs --rtt-ms, and bytes cost --kbps. Page sizes and server times are
+measured through Django; asset sizes are the gzip files from
+collectstatic. The scenarios follow what the browser does:
+- first visit: page, then the 4 shell assets in parallel
+- repeat, before: full page render, and the assets revalidated (304s;
+  unhashed names only have a short max-age)
+- repeat, service worker: the page revalidated by ETag (304), assets from
+  the SW cache
+- repeat, offline: page and assets from the SW cache
+- replaying a TTS answer: downloaded again before, from the SW cache after
+
+    python benchmarks/bench_offline_load.py --rtt-ms 400 --kbps 250
+"""
+import argparse
+import os
+import statistics
+import tempfile
+
+from common import Timer, setup_test_database
+
+teardown = setup_test_database()
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, override_settings
+
+from chat.models import Conversation, Message
+from chat.views import SHELL_ASSETS
+
+HEADER_BYTES = 350  # request + response headers per round trip
+
+
+def asset_sizes():
+    root = tempfile.mkdtemp(prefix='farmbuddy-static-')
+    with override_settings(STATIC_ROOT=root, DEBUG=False):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        sizes = {}
+        for name in SHELL_ASSETS:
+            path = os.path.join(root, staticfiles_storage.stored_name(name))
+            sizes[name] = os.path.getsize(path + '.gz') if os.path.exists(path + '.gz') else os.path.getsize(path)
+    return sizes
+
+
+def page(client, url, repeat, etag=None, clear=False):
+    """Median server time and bytes of the page response"""
+    timings = []
+    for _ in range(repeat):
+        if clear:
+            cache.clear()
+        headers = {'HTTP_ACCEPT_ENCODING': 'gzip'}
+        if etag:
+            headers['HTTP_IF_NONE_MATCH'] = etag
+        with Timer() as timer:
+            response = client.get(url, **headers)
+        timings.append(timer.elapsed)
+    return statistics.median(timings), len(response.content), response
+
+
+def report(label, args, server_seconds, round_trips, transferred):
+    network_ms = round_trips * args.rtt_ms + transferred * 8 / args.kbps
+    print(f"{label:<34} {server_seconds * 1000 + network_ms:8.0f}ms  {transferred / 1024:7.1f}KB  "
+          f"({round_trips} round trips)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rtt-ms', type=float, default=400, help='round-trip time (2G/3G: 300-800ms)')
+    parser.add_argument('--kbps', type=float, default=250, help='bandwidth in kilobits per second')
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--tts-kb', type=float, default=80, help='size of one spoken answer')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    client = Client()
+    session = client.session
+    session.save()
+    conversation = Conversation.objects.create(session_key=session.session_key, title="Maize pests")
+    Message.objects.bulk_create(
+        [Message(conversation=conversation, role='user' if i % 2 == 0 else 'assistant',
+                 content=f"**Fall armyworm** tip {i}: scout the whorls twice a week and apply neem extract early. " * 3)
+         for i in range(args.messages)])
+    url = f'/chat/{conversation.id}/'
+
+    sizes = asset_sizes()
+    assets = sum(sizes.values())
+    print(f"network model: rtt={args.rtt_ms:.0f}ms bandwidth={args.kbps:.0f}kbps; "
+          f"shell assets {assets / 1024:.1f}KB gzipped ({', '.join(sizes)})")
+
+    server, page_bytes, response = page(client, url, args.repeat, clear=True)
+    report("first visit", args, server, 2, page_bytes + assets + HEADER_BYTES * (1 + len(sizes)))
+    report("repeat visit, before", args, server, 2, page_bytes + HEADER_BYTES * (1 + len(sizes)))
+
+    server, not_modified, _ = page(client, url, args.repeat, etag=response['ETag'])
+    report("repeat visit, service worker", args, server, 1, not_modified + HEADER_BYTES)
+    report("repeat visit, offline", args, 0, 0, 0)
+
+    tts = args.tts_kb * 1024
+    report("replay spoken answer, before", args, 0, 1, tts + HEADER_BYTES)
+    report("replay spoken answer, after", args, 0, 0, 0)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
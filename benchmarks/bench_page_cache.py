@@ -0,0 +1,98 @@
+"""
+Chat page cost for first and repeat visits: server time and bytes on the
+wire for a full render, a render from cached sidebar/message fragments, a
+conditional GET answered with 304, and a render after a new message. Also
+lists the hashed, precompressed static assets collectstatic produces.
+
+    python benchmarks/bench_page_cache.py --messages 50 --conversations 20
+"""
+import argparse
+import os
+import tempfile
+
+from common import Timer, setup_test_database, summarize
+
+teardown = setup_test_database()
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, override_settings
+
+from chat.conversation_service import conversation_service
+from chat.models import Conversation, Message
+
+ASSETS = ['js/chat.js', 'js/marked.min.js', 'css/chat.css']
+
+
+def seed(session_key, args):
+    conversations = Conversation.objects.bulk_create(
+        [Conversation(session_key=session_key, title=f"Cassava question {i}") for i in range(args.conversations)])
+    Message.objects.bulk_create(
+        [Message(conversation=conversations[0], role='user' if i % 2 == 0 else 'assistant',
+                 content=f"**Tip {i}**: plant cassava cuttings 1m apart at the start of the rains. " * 4)
+         for i in range(args.messages)])
+    return conversations[0]
+
+
+def measure(label, client, url, repeat, headers=None, before=None):
+    timings, sizes, status = [], [], None
+    for _ in range(repeat):
+        if before:
+            before()
+        with Timer() as timer:
+            response = client.get(url, HTTP_ACCEPT_ENCODING='gzip', **(headers or {}))
+        timings.append(timer.elapsed)
+        sizes.append(len(response.content))
+        status = response.status_code
+    summarize(f"{label} [{status}]", timings)
+    print(f"  bytes on the wire: {sum(sizes) / len(sizes) / 1024:.1f}KB")
+    return response
+
+
+def static_assets():
+    root = tempfile.mkdtemp(prefix='farmbuddy-static-')
+    with override_settings(STATIC_ROOT=root, DEBUG=False):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        for name in ASSETS:
+            hashed = staticfiles_storage.stored_name(name)
+            sizes = []
+            for suffix in ('', '.gz', '.br'):
+                path = os.path.join(root, hashed + suffix)
+                sizes.append(f"{os.path.getsize(path) / 1024:.1f}KB" if os.path.exists(path) else "-")
+            print(f"{name} -> {hashed}: raw={sizes[0]} gzip={sizes[1]} brotli={sizes[2]}")
+    print(f"hashed assets are served with Cache-Control: max-age={10 * 365 * 24 * 3600} (WhiteNoise)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--conversations', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    client = Client()
+    session = client.session
+    session.save()
+    conversation = seed(session.session_key, args)
+    url = f'/chat/{conversation.id}/'
+
+    measure("first visit (no cached fragments)", client, url, args.repeat, before=cache.clear)
+    response = measure("repeat visit, cached fragments", client, url, args.repeat)
+    measure("repeat visit, If-None-Match", client, url, args.repeat,
+            headers={'HTTP_IF_NONE_MATCH': response['ETag']})
+
+    measure("after a new message", client, url, args.repeat,
+            headers={'HTTP_IF_NONE_MATCH': response['ETag']},
+            before=lambda: conversation_service.append(conversation, 'user', "And for yams?"))
+    print(f"cache backend: {settings.CACHES['default']['BACKEND']}")
+
+    static_assets()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
@@ -0,0 +1,103 @@
+"""
+Benchmark the shared token-bucket rate limiter: per-check overhead at high
+request rates from several processes and threads, and whether processes
+sharing the SQLite store agree on one client's budget.
+
+    python benchmarks/bench_rate_limit.py --processes 4 --threads 4 --checks 20000
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+from common import setup_django, summarize
+
+setup_django()
+
+from chat.rate_limit import RateLimiter
+
+LIMITS = {
+    'chat': {'burst': 10, 'per_minute': 20, 'action': 'reject'},
+    'hot': {'burst': 50, 'per_minute': 600, 'action': 'reject'},
+}
+
+
+def hammer(path, checks, clients, threads, results):
+    """Many distinct clients, so nearly every check is allowed: pure overhead"""
+    limiter = RateLimiter(path, LIMITS)
+    durations = []
+    lock = threading.Lock()
+
+    def worker(offset):
+        local = []
+        for i in range(checks // threads):
+            key = [(f"session:{(offset + i * 7919) % clients}", 1)]
+            started = time.perf_counter()
+            limiter.check(key, 'chat')
+            local.append(time.perf_counter() - started)
+        with lock:
+            durations.extend(local)
+
+    pool = [threading.Thread(target=worker, args=(n * 1000,)) for n in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(durations)
+
+
+def contend(path, seconds, results):
+    """Everyone spends the same client's 'hot' budget"""
+    limiter = RateLimiter(path, LIMITS)
+    allowed = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if limiter.check([("session:shared", 1)], 'hot').allowed:
+            allowed += 1
+    results.put(allowed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4, help='threads per process')
+    parser.add_argument('--checks', type=int, default=20000, help='checks per process')
+    parser.add_argument('--clients', type=int, default=50000)
+    parser.add_argument('--contention-seconds', type=float, default=3.0)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix='farmbuddy-ratelimit-'), 'ratelimit.sqlite3')
+    results = multiprocessing.Queue()
+
+    started = time.perf_counter()
+    workers = [multiprocessing.Process(target=hammer, args=(path, args.checks, args.clients, args.threads, results))
+               for _ in range(args.processes)]
+    for worker in workers:
+        worker.start()
+    durations = []
+    for _ in workers:
+        durations.extend(results.get())
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    summarize("limiter check", durations, unit="us", scale=1e6)
+    print(f"{len(durations)} checks in {elapsed:.1f}s = {len(durations) / elapsed:.0f} checks/s "
+          f"({args.processes} processes x {args.threads} threads)")
+
+    workers = [multiprocessing.Process(target=contend, args=(path, args.contention_seconds, results))
+               for _ in range(args.processes)]
+    for worker in workers:
+        worker.start()
+    allowed = sum(results.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+    limit = LIMITS['hot']
+    expected = limit['burst'] + limit['per_minute'] / 60 * args.contention_seconds
+    print(f"shared client: {allowed} requests allowed across {args.processes} processes "
+          f"in {args.contention_seconds:.0f}s (budget ~{expected:.0f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Query latency of full-text message search (chat.search) over a large seeded
+message table, compared with the LIKE scan searching would otherwise need.
+Runs against the configured database profile (FTS5 on SQLite, tsvector on
+Postgres); the index is filled by the database as the messages are inserted.
+
+    python benchmarks/bench_search.py --messages 1000000 --conversations 20000
+"""
+import argparse
+import os
+import random
+import tempfile
+
+from common import Timer, setup_django, setup_test_database, summarize
+
+setup_django()
+from django.conf import settings
+
+teardown = setup_test_database(
+    os.path.join(tempfile.mkdtemp(prefix='farmbuddy-db-'), 'bench.sqlite3') if settings.DB_PROFILE == 'sqlite' else None)
+
+from django.db import connection
+
+from chat.models import Conversation, Message
+from chat.search import search_messages
+
+# English, Hausa, Yoruba and Igbo farming vocabulary
+WORDS = (
+    "cassava maize yam sorghum millet cowpea groundnut rice tomato pepper okra plantain cocoa "
+    "fertilizer urea npk manure compost irrigation drought rainfall harvest planting weeding spacing "
+    "armyworm aphids blight rust mosaic wilt rot fungicide pesticide neem storage barn market price "
+    "masara doya rogo gyada shinkafa taki noma girbi ruwa ƙasa kwari "
+    "àgbàdo iṣu ẹ̀gẹ́ ìrẹsì ajílẹ̀ ọ̀gbìn ìkórè òjò ilẹ̀ kòkòrò "
+    "ọka ji akpụ osikapa fatịlaịza ugbo owuwe mmiri ala ụmụ ahụhụ"
+).split()
+FILLER = "the a of to in and for is with your when how should i do it this".split()
+
+QUERIES = ["cassava mosaic", "armyworm maize", "fertilizer", "ọ̀gbìn àgbàdo", "taki masara", "ugbo ji",
+           "storage barn price", "harv", "neem pesticide aphids", "rainfall planting"]
+
+
+def sentence(rng):
+    words = [rng.choice(WORDS) if rng.random() < 0.35 else rng.choice(FILLER) for _ in range(rng.randint(15, 60))]
+    return ' '.join(words).capitalize() + '.'
+
+
+def seed(args):
+    rng = random.Random(11)
+    conversations = Conversation.objects.bulk_create(
+        [Conversation(session_key=f"s{i % args.sessions:039d}", title=f"Chat {i}") for i in range(args.conversations)],
+        batch_size=args.batch_size)
+    with Timer() as timer:
+        batch = []
+        for i in range(args.messages):
+            batch.append(Message(conversation=conversations[rng.randrange(len(conversations))],
+                                 role='user' if i % 2 == 0 else 'assistant', content=sentence(rng)))
+            if len(batch) == args.batch_size:
+                Message.objects.bulk_create(batch)
+                batch = []
+        Message.objects.bulk_create(batch)
+    print(f"seeded {args.messages} messages (index maintained on insert) in {timer.elapsed:.0f}s "
+          f"= {args.messages / timer.elapsed:.0f} messages/s")
+
+
+def time_queries(label, search, repeat):
+    timings = []
+    for _ in range(repeat):
+        for query in QUERIES:
+            with Timer() as timer:
+                search(query)
+            timings.append(timer.elapsed)
+    summarize(label, timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--conversations', type=int, default=20000)
+    parser.add_argument('--sessions', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--like-repeat', type=int, default=1, help='LIKE scans are slow; fewer rounds')
+    args = parser.parse_args()
+
+    seed(args)
+    session_key = f"s{7:039d}"
+
+    for query in QUERIES[:3]:
+        results = search_messages(query, session_key=session_key, limit=3)
+        print(f"{query!r}: {[(r['rank'], r['snippet'][:80]) for r in results]}")
+
+    time_queries("full-text, one session", lambda q: search_messages(q, session_key=session_key), args.repeat)
+    time_queries("full-text, all conversations", lambda q: search_messages(q), args.repeat)
+    time_queries("LIKE scan, one session (before)",
+                 lambda q: list(Message.objects.filter(conversation__session_key=session_key,
+                                                       content__icontains=q).order_by('-created_at')[:20]),
+                 args.like_repeat)
+    time_queries("LIKE scan, all conversations (before)",
+                 lambda q: list(Message.objects.filter(content__icontains=q).order_by('-created_at')[:20]),
+                 args.like_repeat)
+    print(f"database: {connection.vendor}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
@@ -0,0 +1,59 @@
+"""
+Benchmark the Telegram session store with many distinct chats: memory should
+stay flat once the in-memory tier is full, while every chat's state is
+still persisted. Chat histories are measured by bench_conversations.py.
+
+    python benchmarks/bench_sessions.py --chats 100000 --operations 300000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from common import setup_test_database
+
+teardown = setup_test_database()
+
+from chat.models import TelegramSession
+from chat.session_store import SessionStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chats', type=int, default=100000)
+    parser.add_argument('--operations', type=int, default=300000)
+    parser.add_argument('--cache-size', type=int, default=5000)
+    parser.add_argument('--active-share', type=float, default=0.8,
+                        help='share of traffic coming from the 5%% most active chats')
+    args = parser.parse_args()
+
+    store = SessionStore(max_entries=args.cache_size, flush_interval=1, flush_batch=500)
+    rng = random.Random(7)
+    hot_chats = max(1, args.chats // 20)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    report_every = max(1, args.operations // 10)
+    for i in range(1, args.operations + 1):
+        if rng.random() < args.active_share:
+            chat_id = rng.randrange(hot_chats)
+        else:
+            chat_id = rng.randrange(args.chats)
+        session = store.get(chat_id)
+        store.update(chat_id, session, lat=6.5 + i % 100 / 1000, lon=3.3, awaiting_forecast=i % 2 == 0)
+        if i % report_every == 0:
+            current, peak = tracemalloc.get_traced_memory()
+            elapsed = time.perf_counter() - started
+            print(f"{i:>8} ops  {i / elapsed:>8.0f} ops/s  in-memory chats={len(store):>6}  "
+                  f"memory={current / 1024 / 1024:.1f}MB (peak {peak / 1024 / 1024:.1f}MB)")
+
+    store.close()
+    tracemalloc.stop()
+    print(f"persisted sessions: {TelegramSession.objects.count()}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
@@ -0,0 +1,136 @@
+// Render cost of streamed answers in chat.js, versus answer length:
+//   before: marked.parse(fullText) + innerHTML on every chunk
+//   after:  StreamingMarkdown (chat/static/js/stream_render.js)
+//
+// Runs in plain Node. With jsdom installed (npm install jsdom) the DOM work
+// is real; otherwise a minimal fake DOM stands in and "html written" (the
+// bytes the browser would have to parse) is the proxy for DOM cost.
+// Frames are simulated: one frame per --chunks-per-frame chunks.
+//
+//     node benchmarks/bench_stream_render.js --lengths 2000,8000,32000 --chunk 40
+const path = require('path');
+const { marked } = require(path.join(__dirname, '..', 'chat', 'static', 'js', 'marked.min.js'));
+const { StreamingMarkdown } = require(path.join(__dirname, '..', 'chat', 'static', 'js', 'stream_render.js'));
+
+function option(name, fallback) {
+    const index = process.argv.indexOf(`--${name}`);
+    return index > -1 ? process.argv[index + 1] : fallback;
+}
+
+const LENGTHS = option('lengths', '1000,4000,16000,32000').split(',').map(Number);
+const CHUNK = Number(option('chunk', 40));
+const CHUNKS_PER_FRAME = Number(option('chunks-per-frame', 2));
+
+// ---- DOM ----
+
+let htmlWritten = 0;
+
+class FakeElement {
+    constructor(doc, tag) {
+        this.ownerDocument = doc;
+        this.tagName = tag;
+        this.children = [];
+        this.parent = null;
+        this.html = '';
+    }
+    set innerHTML(html) { htmlWritten += html.length; this.html = html; this.children = []; }
+    get innerHTML() {
+        return this.html + this.children.map(child => child.outerHTML !== undefined ? child.outerHTML : child).join('');
+    }
+    get outerHTML() { return this.innerHTML; }  // wrappers are display: contents
+    appendChild(child) { child.parent = this; this.children.push(child); return child; }
+    insertAdjacentHTML(position, html) {
+        htmlWritten += html.length;
+        const siblings = this.parent.children;
+        siblings.splice(siblings.indexOf(this), 0, html);
+    }
+    remove() { const siblings = this.parent.children; siblings.splice(siblings.indexOf(this), 1); }
+}
+
+function makeDocument() {
+    try {
+        const { JSDOM } = require('jsdom');
+        return { doc: new JSDOM('<!DOCTYPE html><body></body>').window.document, real: true };
+    } catch (e) {
+        const doc = { createElement: tag => new FakeElement(doc, tag) };
+        return { doc, real: false };
+    }
+}
+
+// ---- answers ----
+
+const BLOCKS = [
+    '### Cassava planting guide\n\n',
+    'Plant **healthy stems** 20-25 cm long at the *start of the rainy season*, with 1m x 1m spacing. ',
+    'Weed at 4 and 8 weeks after planting.\n\n',
+    '1. Clear and plough the land\n2. Make ridges or mounds\n3. Plant cuttings at an angle\n\n',
+    '- Apply NPK 15:15:15 at 8 weeks\n- Watch for **mosaic disease** on the leaves\n- Harvest after 9-12 months\n\n',
+    '> Tip: intercrop with maize or cowpea in the first months.\n\n',
+    '| Crop | Spacing |\n|---|---|\n| Cassava | 1m x 1m |\n| Maize | 75cm x 25cm |\n\n',
+];
+
+function answer(length) {
+    let text = '';
+    for (let i = 0; text.length < length; i++) text += BLOCKS[i % BLOCKS.length];
+    return text.slice(0, length);
+}
+
+// ---- renderers ----
+
+function before(doc, text) {
+    const element = doc.createElement('div');
+    let full = '';
+    let frames = 0;
+    for (let i = 0; i < text.length; i += CHUNK) {
+        full += text.slice(i, i + CHUNK);
+        element.innerHTML = marked.parse(full);
+        frames++;
+    }
+    element.innerHTML = marked.parse(full);
+    return { element, frames };
+}
+
+function after(doc, text) {
+    const element = doc.createElement('div');
+    const queue = [];
+    const renderer = new StreamingMarkdown(element, { marked, schedule: cb => queue.push(cb), budget: Infinity });
+    let full = '';
+    let chunks = 0;
+    let frames = 0;
+    for (let i = 0; i < text.length; i += CHUNK) {
+        full += text.slice(i, i + CHUNK);
+        renderer.update(full);
+        if (++chunks % CHUNKS_PER_FRAME === 0) {
+            while (queue.length) queue.shift()();
+            frames++;
+        }
+    }
+    renderer.finish(full);
+    return { element, frames };
+}
+
+function measure(label, render, doc, text) {
+    htmlWritten = 0;
+    const started = process.hrtime.bigint();
+    const { element, frames } = render(doc, text);
+    const ms = Number(process.hrtime.bigint() - started) / 1e6;
+    return { label, ms, frames, written: htmlWritten, html: element.innerHTML };
+}
+
+// ---- main ----
+
+const { doc, real } = makeDocument();
+console.log(`DOM: ${real ? 'jsdom' : 'fake (install jsdom for real DOM work)'}, chunk=${CHUNK} chars`);
+
+for (const length of LENGTHS) {
+    const text = answer(length);
+    const results = [measure('before', before, doc, text), measure('after', after, doc, text)];
+    const expected = marked.parse(text).replace(/\s+/g, ' ').trim();
+    for (const result of results) {
+        const same = result.html.replace(/<div class="md-tail"><\/div>/g, '').replace(/\s+/g, ' ').trim() === expected;
+        console.log(`${String(length).padStart(6)} chars  ${result.label.padEnd(6)}  ${result.ms.toFixed(1).padStart(8)}ms  ` +
+            `${(result.ms / Math.max(1, result.frames)).toFixed(2).padStart(6)}ms/frame  ` +
+            `html written ${(result.written / 1024).toFixed(0).padStart(7)}KB  ` +
+            `${same ? 'output matches marked.parse' : 'OUTPUT DIFFERS'}`);
+    }
+}
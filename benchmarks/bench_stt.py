@@ -0,0 +1,61 @@
+"""
+Benchmark the local CPU speech-to-text engine: real-time factor (processing
+time / audio duration), one clip at a time and with concurrent clips batched.
+
+    python benchmarks/bench_stt.py samples/voice/*.ogg --language ha --concurrency 4
+
+RTF below 1.0 means faster than real time.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import summarize
+
+from utils.audio_processing import decode_to_samples, duration_seconds
+from utils.speech import get_speech_engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('clips', nargs='+')
+    parser.add_argument('--language', default='en')
+    parser.add_argument('--engine', default='local')
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    clips = []
+    for path in args.clips:
+        with open(path, 'rb') as f:
+            data = f.read()
+        clips.append((os.path.basename(path), data, duration_seconds(decode_to_samples(data))))
+    total_audio = sum(duration for _, _, duration in clips)
+    print(f"{len(clips)} clips, {total_audio:.1f}s of audio")
+
+    engine = get_speech_engine(args.engine)
+
+    # Warm up so model loading is not counted
+    engine.transcribe(clips[0][1], args.language)
+
+    rtfs = []
+    started = time.perf_counter()
+    for name, data, duration in clips:
+        t0 = time.perf_counter()
+        text = engine.transcribe(data, args.language)
+        elapsed = time.perf_counter() - t0
+        rtfs.append(elapsed / duration if duration else 0)
+        print(f"{name}: {duration:.1f}s audio in {elapsed:.2f}s (RTF {rtfs[-1]:.2f}) {text!r}")
+    sequential = time.perf_counter() - started
+    summarize("sequential RTF", rtfs, unit="", scale=1.0)
+    print(f"sequential aggregate RTF: {sequential / total_audio:.2f}")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda clip: engine.transcribe(clip[1], args.language), clips))
+    concurrent = time.perf_counter() - started
+    print(f"concurrent ({args.concurrency}) aggregate RTF: {concurrent / total_audio:.2f}")
+
+
+if __name__ == '__main__':
+    main()
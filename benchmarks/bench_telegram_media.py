@@ -0,0 +1,163 @@
+"""
+Benchmark Telegram media handling with the bot's in-memory path against the
+previous disk path (download into the working directory, read back, delete).
+
+- photo: full handle_photo latency against a local fake Bot API, with Gemini
+  replaced by a canned answer so only download and image handling are timed
+- voice: decoding a voice note to 16kHz samples through ffmpeg pipes versus
+  ffmpeg reading and writing temporary files (needs ffmpeg on PATH)
+
+    python benchmarks/bench_telegram_media.py --photos 20 --concurrency 4
+    python benchmarks/bench_telegram_media.py --workdir /mnt/slow-disk
+"""
+import argparse
+import asyncio
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+
+from common import FakeTelegramAPI, Timer, setup_test_database, summarize
+
+teardown = setup_test_database()
+
+from django.test import override_settings
+from PIL import Image, ImageDraw
+from telegram import Update
+
+import chat.telegram_bot as telegram_bot
+from utils.audio_processing import decode_to_samples
+
+TOKEN = "123456:benchmark"
+
+
+class DiskPhotoBot(telegram_bot.FarmBuddyBot):
+    """The previous behaviour: the photo goes through a file in the working directory"""
+    workdir = tempfile.gettempdir()
+
+    def diagnose_photo(self, image_source, stream=False):
+        path = os.path.join(self.workdir, f"photo_{uuid.uuid4().hex}.jpg")
+        with open(path, 'wb') as f:
+            f.write(image_source)
+        try:
+            return super().diagnose_photo(path, stream)
+        finally:
+            os.remove(path)
+
+
+def telegram_photo(seed, size=(1280, 960)):
+    """A JPEG like Telegram's largest photo size"""
+    img = Image.new('RGB', size, (60 + seed % 80, 140, 50))
+    draw = ImageDraw.Draw(img)
+    for i in range(150):
+        x, y = (i * 97 + seed * 31) % size[0], (i * 57 + seed * 17) % size[1]
+        draw.ellipse((x, y, x + 60, y + 40), fill=((i * 13) % 255, (i * 29) % 255, (i * 7) % 255))
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=87)
+    return buffer.getvalue()
+
+
+def photo_update(update_id, chat_id, file_id):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Farmer'},
+            'photo': [{'file_id': file_id, 'file_unique_id': file_id, 'width': 1280, 'height': 960}],
+        },
+    }
+
+
+def fake_analyze(image, conversation_history=None, stream=False, use_classifier=True):
+    answer = "This looks like early blight. Remove affected leaves and apply a copper fungicide."
+    return iter([answer]) if stream else answer
+
+
+async def bench_photos(bot_class, label, api, args, chat_offset):
+    bot = bot_class()
+    application = bot.build_application(TOKEN)
+    latencies = []
+
+    async def handle(i):
+        chat_id = chat_offset + i
+        update = Update.de_json(photo_update(chat_id, chat_id, f"photo{i % len(api.files)}"), application.bot)
+        with Timer() as timer:
+            await application.process_update(update)
+        latencies.append(timer.elapsed)
+
+    async with application:
+        with Timer() as total:
+            for start in range(0, args.photos, args.concurrency):
+                await asyncio.gather(*(handle(i) for i in range(start, min(start + args.concurrency, args.photos))))
+    bot.sessions.close()
+    summarize(f"{label}: photo handler", latencies)
+    print(f"{label}: {args.photos / total.elapsed:.1f} photos/s")
+
+
+def bench_voice(args):
+    if not shutil.which('ffmpeg'):
+        print("voice: ffmpeg not found, skipped")
+        return
+    voice = subprocess.run(
+        ['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', f'sine=frequency=300:duration={args.voice_seconds}',
+         '-c:a', 'libopus', '-b:a', '24k', '-f', 'ogg', 'pipe:1'],
+        capture_output=True, check=True).stdout
+
+    piped, on_disk = [], []
+    for _ in range(args.voices):
+        with Timer() as timer:
+            decode_to_samples(voice)
+        piped.append(timer.elapsed)
+
+        with Timer() as timer:
+            stem = os.path.join(args.workdir, f"voice_{uuid.uuid4().hex}")
+            with open(f"{stem}.ogg", 'wb') as f:
+                f.write(voice)
+            subprocess.run(['ffmpeg', '-v', 'error', '-y', '-i', f"{stem}.ogg", '-ac', '1', '-ar', '16000',
+                            f"{stem}.wav"], check=True)
+            with open(f"{stem}.wav", 'rb') as f:
+                f.read()
+            os.remove(f"{stem}.ogg")
+            os.remove(f"{stem}.wav")
+        on_disk.append(timer.elapsed)
+
+    summarize("voice decode, temp files", on_disk)
+    summarize("voice decode, pipes", piped)
+
+
+async def run(args, api):
+    await bench_photos(DiskPhotoBot, "disk", api, args, 10000)
+    await bench_photos(telegram_bot.FarmBuddyBot, "in-memory", api, args, 20000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--photos', type=int, default=20)
+    parser.add_argument('--distinct-photos', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--voices', type=int, default=10)
+    parser.add_argument('--voice-seconds', type=int, default=10)
+    parser.add_argument('--workdir', default=tempfile.gettempdir(), help='directory the disk path writes to')
+    args = parser.parse_args()
+
+    DiskPhotoBot.workdir = args.workdir
+    api = FakeTelegramAPI().start()
+    api.files = {f"photo{i}": telegram_photo(i) for i in range(args.distinct_photos)}
+    os.environ['TELEGRAM_BOT_TOKEN'] = TOKEN
+    telegram_bot.analyze_plant_image = fake_analyze
+
+    with override_settings(TELEGRAM_API_URL=api.url, TELEGRAM_STREAM_REPLIES=False, DIAGNOSIS_CACHE_ENABLED=False):
+        asyncio.run(run(args, api))
+    api.shutdown()
+    bench_voice(args)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
@@ -0,0 +1,114 @@
+"""
+Compare perceived latency of Telegram answers with and without streaming
+replies: time from receiving a message to the first answer text the user can
+read, time to the complete answer, and Bot API calls per answer.
+
+Runs the real text handler against a local fake Bot API; Gemini is replaced
+by a generator with a configurable first-chunk delay and chunk rate.
+
+    python benchmarks/bench_telegram_streaming.py --questions 10 --answer-chars 1500
+    python benchmarks/bench_telegram_streaming.py --answer-chars 9000   # splits into several messages
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from common import FakeTelegramAPI, setup_test_database, summarize
+
+teardown = setup_test_database()
+
+from django.test import override_settings
+from telegram import Update
+
+import chat.telegram_bot as telegram_bot
+
+TOKEN = "123456:benchmark"
+PLACEHOLDER = "⏳ ..."
+
+
+def fake_gemini(first_chunk, chunk_interval, answer_chars, chunk_chars=40):
+    paragraph = ("Plant maize after the first steady rains and keep **weeds** down for the first six weeks. "
+                 "### Fertilizer\nUse compost or NPK 15-15-15 at planting.\n\n")
+    answer = (paragraph * (answer_chars // len(paragraph) + 1))[:answer_chars]
+    chunks = [answer[i:i + chunk_chars] for i in range(0, len(answer), chunk_chars)]
+
+    def generate():
+        time.sleep(first_chunk)
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(chunk_interval)
+            yield chunk
+
+    def ask_gemini(history, weather_context=None, stream=False, language='en'):
+        if stream:
+            return generate()
+        return "".join(generate())
+    return ask_gemini
+
+
+def text_update(update_id, chat_id):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Farmer'},
+            'text': "When should I plant maize?",
+        },
+    }
+
+
+async def measure(api, questions, streaming, chat_offset):
+    first_content, complete, api_calls, messages = [], [], [], []
+    with override_settings(TELEGRAM_STREAM_REPLIES=streaming):
+        bot = telegram_bot.FarmBuddyBot()
+        application = bot.build_application(TOKEN)
+        async with application:
+            for i in range(questions):
+                chat_id = chat_offset + i
+                started = time.perf_counter()
+                await application.process_update(Update.de_json(text_update(chat_id, chat_id), application.bot))
+
+                calls = [c for c in api.calls[chat_id] if c[1] in ('sendMessage', 'editMessageText')]
+                content = [t for t, _, text in calls if text and text != PLACEHOLDER]
+                first_content.append(content[0] - started)
+                complete.append(calls[-1][0] - started)
+                api_calls.append(len(calls))
+                messages.append(sum(1 for c in calls if c[1] == 'sendMessage'))
+        bot.sessions.close()
+    return first_content, complete, api_calls, messages
+
+
+async def run(args, api):
+    for label, streaming, offset in (("full reply", False, 1000), ("streaming", True, 2000)):
+        first_content, complete, api_calls, messages = await measure(api, args.questions, streaming, offset)
+        summarize(f"{label}: time to first content", first_content)
+        summarize(f"{label}: time to complete answer", complete)
+        print(f"{label}: {sum(api_calls) / len(api_calls):.1f} API calls, "
+              f"{sum(messages) / len(messages):.1f} messages per answer")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--answer-chars', type=int, default=1500)
+    parser.add_argument('--first-chunk', type=float, default=1.0, help='seconds until Gemini sends the first chunk')
+    parser.add_argument('--chunk-interval', type=float, default=0.05, help='seconds between chunks')
+    parser.add_argument('--edit-interval', type=float, default=1.0)
+    args = parser.parse_args()
+
+    api = FakeTelegramAPI().start()
+    os.environ['TELEGRAM_BOT_TOKEN'] = TOKEN
+    telegram_bot.ask_gemini = fake_gemini(args.first_chunk, args.chunk_interval, args.answer_chars)
+
+    with override_settings(TELEGRAM_API_URL=api.url, TELEGRAM_STREAM_EDIT_INTERVAL=args.edit_interval):
+        asyncio.run(run(args, api))
+    api.shutdown()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
@@ -0,0 +1,136 @@
+"""
+Load-test Telegram update processing: replay text updates from many chats
+through the webhook view against a local fake Bot API server, and report
+per-update latency (webhook POST to the bot's reply) and throughput.
+
+Gemini is replaced by a simulated delay so the numbers reflect the bot's own
+scheduling. Compare sequential processing with the concurrent default:
+
+    python benchmarks/bench_telegram_updates.py --chats 50 --messages 4 --max-concurrent 1
+    python benchmarks/bench_telegram_updates.py --chats 50 --messages 4 --max-concurrent 32
+
+--updates replays a recorded JSONL file of Telegram updates instead (only
+plain text messages are used).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import defaultdict
+
+from common import FakeTelegramAPI, Timer, setup_test_database, summarize
+
+teardown = setup_test_database()
+
+from django.test import AsyncClient, override_settings
+
+import chat.telegram_bot as telegram_bot
+
+TOKEN = "123456:benchmark"
+SECRET = "benchmark-secret"
+
+
+def synthetic_updates(chats, messages):
+    """Interleaved text messages: every chat asks `messages` questions"""
+    updates = []
+    update_id = 0
+    for n in range(messages):
+        for chat_id in range(1, chats + 1):
+            update_id += 1
+            updates.append({
+                'update_id': update_id,
+                'message': {
+                    'message_id': update_id, 'date': int(time.time()),
+                    'chat': {'id': chat_id, 'type': 'private'},
+                    'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Farmer'},
+                    'text': f"question {n}",
+                },
+            })
+    return updates
+
+
+def recorded_updates(path):
+    with open(path) as f:
+        updates = [json.loads(line) for line in f if line.strip()]
+    return [u for u in updates if u.get('message', {}).get('text', '/').lstrip()[:1] != '/']
+
+
+def fake_gemini(latency):
+    def ask_gemini(history, weather_context=None, stream=False, language='en'):
+        time.sleep(latency * random.uniform(0.5, 1.5))
+        return f"Answer to: {history[-1]['content']}"
+    return ask_gemini
+
+
+async def replay(updates, rate):
+    client = AsyncClient()
+    sent = defaultdict(list)  # chat_id -> [time]
+    for update in updates:
+        chat_id = update['message']['chat']['id']
+        sent[chat_id].append(time.perf_counter())
+        response = await client.post('/chat/telegram/webhook/', json.dumps(update), content_type='application/json',
+                                     headers={'X-Telegram-Bot-Api-Secret-Token': SECRET})
+        assert response.status_code == 200, response.status_code
+        if rate:
+            await asyncio.sleep(1 / rate)
+    return sent
+
+
+async def run(args, api):
+    updates = recorded_updates(args.updates) if args.updates else synthetic_updates(args.chats, args.messages)
+    expected = defaultdict(list)
+    for update in updates:
+        expected[update['message']['chat']['id']].append(update['message']['text'])
+
+    with Timer() as total:
+        sent = await replay(updates, args.rate)
+        deadline = time.perf_counter() + args.timeout
+        while sum(len(v) for v in api.replies.values()) < len(updates) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+    await telegram_bot.stop_webhook_application()
+
+    latencies = []
+    out_of_order = 0
+    for chat_id, times in sent.items():
+        replies = api.replies.get(chat_id, [])
+        for sent_at, (replied_at, _) in zip(times, replies):
+            latencies.append(replied_at - sent_at)
+        answered = [text.split('Answer to: ', 1)[-1] for _, text in replies]
+        if answered != expected[chat_id][:len(answered)]:
+            out_of_order += 1
+
+    print(f"max concurrent handlers: {args.max_concurrent}")
+    summarize("update latency", latencies)
+    print(f"answered {len(latencies)}/{len(updates)} updates in {total.elapsed:.1f}s "
+          f"({len(latencies) / total.elapsed:.1f} updates/s), chats with out-of-order replies: {out_of_order}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chats', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=4, help='messages per chat')
+    parser.add_argument('--updates', help='JSONL file of recorded Telegram updates to replay')
+    parser.add_argument('--rate', type=float, default=0, help='updates per second (0 = as fast as possible)')
+    parser.add_argument('--llm-latency', type=float, default=1.0, help='simulated Gemini response time (s)')
+    parser.add_argument('--max-concurrent', type=int, default=32)
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    api = FakeTelegramAPI().start()
+    os.environ['TELEGRAM_BOT_TOKEN'] = TOKEN
+    telegram_bot.ask_gemini = fake_gemini(args.llm_latency)
+
+    # One plain reply per update keeps the latency/ordering bookkeeping simple
+    with override_settings(TELEGRAM_API_URL=api.url, TELEGRAM_WEBHOOK_SECRET=SECRET,
+                           TELEGRAM_MAX_CONCURRENT_UPDATES=args.max_concurrent, TELEGRAM_STREAM_REPLIES=False):
+        asyncio.run(run(args, api))
+    api.shutdown()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        teardown()
@@ -0,0 +1,57 @@
+"""
+Benchmark /chat/api/transcribe/: end-to-end latency and bytes uploaded per
+second of audio, for the original upload and the compact Opus payload.
+
+    python benchmarks/bench_transcribe.py path/to/clips/*.ogg --language ha
+"""
+import argparse
+import mimetypes
+import os
+import time
+
+from common import DEFAULT_BASE_URL, get_session, summarize
+
+from utils.audio_processing import compact_audio, decode_to_samples, duration_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('clips', nargs='+')
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL)
+    parser.add_argument('--language', default='en')
+    args = parser.parse_args()
+
+    session = get_session(args.base_url)
+    latencies = []
+    original_rates = []
+    compact_rates = []
+
+    for path in args.clips:
+        with open(path, 'rb') as f:
+            data = f.read()
+        duration = duration_seconds(decode_to_samples(data))
+        compact, _ = compact_audio(data)
+        mime_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+        started = time.perf_counter()
+        response = session.post(f"{args.base_url}/chat/api/transcribe/",
+                                files={'audio': (os.path.basename(path), data, mime_type)},
+                                data={'language': args.language})
+        elapsed = time.perf_counter() - started
+
+        result = response.json()
+        print(f"{os.path.basename(path)}: {duration:.1f}s audio, {len(data) / 1024:.1f}KB -> "
+              f"{len(compact) / 1024:.1f}KB, {elapsed * 1000:.0f}ms, {result.get('text', result.get('error'))!r}")
+        if result.get('success') and duration:
+            latencies.append(elapsed)
+            original_rates.append(len(data) / duration)
+            compact_rates.append(len(compact) / duration)
+
+    summarize("end-to-end latency", latencies)
+    if compact_rates:
+        print(f"bytes/sec of audio: original={sum(original_rates) / len(original_rates):.0f} "
+              f"compact={sum(compact_rates) / len(compact_rates):.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark English TTS (/chat/api/speak/): time-to-first-byte and requests/sec.
+
+Run against the dev server before and after a change:
+    python benchmarks/bench_tts.py --requests 40 --concurrency 4
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import DEFAULT_BASE_URL, get_session, summarize
+
+SAMPLE_TEXT = ("Plant your maize at the start of the rainy season. "
+               "Space the rows 75 centimetres apart and apply compost before planting.")
+
+
+def one_request(base_url, language):
+    session = get_session(base_url)
+    started = time.perf_counter()
+    response = session.post(f"{base_url}/chat/api/speak/",
+                            json={'text': SAMPLE_TEXT, 'language': language}, stream=True)
+    ttfb = None
+    size = 0
+    for chunk in response.iter_content(chunk_size=4096):
+        if ttfb is None:
+            ttfb = time.perf_counter() - started
+        size += len(chunk)
+    total = time.perf_counter() - started
+    return response.status_code, ttfb or total, total, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--language', default='en')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda _: one_request(args.base_url, args.language), range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if r[0] == 200]
+    print(f"{len(ok)}/{len(results)} succeeded in {elapsed:.2f}s -> {len(ok) / elapsed:.2f} req/s")
+    summarize("time to first byte", [r[1] for r in ok])
+    summarize("total time", [r[2] for r in ok])
+    if ok:
+        print(f"mean audio size: {sum(r[3] for r in ok) / len(ok) / 1024:.1f}KB")
+
+
+if __name__ == '__main__':
+    main()
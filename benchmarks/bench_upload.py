@@ -0,0 +1,100 @@
+"""
+Benchmark plant-photo upload handling: peak Python memory and CPU time per
+upload for the default Django upload handlers + validate_image/Image.open
+(old path) versus ImageUploadHandler + preprocess_image (new path), with
+several uploads parsed concurrently. No Gemini calls are made.
+
+    python benchmarks/bench_upload.py samples/leaves/big.jpg --concurrency 8
+"""
+import argparse
+import io
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from common import setup_django, summarize
+
+setup_django()
+
+from django.conf import settings
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.http.multipartparser import MultiPartParser
+from PIL import Image
+
+from chat.upload_handlers import ImageUploadHandler
+from utils.image_processing import preprocess_image, validate_image
+
+BOUNDARY = 'farmbuddybenchboundary'
+
+
+def multipart_body(data):
+    return (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="image"; filename="leaf.jpg"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n').encode() + data + f'\r\n--{BOUNDARY}--\r\n'.encode()
+
+
+def parse(body, handlers):
+    meta = {
+        'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+        'CONTENT_LENGTH': str(len(body)),
+    }
+    return MultiPartParser(meta, io.BytesIO(body), handlers).parse()
+
+
+def old_path(body):
+    _, files = parse(body, [MemoryFileUploadHandler(), TemporaryFileUploadHandler()])
+    image_file = files['image']
+    validate_image(image_file)
+    img = Image.open(image_file)
+    img.load()
+
+
+def new_path(body):
+    handler = ImageUploadHandler()
+    _, files = parse(body, [handler])
+    image_file = files['image']
+    validate_image(image_file)
+    preprocess_image(image_file)
+
+
+def run(label, fn, body, uploads, concurrency):
+    cpu_times = []
+    lock = threading.Lock()
+
+    def one(_):
+        started = time.thread_time()
+        fn(body)
+        with lock:
+            cpu_times.append(time.thread_time() - started)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(uploads)))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label}: {uploads / elapsed:.1f} uploads/s, peak memory {peak / 1024 / 1024:.1f}MB "
+          f"({peak / concurrency / 1024 / 1024:.1f}MB per concurrent upload)")
+    summarize(f"{label} CPU per upload", cpu_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('image')
+    parser.add_argument('--uploads', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    with open(args.image, 'rb') as f:
+        body = multipart_body(f.read())
+    print(f"request body: {len(body) / 1024:.0f}KB, FILE_UPLOAD_MAX_MEMORY_SIZE="
+          f"{settings.FILE_UPLOAD_MAX_MEMORY_SIZE / 1024 / 1024:.1f}MB")
+
+    run("old path", old_path, body, args.uploads, args.concurrency)
+    run("new path", new_path, body, args.uploads, args.concurrency)
+
+
+if __name__ == '__main__':
+    main()
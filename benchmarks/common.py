@@ -0,0 +1,172 @@
+"""
+Shared helpers for the benchmark scripts in this folder.
+
+Most scripts talk to a running dev server (python manage.py runserver) and can
+be pointed at a different host with --base-url.
+"""
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# Make the project importable when scripts are run directly
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+DEFAULT_BASE_URL = "http://127.0.0.1:8000"
+
+
+def get_session(base_url=DEFAULT_BASE_URL):
+    """Open a requests session with a Django session and CSRF token"""
+    import requests
+
+    session = requests.Session()
+    session.get(f"{base_url}/chat/")
+    token = session.cookies.get('csrftoken')
+    if token:
+        session.headers['X-CSRFToken'] = token
+    session.headers['Referer'] = f"{base_url}/chat/"
+    return session
+
+
+def setup_django():
+    """Configure Django for scripts that use the ORM directly"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'farmbuddy_web.settings')
+    import django
+    django.setup()
+
+
+def setup_test_database(test_name=None):
+    """
+    Configure Django against a throwaway test database (same engine as settings)
+    and an in-memory cache, so seeded benchmark data never touches the real ones.
+    test_name: database name/file to use (SQLite otherwise tests in memory)
+    Returns: teardown callable
+    """
+    setup_django()
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment
+
+    if test_name:
+        connection.settings_dict['TEST']['NAME'] = test_name
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    cache_settings = override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    cache_settings.enable()
+
+    def teardown():
+        cache_settings.disable()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+    return teardown
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(label, values, unit="ms", scale=1000.0):
+    """Print mean/p50/p95/max for a list of durations in seconds"""
+    if not values:
+        print(f"{label}: no samples")
+        return
+    scaled = [v * scale for v in values]
+    print(f"{label}: n={len(scaled)} mean={statistics.mean(scaled):.1f}{unit} "
+          f"p50={percentile(scaled, 50):.1f}{unit} p95={percentile(scaled, 95):.1f}{unit} "
+          f"max={max(scaled):.1f}{unit}")
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+
+
+class FakeTelegramAPI(ThreadingHTTPServer):
+    """
+    Local stand-in for the Telegram Bot API (use as TELEGRAM_API_URL).
+    Answers the methods the bot uses and records what it sent.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeTelegramHandler)
+        self.lock = threading.Lock()
+        self.replies = defaultdict(list)  # chat_id -> [(time, text)] for sendMessage
+        self.calls = defaultdict(list)    # chat_id -> [(time, method, text)] for every method
+        self.files = {}                   # file_id -> bytes served by getFile + download
+        self.message_id = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/bot"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        method = self.path.rsplit('/', 1)[-1]
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            params = json.loads(body or '{}')
+        else:
+            params = {key: values[0] for key, values in parse_qs(body).items()}
+
+        now = time.perf_counter()
+        chat_id = int(params['chat_id']) if 'chat_id' in params else None
+        text = params.get('text', '')
+        result = True
+        with self.server.lock:
+            if chat_id is not None:
+                self.server.calls[chat_id].append((now, method, text))
+            if method == 'getMe':
+                result = {'id': 1, 'is_bot': True, 'first_name': 'FarmBuddy', 'username': 'farmbuddy_bot'}
+            elif method == 'getFile':
+                file_id = params['file_id']
+                result = {'file_id': file_id, 'file_unique_id': file_id,
+                          'file_size': len(self.server.files[file_id]), 'file_path': file_id}
+            elif method in ('sendMessage', 'editMessageText'):
+                if method == 'sendMessage':
+                    self.server.message_id += 1
+                    message_id = self.server.message_id
+                    self.server.replies[chat_id].append((now, text))
+                else:
+                    message_id = int(params['message_id'])
+                result = {'message_id': message_id, 'date': int(time.time()),
+                          'chat': {'id': chat_id, 'type': 'private'}, 'text': text}
+
+        self.respond(json.dumps({'ok': True, 'result': result}).encode(), 'application/json')
+
+    def do_GET(self):
+        # File downloads: /file/bot<token>/<file_path>
+        data = self.server.files.get(self.path.rsplit('/', 1)[-1])
+        if data is None:
+            self.send_error(404)
+            return
+        self.respond(data, 'application/octet-stream')
+
+    def respond(self, payload, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
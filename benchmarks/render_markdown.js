@@ -0,0 +1,19 @@
+// Time marked.parse over a JSON array of markdown strings read from stdin,
+// the work chat.js does for server-rendered messages on page load.
+//
+//     echo '["**hi**", "- a\n- b"]' | node benchmarks/render_markdown.js
+const path = require('path');
+const { marked } = require(path.join(__dirname, '..', 'chat', 'static', 'js', 'marked.min.js'));
+
+let input = '';
+process.stdin.on('data', chunk => { input += chunk; });
+process.stdin.on('end', () => {
+    const texts = JSON.parse(input);
+    const started = process.hrtime.bigint();
+    let htmlBytes = 0;
+    for (const text of texts) {
+        htmlBytes += marked.parse(text).length;
+    }
+    const ms = Number(process.hrtime.bigint() - started) / 1e6;
+    console.log(JSON.stringify({ messages: texts.length, ms: ms, html_bytes: htmlBytes }));
+});
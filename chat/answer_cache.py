@@ -0,0 +1,40 @@
+"""
+Recent answers by question, for rate-limited chat requests
+
+When the 'chat' rate limit degrades, the web app and the bot don't call
+Gemini; they repeat a recent answer to the same question (same words,
+ignoring case, punctuation and spacing, same language) or refuse. Answers
+live in the shared Django cache for ANSWER_CACHE_TTL seconds.
+
+An answer built from a conversation's history or weather context (the
+user's location) is only repeated in that conversation; only answers to a
+first question without weather context are shared between users.
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+# Failed or refused answers from ask_gemini must never be repeated
+ERROR_MARKERS = ("[Error: Interrupted]", "I cannot answer that request")
+
+
+def _key(question, language, conversation_id=None):
+    words = ' '.join(_WORD.findall(question.lower()))
+    scope = conversation_id if conversation_id is not None else 'any'
+    return f"chat:answer:{scope}:{language}:{hashlib.sha1(words.encode()).hexdigest()}"
+
+
+def lookup(question, language, conversation_id):
+    """A recent answer to the question in this conversation, else a shared one, or None"""
+    answers = cache.get_many([_key(question, language, conversation_id), _key(question, language)])
+    return answers.get(_key(question, language, conversation_id), answers.get(_key(question, language)))
+
+
+def remember(question, language, answer, conversation_id=None):
+    """conversation_id: the conversation the answer depends on (history, weather context); None to share it"""
+    if answer and question.strip() and not any(marker in answer for marker in ERROR_MARKERS):
+        cache.set(_key(question, language, conversation_id), answer, settings.ANSWER_CACHE_TTL)
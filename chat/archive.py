@@ -0,0 +1,164 @@
+"""
+Archive of inactive conversations (web app)
+
+`python manage.py archive_conversations` moves the messages of
+conversations untouched for CHAT_ARCHIVE_AFTER_DAYS out of chat_message
+into a separate SQLite file (CHAT_ARCHIVE_DB): one row per conversation,
+its messages as zlib-compressed JSON lines. The Conversation row stays as
+a stub (title, session, updated_at) with archived_at set, so the sidebar
+is unchanged. Opening, paging, or writing to an archived conversation
+restores its messages first (restore()).
+
+Image files are not moved; the archive keeps their names (see
+image_names(), used by compact_images --prune-orphans). Archived messages
+are not in the search index until they are restored.
+"""
+import json
+import sqlite3
+import threading
+import zlib
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import page_cache
+from .models import Conversation, Message
+
+MESSAGE_FIELDS = ('role', 'content', 'image', 'thumbnail', 'created_at')
+
+
+def _pack(messages):
+    lines = (json.dumps({
+        'role': message['role'],
+        'content': message['content'],
+        'image': message['image'] or '',
+        'thumbnail': message['thumbnail'] or '',
+        'created_at': message['created_at'].isoformat(),
+    }, ensure_ascii=False) for message in messages)
+    return zlib.compress('\n'.join(lines).encode(), 6)
+
+
+def _unpack(data):
+    text = zlib.decompress(data).decode()
+    return [json.loads(line) for line in text.split('\n')] if text else []
+
+
+class ConversationArchive:
+    def __init__(self, path=None):
+        self.path = str(path or settings.CHAT_ARCHIVE_DB)
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=20, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS archived_conversations (
+                    id INTEGER PRIMARY KEY,   -- Conversation.id
+                    session_key TEXT,
+                    title TEXT,
+                    archived_at TEXT NOT NULL,
+                    message_count INTEGER NOT NULL,
+                    messages BLOB NOT NULL    -- zlib(JSON lines of MESSAGE_FIELDS)
+                )""")
+            self._local.connection = connection
+        return connection
+
+    # ----- archiving (management command) -----
+
+    def store(self, conversations, messages_by_conversation, archived_at):
+        """Write a batch of conversations (dicts with id, session_key, title) in one transaction"""
+        rows = [(conversation['id'], conversation['session_key'], conversation['title'], archived_at.isoformat(),
+                 len(messages_by_conversation.get(conversation['id'], ())),
+                 _pack(messages_by_conversation.get(conversation['id'], ())))
+                for conversation in conversations]
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany("INSERT OR REPLACE INTO archived_conversations VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def archive_batch(self, conversations, cutoff):
+        """
+        Move the messages of `conversations` (dicts with id, session_key, title)
+        to the archive. Copies first, then marks and deletes in one short
+        transaction on the primary database; a conversation that got a message
+        meanwhile (updated_at moved past cutoff) is left alone.
+        Returns: (conversations archived, messages archived)
+        """
+        ids = [conversation['id'] for conversation in conversations]
+        messages_by_conversation = {}
+        last_message_id = 0
+        for message in (Message.objects.filter(conversation_id__in=ids)
+                        .order_by('conversation_id', 'created_at', 'id')
+                        .values('id', 'conversation_id', *MESSAGE_FIELDS)):
+            messages_by_conversation.setdefault(message['conversation_id'], []).append(message)
+            last_message_id = max(last_message_id, message['id'])
+
+        now = timezone.now()
+        self.store(conversations, messages_by_conversation, now)
+
+        with transaction.atomic():
+            Conversation.objects.filter(id__in=ids, archived_at__isnull=True, updated_at__lt=cutoff) \
+                .update(archived_at=now)
+            archived = set(Conversation.objects.filter(id__in=ids, archived_at=now).values_list('id', flat=True))
+            # Only the copied rows: anything newer stays (and is merged back on restore)
+            deleted, _ = Message.objects.filter(conversation_id__in=archived, id__lte=last_message_id).delete()
+
+        skipped = [conversation_id for conversation_id in ids if conversation_id not in archived]
+        if skipped:
+            self.discard(*skipped)
+        return len(archived), deleted
+
+    # ----- lazy restore -----
+
+    def restore(self, conversation):
+        """Bring an archived conversation's messages back into chat_message. No-op for live ones."""
+        if conversation.archived_at is None:
+            return 0
+        row = self._connection().execute(
+            "SELECT messages FROM archived_conversations WHERE id = ?", (conversation.id,)).fetchone()
+        messages = _unpack(row[0]) if row else []
+
+        with transaction.atomic():
+            # Only the request that clears archived_at inserts; concurrent ones wait on the row, then find it done
+            if Conversation.objects.filter(id=conversation.id, archived_at__isnull=False).update(archived_at=None):
+                Message.objects.bulk_create([
+                    Message(conversation_id=conversation.id, role=message['role'], content=message['content'],
+                            image=message['image'], thumbnail=message['thumbnail'],
+                            created_at=parse_datetime(message['created_at']))
+                    for message in messages], batch_size=500)
+            else:
+                messages = []
+        conversation.archived_at = None
+        self.discard(conversation.id)
+        # Restored messages have new ids: cached pages hold cursors with the old ones
+        page_cache.touch_conversation(conversation)
+        return len(messages)
+
+    def discard(self, *conversation_ids):
+        connection = self._connection()
+        with connection:
+            connection.executemany("DELETE FROM archived_conversations WHERE id = ?",
+                                   [(conversation_id,) for conversation_id in conversation_ids])
+
+    # ----- maintenance -----
+
+    def image_names(self):
+        """Image and thumbnail file names referenced by archived messages"""
+        names = set()
+        for (data,) in self._connection().execute("SELECT messages FROM archived_conversations"):
+            for message in _unpack(data):
+                names.update(name for name in (message['image'], message['thumbnail']) if name)
+        return names
+
+    def stats(self):
+        """(conversations, messages, compressed bytes) in the archive"""
+        return self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(message_count), 0), COALESCE(SUM(LENGTH(messages)), 0) "
+            "FROM archived_conversations").fetchone()
+
+
+conversation_archive = ConversationArchive()
@@ -0,0 +1,225 @@
+"""
+Conversations shared by the web app and the Telegram bot
+
+Both keep their history as Conversation/Message rows and go through this
+service for it:
+- append(conversation, role, content)   save a message (write-behind with CHAT_WRITE_BEHIND)
+- window(conversation)                  the last CHAT_HISTORY_WINDOW messages, for the model
+- context(conversation)                 {'language', 'weather_context'}; set_context() changes them
+- telegram_conversation(chat_id)        a Telegram chat's current conversation (TelegramSession.conversation);
+                                        new_telegram_conversation() for /clear
+
+hot tier: in-memory LRU of recent windows and contexts, expired after a TTL.
+  Each entry carries the conversation's page_cache messages token and is only
+  used while the token is unchanged, so appends made by other processes (web
+  workers, the bot) are seen on the next read (except for the narrow race
+  described in append()).
+cold tier: the database, through message_buffer and the archive (archived
+  conversations are restored on first use).
+
+The a*() variants are for the bot's async handlers and run in a thread.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from . import page_cache
+from .archive import conversation_archive
+from .message_buffer import message_buffer
+from .models import Conversation, TelegramSession
+
+TELEGRAM_PREFIX = 'telegram:'  # session_key of Telegram conversations: telegram:<chat_id>
+CONTEXT_FIELDS = ('language', 'weather_context')
+
+
+class _Entry:
+    __slots__ = ('version', 'window', 'context', 'last_access')
+
+    def __init__(self, version, window, context):
+        self.version = version
+        self.window = window
+        self.context = context
+        self.last_access = time.monotonic()
+
+
+class ConversationService:
+    def __init__(self, max_entries=None, ttl=None, window_size=None, max_message_chars=None):
+        self.max_entries = max_entries or settings.CHAT_HOT_CONVERSATIONS
+        self.ttl = ttl or settings.CHAT_HOT_TTL
+        self.window_size = window_size or settings.CHAT_HISTORY_WINDOW
+        self.max_message_chars = max_message_chars or settings.CHAT_HISTORY_MAX_CHARS
+
+        self._hot = OrderedDict()  # conversation_id -> _Entry
+        self._lock = threading.Lock()
+
+    # ----- hot tier -----
+
+    def _cached(self, conversation_id):
+        """Entry if it is still current, else None"""
+        with self._lock:
+            entry = self._hot.get(conversation_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.last_access > self.ttl:
+                del self._hot[conversation_id]
+                return None
+        if entry.version is None or page_cache.messages_version(conversation_id) != entry.version:
+            return None
+        with self._lock:
+            entry.last_access = time.monotonic()
+            self._hot.move_to_end(conversation_id)
+        return entry
+
+    def _remember(self, conversation_id, entry):
+        with self._lock:
+            self._hot[conversation_id] = entry
+            self._hot.move_to_end(conversation_id)
+            while len(self._hot) > self.max_entries:
+                self._hot.popitem(last=False)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._hot)
+
+    def _clip(self, role, content):
+        if len(content) > self.max_message_chars:
+            content = content[:self.max_message_chars]
+        return {'role': role, 'content': content}
+
+    # ----- cold tier -----
+
+    def _load(self, conversation):
+        """Read window and context from the database (restoring an archived conversation first)"""
+        # Another process may have archived it since this instance was loaded
+        conversation.refresh_from_db(fields=['archived_at', *CONTEXT_FIELDS])
+        conversation_archive.restore(conversation)
+        # Token before the read: an append racing with it changes the token and the entry is never used
+        version = page_cache.messages_version(conversation.id) or page_cache.touch_messages(conversation.id)
+        message_buffer.sync(conversation.id)
+        rows = conversation.messages.order_by('-created_at', '-id').values('role', 'content')[:self.window_size]
+        window = deque((self._clip(row['role'], row['content']) for row in reversed(rows)), maxlen=self.window_size)
+        entry = _Entry(version, window, {field: getattr(conversation, field) for field in CONTEXT_FIELDS})
+        self._remember(conversation.id, entry)
+        return entry
+
+    def _entry(self, conversation):
+        return self._cached(conversation.id) or self._load(conversation)
+
+    # ----- history -----
+
+    def window(self, conversation):
+        """The conversation's last CHAT_HISTORY_WINDOW messages as [{'role', 'content'}], oldest first"""
+        entry = self._entry(conversation)
+        with self._lock:
+            return list(entry.window)
+
+    def append(self, conversation, role, content, **fields):
+        """Save a message (fields: image, thumbnail) and add it to the cached window. Returns the Message."""
+        entry = self._cached(conversation.id)
+        if entry is None:
+            # Not used lately, so it may have been archived (a telegram_conversation() instance can't tell)
+            conversation.refresh_from_db(fields=['archived_at'])
+            conversation_archive.restore(conversation)
+        message = message_buffer.add(conversation, role, content, **fields)
+        # After saving: a page or window loaded for the new token includes this message.
+        # (Another process appending between the check above and this touch is not seen
+        # by the cached window; the same conversation is practically never written that way.)
+        version = page_cache.touch_conversation(conversation)
+        if entry is not None:
+            with self._lock:
+                entry.window.append(self._clip(role, content))
+                entry.version = version
+        return message
+
+    # ----- context -----
+
+    def context(self, conversation):
+        """{'language', 'weather_context'} of the conversation (None when not set)"""
+        entry = self._entry(conversation)
+        with self._lock:
+            return dict(entry.context)
+
+    def set_context(self, conversation, **fields):
+        """Change language and/or weather_context; unchanged values are not written"""
+        entry = self._entry(conversation)
+        changed = {field: value for field, value in fields.items() if entry.context.get(field) != value}
+        if not changed:
+            return
+        Conversation.objects.filter(id=conversation.id).update(**changed)
+        for field, value in changed.items():
+            setattr(conversation, field, value)
+        version = page_cache.touch_messages(conversation.id)
+        with self._lock:
+            entry.context.update(changed)
+            entry.version = version
+
+    # ----- Telegram chats -----
+
+    def _telegram_key(self, chat_id):
+        return f"chat:telegram:{chat_id}"
+
+    def _set_telegram_conversation(self, chat_id, conversation_id):
+        # The row may not exist yet: the session store writes it (data only) when it next flushes
+        TelegramSession.objects.update_or_create(chat_id=chat_id, defaults={'conversation_id': conversation_id})
+        cache.set(self._telegram_key(chat_id), conversation_id, page_cache.VERSION_TTL)
+
+    def telegram_conversation(self, chat_id):
+        """The chat's current conversation, created on its first message"""
+        session_key = f"{TELEGRAM_PREFIX}{chat_id}"
+        conversation_id = cache.get(self._telegram_key(chat_id))
+        if conversation_id is None:
+            conversation_id = TelegramSession.objects.filter(chat_id=chat_id) \
+                .values_list('conversation_id', flat=True).first()
+            if conversation_id is not None:
+                cache.set(self._telegram_key(chat_id), conversation_id, page_cache.VERSION_TTL)
+        if conversation_id is not None:
+            # No query: the service only needs id and session_key (_load and append check the rest)
+            return Conversation(id=conversation_id, session_key=session_key)
+        # First message, or a chat from before the mapping was stored: its latest conversation
+        conversation = Conversation.objects.filter(session_key=session_key).order_by('-updated_at').first()
+        if conversation is None:
+            conversation = Conversation.objects.create(session_key=session_key, title="Telegram chat")
+        self._set_telegram_conversation(chat_id, conversation.id)
+        return conversation
+
+    def new_telegram_conversation(self, chat_id):
+        """/clear: start an empty conversation, keeping language and weather context"""
+        context = self.context(self.telegram_conversation(chat_id))
+        conversation = Conversation.objects.create(session_key=f"{TELEGRAM_PREFIX}{chat_id}", title="Telegram chat",
+                                                   **context)
+        self._set_telegram_conversation(chat_id, conversation.id)
+        return conversation
+
+    # ----- async (bot handlers) -----
+
+    async def _run(self, method, *args, **kwargs):
+        def call():
+            close_old_connections()
+            return method(*args, **kwargs)
+        return await asyncio.to_thread(call)
+
+    async def awindow(self, conversation):
+        return await self._run(self.window, conversation)
+
+    async def aappend(self, conversation, role, content, **fields):
+        return await self._run(self.append, conversation, role, content, **fields)
+
+    async def acontext(self, conversation):
+        return await self._run(self.context, conversation)
+
+    async def aset_context(self, conversation, **fields):
+        return await self._run(self.set_context, conversation, **fields)
+
+    async def atelegram_conversation(self, chat_id):
+        return await self._run(self.telegram_conversation, chat_id)
+
+    async def anew_telegram_conversation(self, chat_id):
+        return await self._run(self.new_telegram_conversation, chat_id)
+
+
+conversation_service = ConversationService()
@@ -0,0 +1,90 @@
+"""
+Near-duplicate lookup of previous plant diagnoses
+
+Hashes live in the ImageDiagnosis table; each process keeps a compact
+in-memory HashIndex of them and picks up rows written by other processes
+(web workers, the Telegram bot) every DIAGNOSIS_CACHE_REFRESH seconds.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F
+
+from utils.image_hash import HashIndex, dhash, to_signed
+
+from .models import ImageDiagnosis
+
+# Responses produced by analyze_plant_image on failure must never be cached
+ERROR_MARKERS = ("Error analyzing image", "[Error: Interrupted]")
+
+
+class DiagnosisCache:
+    def __init__(self):
+        self._index = HashIndex()
+        self._last_id = 0
+        self._last_refresh = None
+        self._local_ids = set()  # added by remember(), skipped on refresh
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return settings.DIAGNOSIS_CACHE_ENABLED
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._last_refresh is not None and now - self._last_refresh < settings.DIAGNOSIS_CACHE_REFRESH:
+            return
+        with self._lock:
+            if self._last_refresh is not None and now - self._last_refresh < settings.DIAGNOSIS_CACHE_REFRESH:
+                return
+            rows = (ImageDiagnosis.objects.filter(id__gt=self._last_id)
+                    .order_by('id').values_list('id', 'image_hash'))
+            ids, hashes = [], []
+            for row_id, image_hash in rows.iterator(chunk_size=10000):
+                self._last_id = row_id
+                if row_id in self._local_ids:
+                    self._local_ids.discard(row_id)
+                    continue
+                ids.append(row_id)
+                hashes.append(image_hash)
+            if ids:
+                self._index.add_many(ids, hashes)
+            self._last_refresh = now
+
+    def lookup(self, img, max_distance=None):
+        """
+        Find a previous diagnosis for a near-identical image
+        img: PIL image (e.g. PreparedImage.image)
+        max_distance: Hamming distance accepted (default DIAGNOSIS_CACHE_MAX_DISTANCE)
+        Returns: (image_hash, diagnosis text or None)
+        """
+        image_hash = to_signed(dhash(img))
+        if not self.enabled:
+            return image_hash, None
+
+        self._refresh()
+        match = self._index.nearest(image_hash, max_distance or settings.DIAGNOSIS_CACHE_MAX_DISTANCE)
+        if match is None:
+            return image_hash, None
+
+        diagnosis_id, distance = match
+        diagnosis = ImageDiagnosis.objects.filter(id=diagnosis_id).values_list('diagnosis', flat=True).first()
+        if diagnosis is None:
+            return image_hash, None
+        ImageDiagnosis.objects.filter(id=diagnosis_id).update(hit_count=F('hit_count') + 1)
+        print(f"Diagnosis cache hit: #{diagnosis_id} (distance {distance})")
+        return image_hash, diagnosis
+
+    def remember(self, image_hash, diagnosis):
+        """Store a fresh diagnosis so near-duplicates can reuse it"""
+        if not self.enabled or not diagnosis or any(marker in diagnosis for marker in ERROR_MARKERS):
+            return
+        entry = ImageDiagnosis.objects.create(image_hash=image_hash, diagnosis=diagnosis)
+        with self._lock:
+            if entry.id > self._last_id:
+                self._local_ids.add(entry.id)
+        self._index.add(entry.id, image_hash)
+
+
+diagnosis_cache = DiagnosisCache()
@@ -0,0 +1,75 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from chat.archive import conversation_archive
+from chat.models import Conversation
+
+
+class Command(BaseCommand):
+    help = ('Moves the messages of inactive conversations into the compressed archive (CHAT_ARCHIVE_DB); '
+            'they are restored when the conversation is opened again')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CHAT_ARCHIVE_AFTER_DAYS,
+                            help='Archive conversations without activity for this many days')
+        parser.add_argument('--batch-size', type=int, default=100, help='Conversations per transaction')
+        parser.add_argument('--pause', type=float, default=0.1,
+                            help='Seconds to sleep between batches, so live requests get the database')
+        parser.add_argument('--max-batches', type=int, default=0, help='Stop after this many batches (0: no limit)')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='Reclaim space afterwards (SQLite: VACUUM blocks writers while it runs)')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        conversations_archived = 0
+        messages_archived = 0
+        batches = 0
+        last_id = 0
+
+        while not options['max_batches'] or batches < options['max_batches']:
+            # Keyset on id: every batch is a short indexed range, and the job can be stopped and rerun anytime
+            batch = list(
+                Conversation.objects.filter(id__gt=last_id, archived_at__isnull=True, updated_at__lt=cutoff)
+                .order_by('id')
+                .values('id', 'session_key', 'title')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_id = batch[-1]['id']
+            batches += 1
+
+            if options['dry_run']:
+                conversations_archived += len(batch)
+                continue
+            try:
+                archived, messages = conversation_archive.archive_batch(batch, cutoff)
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f"Batch after conversation {batch[0]['id']}: {e}"))
+                continue
+            conversations_archived += archived
+            messages_archived += messages
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  up to conversation {last_id}: {archived} conversations, {messages} messages")
+            time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {conversations_archived} conversations ({messages_archived} messages) in {batches} batches"
+            + (" (dry run)" if options['dry_run'] else "")))
+
+        if options['vacuum'] and not options['dry_run']:
+            self.vacuum()
+
+    def vacuum(self):
+        started = time.monotonic()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("VACUUM (ANALYZE) chat_message")  # space is reused, doesn't lock out writers
+            else:
+                cursor.execute("VACUUM")
+        self.stdout.write(self.style.SUCCESS(f"Vacuumed the database in {time.monotonic() - started:.1f}s"))
@@ -0,0 +1,139 @@
+import io
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from chat.archive import conversation_archive
+from chat.media_storage import IMAGE_FOLDER, THUMBNAIL_FOLDER, is_content_addressed, store_content_addressed
+from chat.message_buffer import message_buffer
+from chat.models import Message
+from utils.image_processing import STORED_IMAGE_SIZE, THUMBNAIL_SIZE, encode_webp
+
+
+class Command(BaseCommand):
+    help = 'Recompresses old plant images into compact WebP, adds missing thumbnails and prunes orphaned files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Compact images older than this many days')
+        parser.add_argument('--quality', type=int, default=60, help='WebP quality for compacted originals')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--prune-orphans', action='store_true', help='Delete image files no message refers to')
+        parser.add_argument('--grace-minutes', type=int, default=60,
+                            help='Never prune files younger than this (an upload is stored before its message)')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        saved_bytes = 0
+        compacted = 0
+        last_id = 0
+        grace = timedelta(minutes=options['grace_minutes'])
+        archived_names = conversation_archive.image_names()  # files archived messages still use
+
+        while True:
+            batch = list(
+                Message.objects.filter(id__gt=last_id, created_at__lt=cutoff)
+                .exclude(Q(image='') | Q(image__isnull=True))
+                .order_by('id')
+                .only('id', 'image', 'thumbnail')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            for message in batch:
+                try:
+                    saved_bytes += self.compact_message(message, options['quality'], options['dry_run'],
+                                                       archived_names, grace)
+                    compacted += 1
+                except Exception as e:
+                    self.stdout.write(self.style.WARNING(f"Message {message.id}: {e}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {compacted} images, saved {saved_bytes / (1024 * 1024):.1f}MB"
+            + (" (dry run)" if options['dry_run'] else "")))
+
+        if options['prune_orphans']:
+            self.prune_orphans(options['dry_run'], grace)
+
+    def recently_stored(self, name, grace):
+        """True if the file may belong to a message that isn't written yet (upload in progress, write-behind)"""
+        try:
+            return default_storage.get_modified_time(name) > timezone.now() - grace
+        except NotImplementedError:
+            return True  # storage can't tell how old it is: keep it
+
+    def compact_message(self, message, quality, dry_run, archived_names=frozenset(), grace=timedelta(hours=1)):
+        """Re-encode one message's image as content-addressed WebP. Returns bytes saved."""
+        old_name = message.image.name
+        needs_image = not (old_name.endswith('.webp') and is_content_addressed(old_name))
+        needs_thumbnail = not message.thumbnail
+        if not needs_image and not needs_thumbnail:
+            return 0
+        if not default_storage.exists(old_name):
+            raise Exception(f"missing file {old_name}")
+
+        old_size = default_storage.size(old_name)
+        with default_storage.open(old_name, 'rb') as f:
+            img = Image.open(io.BytesIO(f.read()))
+            img.draft('RGB', (STORED_IMAGE_SIZE, STORED_IMAGE_SIZE))
+            img = ImageOps.exif_transpose(img).convert('RGB')
+
+        img.thumbnail((STORED_IMAGE_SIZE, STORED_IMAGE_SIZE), Image.Resampling.LANCZOS)
+        compact_bytes = encode_webp(img, quality) if needs_image else None
+        thumbnail = img.copy()
+        thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.LANCZOS)
+
+        saved = old_size - len(compact_bytes) if compact_bytes and len(compact_bytes) < old_size else 0
+        if dry_run:
+            return saved
+
+        update_fields = []
+        if needs_thumbnail:
+            message.thumbnail = store_content_addressed(encode_webp(thumbnail), 'webp', THUMBNAIL_FOLDER)
+            update_fields.append('thumbnail')
+        if saved:
+            message.image = store_content_addressed(compact_bytes, 'webp')
+            update_fields.append('image')
+        if update_fields:
+            message.save(update_fields=update_fields)
+
+        # Only delete the old file once nothing refers to it any more, archived messages included.
+        # An identical upload may have just reused it (store_content_addressed touches it) for a message
+        # still in this process's write-behind queue, or another's: hence the flush and the grace period.
+        if saved and old_name not in archived_names:
+            message_buffer.flush()
+            if not Message.objects.filter(image=old_name).exists() and not self.recently_stored(old_name, grace):
+                default_storage.delete(old_name)
+        return saved
+
+    def prune_orphans(self, dry_run, grace):
+        referenced = set(Message.objects.exclude(image='').values_list('image', flat=True))
+        referenced |= set(Message.objects.exclude(thumbnail='').values_list('thumbnail', flat=True))
+        referenced |= conversation_archive.image_names()  # archived conversations keep their files
+
+        removed = 0
+        freed = 0
+        for name in self.walk(IMAGE_FOLDER):
+            if name in referenced or self.recently_stored(name, grace):
+                continue
+            freed += default_storage.size(name)
+            removed += 1
+            if not dry_run:
+                default_storage.delete(name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Pruned {removed} orphaned files ({freed / (1024 * 1024):.1f}MB)" + (" (dry run)" if dry_run else "")))
+
+    def walk(self, folder):
+        if not default_storage.exists(folder):
+            return
+        directories, files = default_storage.listdir(folder)
+        for name in files:
+            yield f"{folder}/{name}"
+        for directory in directories:
+            yield from self.walk(f"{folder}/{directory}")
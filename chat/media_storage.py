@@ -0,0 +1,41 @@
+"""
+Content-addressed storage for uploaded plant images
+
+Files are named after the SHA-256 of their bytes
+(plant_images/ab/cd/abcd....jpg), so identical uploads share one file.
+"""
+import hashlib
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+IMAGE_FOLDER = 'plant_images'
+THUMBNAIL_FOLDER = 'plant_images/thumbs'
+
+
+def content_addressed_name(data, ext, folder=IMAGE_FOLDER):
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{folder}/{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+
+
+def store_content_addressed(data, ext, folder=IMAGE_FOLDER):
+    """
+    Save bytes under their content hash unless an identical file already exists
+    Returns: storage name to assign to a FileField
+    """
+    name = content_addressed_name(data, ext, folder)
+    if default_storage.exists(name):
+        # Reused file: mark it as new so compact_images --prune-orphans waits for its message
+        try:
+            os.utime(default_storage.path(name))
+        except (NotImplementedError, OSError):
+            pass
+        return name
+    return default_storage.save(name, ContentFile(data))
+
+
+def is_content_addressed(name):
+    """True if `name` already follows the content-addressed layout"""
+    parts = name.split('/')
+    return len(parts) >= 4 and len(parts[-3]) == 2 and len(parts[-2]) == 2 and len(parts[-1].split('.')[0]) == 64
@@ -0,0 +1,162 @@
+"""
+Write-behind buffer for chat messages (web app)
+
+With CHAT_WRITE_BEHIND on, send_message and upload_image don't INSERT each
+Message as it happens. Messages and their conversation's updated_at bump
+are queued here and written by a background thread in one transaction
+(bulk_create + one UPDATE) every CHAT_FLUSH_INTERVAL seconds, when
+CHAT_FLUSH_BATCH messages are waiting, and on shutdown.
+
+Read-your-writes: history() merges a conversation's queued messages with
+its rows, and sync() flushes before a page reads the table directly. This
+holds within one process; other processes see messages after the next flush,
+which rotates the conversation's page_cache token so nothing they cached
+meanwhile is reused.
+
+With CHAT_WRITE_BEHIND off, add() saves immediately.
+"""
+import atexit
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from . import page_cache
+from .models import Conversation, Message
+
+
+class MessageBuffer:
+    def __init__(self, enabled=None, flush_interval=None, flush_batch=None):
+        self.enabled = settings.CHAT_WRITE_BEHIND if enabled is None else enabled
+        self.flush_interval = flush_interval or settings.CHAT_FLUSH_INTERVAL
+        self.flush_batch = flush_batch or settings.CHAT_FLUSH_BATCH
+
+        self._pending = defaultdict(list)  # conversation_id -> unsaved Messages, oldest first
+        self._count = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # held while a batch is written; readers wait on it
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._flusher = None
+
+    def _start(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="message-flusher", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
+
+    # ----- writes -----
+
+    def add(self, conversation, role, content, **fields):
+        """
+        Queue (or save) a message. Returns the Message; its id is only set once written.
+        Use conversation_service.append(), which also invalidates cached pages and windows.
+        """
+        message = Message(conversation=conversation, role=role, content=content,
+                          created_at=timezone.now(), **fields)
+        if not self.enabled:
+            message.save()
+            Conversation.objects.filter(id=conversation.id).update(updated_at=message.created_at)
+            return message
+
+        with self._lock:
+            self._start()
+            self._pending[conversation.id].append(message)
+            self._count += 1
+            pending = self._count
+        if pending >= self.flush_batch:
+            self._wakeup.set()
+        return message
+
+    def discard(self, conversation_id):
+        """Drop queued messages of a conversation that is being deleted"""
+        with self._flush_lock, self._lock:
+            self._count -= len(self._pending.pop(conversation_id, []))
+
+    # ----- reads -----
+
+    def history(self, conversation, fields=('role', 'content')):
+        """conversation.messages.values(*fields), including queued messages"""
+        with self._flush_lock:
+            rows = list(conversation.messages.all().values(*fields))
+            with self._lock:
+                queued = list(self._pending.get(conversation.id, ()))
+        return rows + [{field: getattr(message, field) for field in fields} for message in queued]
+
+    def count(self, conversation):
+        """conversation.messages.count(), including queued messages"""
+        with self._flush_lock:
+            rows = conversation.messages.count()
+            with self._lock:
+                return rows + len(self._pending.get(conversation.id, ()))
+
+    def sync(self, conversation_id):
+        """Write now if the conversation has queued messages (before reading its rows directly)"""
+        with self._lock:
+            queued = conversation_id in self._pending
+        if queued:
+            self.flush()
+
+    # ----- write-behind -----
+
+    def _flush_loop(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Message flush error: {e}")
+
+    def flush(self):
+        """Write all queued messages and updated_at bumps in one transaction. Returns messages written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(list)
+                self._count = 0
+            if not pending:
+                return 0
+            close_old_connections()
+            try:
+                return self._write(pending)
+            except IntegrityError:
+                # A conversation was deleted under its queued messages: drop those, keep the rest
+                existing = set(Conversation.objects.filter(id__in=pending).values_list('id', flat=True))
+                pending = {conversation_id: messages for conversation_id, messages in pending.items()
+                           if conversation_id in existing}
+                return self._write(pending) if pending else 0
+            except Exception:
+                # Put the batch back in front of anything queued meanwhile
+                with self._lock:
+                    for conversation_id, messages in pending.items():
+                        self._pending[conversation_id][:0] = messages
+                        self._count += len(messages)
+                raise
+
+    def _write(self, pending):
+        messages = [message for queued in pending.values() for message in queued]
+        with transaction.atomic():
+            Message.objects.bulk_create(messages, batch_size=500)
+            Conversation.objects.filter(id__in=pending).update(updated_at=timezone.now())
+        # Other processes may have cached these conversations (pages, history windows) without the
+        # messages they couldn't see yet; the new updated_at values reorder the owners' sidebars
+        for conversation_id in pending:
+            page_cache.touch_messages(conversation_id)
+        for session_key in {queued[0].conversation.session_key for queued in pending.values() if queued}:
+            page_cache.touch_sidebar(session_key)
+        return len(messages)
+
+    def close(self):
+        """Stop the background flusher and write everything that is queued"""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wakeup.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+        self.flush()
+
+
+message_buffer = MessageBuffer()
@@ -0,0 +1,66 @@
+# Full-text index over Message.content (see chat/search.py)
+#
+# SQLite: FTS5 table kept in sync with chat_message by triggers. Django
+# rebuilds SQLite tables for some ALTERs, which drops triggers, so later
+# migrations that remake chat_message must recreate them (create_sqlite_triggers).
+# Postgres: a generated tsvector column with a GIN index.
+
+from django.db import migrations
+
+SQLITE_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS chat_message_fts_insert AFTER INSERT ON chat_message BEGIN
+        INSERT INTO chat_message_fts (rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS chat_message_fts_delete AFTER DELETE ON chat_message BEGIN
+        INSERT INTO chat_message_fts (chat_message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS chat_message_fts_update AFTER UPDATE OF content ON chat_message BEGIN
+        INSERT INTO chat_message_fts (chat_message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO chat_message_fts (rowid, content) VALUES (new.id, new.content);
+    END""",
+]
+
+
+def create_sqlite_triggers(schema_editor):
+    for statement in SQLITE_TRIGGERS:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        # unicode61 + remove_diacritics folds Yoruba/Igbo tone and dot marks (ọ -> o, ẹ́ -> e);
+        # porter stems English and leaves words it doesn't recognise alone
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE chat_message_fts USING fts5("
+            "content, content='chat_message', content_rowid='id', "
+            "tokenize='porter unicode61 remove_diacritics 2')")
+        create_sqlite_triggers(schema_editor)
+        schema_editor.execute("INSERT INTO chat_message_fts (chat_message_fts) VALUES ('rebuild')")
+    elif vendor == 'postgresql':
+        # English stems plus 'simple' (lowercased words) for Hausa, Yoruba and Igbo
+        schema_editor.execute(
+            "ALTER TABLE chat_message ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+            "(to_tsvector('english', content) || to_tsvector('simple', content)) STORED")
+        schema_editor.execute("CREATE INDEX chat_message_search ON chat_message USING GIN (search_vector)")
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for name in ('insert', 'delete', 'update'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS chat_message_fts_{name}")
+        schema_editor.execute("DROP TABLE IF EXISTS chat_message_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("ALTER TABLE chat_message DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_conversation_session_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-19 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_message_search'),
+    ]
+
+    operations = [
+        # Nullable without a default: a plain ALTER TABLE ADD COLUMN, also on SQLite
+        migrations.AddField(
+            model_name='conversation',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Telegram histories become conversations (see chat/conversation_service.py)
+#
+# Each TelegramSession's stored history, language and weather context move to
+# a Conversation with session_key 'telegram:<chat_id>'; location and other
+# bot-only state stay in TelegramSession.data.
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+MOVED_KEYS = ('history', 'language', 'weather_context')
+
+
+def move_telegram_histories(apps, schema_editor):
+    TelegramSession = apps.get_model('chat', 'TelegramSession')
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+
+    for session in TelegramSession.objects.iterator(chunk_size=500):
+        data = session.data or {}
+        if not any(key in data for key in MOVED_KEYS):
+            continue
+        history = data.get('history') or []
+        conversation = Conversation.objects.create(
+            session_key=f"telegram:{session.chat_id}", title="Telegram chat",
+            language=data.get('language'), weather_context=data.get('weather_context'))
+        # Keep the order: one second apart, ending at the session's last update
+        Message.objects.bulk_create([
+            Message(conversation=conversation, role=message.get('role', 'user'), content=message.get('content', ''),
+                    created_at=session.updated_at - timedelta(seconds=len(history) - i))
+            for i, message in enumerate(history)])
+        Conversation.objects.filter(id=conversation.id).update(updated_at=session.updated_at)
+        session.data = {key: value for key, value in data.items() if key not in MOVED_KEYS}
+        session.save(update_fields=['data'])
+
+
+def restore_telegram_histories(apps, schema_editor):
+    """Back into TelegramSession.data, from each chat's latest conversation (messages of archived
+    conversations are in CHAT_ARCHIVE_DB and don't come back)"""
+    TelegramSession = apps.get_model('chat', 'TelegramSession')
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+
+    conversations = Conversation.objects.filter(session_key__startswith='telegram:')
+    # Oldest first: a chat's latest conversation is written last and wins
+    for conversation in conversations.order_by('updated_at', 'id').iterator(chunk_size=500):
+        session, _ = TelegramSession.objects.get_or_create(chat_id=int(conversation.session_key.split(':', 1)[1]))
+        data = session.data or {}
+        data['history'] = [{'role': role, 'content': content} for role, content in
+                           Message.objects.filter(conversation=conversation).order_by('created_at', 'id')
+                           .values_list('role', 'content')]
+        for key in ('language', 'weather_context'):
+            if getattr(conversation, key) is not None:
+                data[key] = getattr(conversation, key)
+        session.data = data
+        session.save(update_fields=['data'])
+    conversations.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0009_conversation_archived_at'),
+    ]
+
+    operations = [
+        # Nullable without a default: plain ALTER TABLE ADD COLUMN, also on SQLite
+        migrations.AddField(
+            model_name='conversation',
+            name='language',
+            field=models.CharField(blank=True, max_length=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='weather_context',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.RunPython(move_telegram_histories, restore_telegram_histories),
+    ]
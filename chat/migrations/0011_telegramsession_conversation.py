@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-19 21:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_conversation_context'),
+    ]
+
+    operations = [
+        # Nullable without a default: a plain ALTER TABLE ADD COLUMN, also on SQLite.
+        # Chats without it fall back to their latest conversation (ConversationService.telegram_conversation).
+        migrations.AddField(
+            model_name='telegramsession',
+            name='conversation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL,
+                                    related_name='+', to='chat.conversation'),
+        ),
+    ]
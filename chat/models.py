@@ -7,9 +7,17 @@ class Conversation(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     title = models.CharField(max_length=200, default="New Chat")
+    session_key = models.CharField(max_length=40, null=True, blank=True)  # browser session that owns it
+    archived_at = models.DateTimeField(null=True, blank=True)  # set while its messages are in chat.archive
+    language = models.CharField(max_length=8, null=True, blank=True)  # answer language ('en', 'ha', ...)
+    weather_context = models.TextField(null=True, blank=True)  # local weather summary given to the model
 
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            # Sidebar: a session's conversations, most recent first
+            models.Index(fields=['session_key', '-updated_at'], name='chat_conv_session_updated'),
+        ]
 
     def __str__(self):
         return f"Conversation {self.id}: {self.title}"
@@ -30,10 +38,38 @@ class Message(models.Model):
     role = models.CharField(max_length=10, choices=ROLE_CHOICES)
     content = models.TextField()
     image = models.ImageField(upload_to='plant_images/', null=True, blank=True)
+    thumbnail = models.ImageField(upload_to='plant_images/thumbs/', null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Keyset pagination of a conversation's messages on (created_at, id)
+            models.Index(fields=['conversation', '-created_at', '-id'], name='chat_msg_conv_created'),
+        ]
 
     def __str__(self):
         return f"{self.role}: {self.content[:50]}..."
+
+
+class ImageDiagnosis(models.Model):
+    """Vision diagnosis cached by perceptual hash of the analyzed photo"""
+    image_hash = models.BigIntegerField(db_index=True)
+    diagnosis = models.TextField()
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Diagnosis {self.id}: {self.diagnosis[:50]}..."
+
+
+class TelegramSession(models.Model):
+    """Persisted Telegram bot session (history, location, preferences) for one chat"""
+    chat_id = models.BigIntegerField(unique=True)
+    data = models.JSONField(default=dict)
+    # The chat's current conversation (chat.conversation_service); /clear starts a new one
+    conversation = models.ForeignKey(Conversation, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Telegram chat {self.chat_id}"
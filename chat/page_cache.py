@@ -0,0 +1,81 @@
+"""
+Invalidation for the cached parts of the chat page
+
+chat/index.html caches the sidebar and the message list as template
+fragments. Their cache keys include version tokens kept in the shared cache:
+- sidebar:<session_key>       replaced when one of the session's conversations
+                              is created, renamed, deleted or gets a message
+- messages:<conversation_id>  replaced when the conversation gets a message
+                              (chat.conversation_service also uses it to
+                              validate its in-memory history windows)
+The same tokens make up the page's ETag, so a repeat visit to an unchanged
+conversation is answered with 304 Not Modified without rendering anything.
+"""
+import hashlib
+import uuid
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+
+VERSION_TTL = 7 * 24 * 3600  # an expired token just means one fresh render
+
+
+def _sidebar_key(session_key):
+    return f"chat:sidebar:{session_key}"
+
+
+def _messages_key(conversation_id):
+    return f"chat:messages:{conversation_id}"
+
+
+def _new_token():
+    return uuid.uuid4().hex[:12]
+
+
+def versions(session_key, conversation_id):
+    """Current (sidebar, messages) tokens, created on first use"""
+    keys = [_sidebar_key(session_key), _messages_key(conversation_id)]
+    found = cache.get_many(keys)
+    missing = {key: _new_token() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, VERSION_TTL)
+        found.update(missing)
+    return found[keys[0]], found[keys[1]]
+
+
+def touch_sidebar(session_key):
+    if session_key:
+        cache.set(_sidebar_key(session_key), _new_token(), VERSION_TTL)
+
+
+def touch_conversation(conversation):
+    """A message was added: both the message list and the sidebar order change. Returns the new messages token."""
+    messages = _new_token()
+    tokens = {_messages_key(conversation.id): messages}
+    if conversation.session_key:
+        tokens[_sidebar_key(conversation.session_key)] = _new_token()
+    cache.set_many(tokens, VERSION_TTL)
+    return messages
+
+
+def messages_version(conversation_id):
+    """Current messages token, or None if there is none (yet)"""
+    return cache.get(_messages_key(conversation_id))
+
+
+def touch_messages(conversation_id):
+    """Something about the conversation changed that the sidebar doesn't show. Returns the new token."""
+    token = _new_token()
+    cache.set(_messages_key(conversation_id), token, VERSION_TTL)
+    return token
+
+
+def page_etag(session_key, conversation_id, csrf_cookie):
+    """
+    ETag of the chat page. The page embeds a CSRF token, which stays valid as
+    long as the CSRF cookie does; the static manifest hash changes on deploys.
+    """
+    sidebar, messages = versions(session_key, conversation_id)
+    manifest = getattr(staticfiles_storage, 'manifest_hash', '')
+    raw = f"{session_key}:{conversation_id}:{sidebar}:{messages}:{csrf_cookie}:{manifest}"
+    return hashlib.sha1(raw.encode()).hexdigest()
@@ -0,0 +1,177 @@
+"""
+Per-client token-bucket rate limiting shared by the web views and the bot
+
+Every client (web session, client IP, Telegram chat) gets one bucket per
+cost class ('chat', 'vision', 'tts', 'stt'), refilled continuously at
+RATE_LIMITS[cost_class]['per_minute'] up to 'burst' tokens. Buckets live in a
+small SQLite file (RATE_LIMIT_DB), so all web workers and the bot agree.
+Each check is a single atomic upsert.
+
+When a bucket is empty the cost class's 'action' decides what happens:
+- 'queue':   wait for a token (at most RATE_LIMIT_MAX_WAIT seconds), then reject
+- 'degrade': the caller serves a cheaper answer (see the call sites)
+- 'reject':  the caller refuses with a "slow down" message
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.http import JsonResponse
+
+ALLOW = 'allow'
+QUEUE = 'queue'
+DEGRADE = 'degrade'
+REJECT = 'reject'
+
+_CONSUME_SQL = """
+INSERT INTO buckets (key, tokens, updated) VALUES (:key, :capacity - :cost, :now)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = MIN(:capacity, tokens + (:now - updated) * :rate) - :cost,
+    updated = :now
+WHERE MIN(:capacity, tokens + (:now - updated) * :rate) >= :cost
+RETURNING tokens
+"""
+
+
+class RateLimited(Exception):
+    """Raised from worker code when a request was refused"""
+
+    def __init__(self, decision):
+        super().__init__(slow_down_message(decision))
+        self.decision = decision
+
+
+class RateLimitDecision(namedtuple('RateLimitDecision', 'action retry_after')):
+    @property
+    def allowed(self):
+        return self.action == ALLOW
+
+
+class RateLimiter:
+    def __init__(self, path=None, limits=None):
+        self.path = str(path or settings.RATE_LIMIT_DB)
+        self.limits = limits or settings.RATE_LIMITS
+        self._local = threading.local()
+        self._calls = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            self._local.connection = connection
+        return connection
+
+    def consume(self, key, cost_class, scale=1, cost=1):
+        """
+        Take `cost` tokens from the client's bucket for cost_class.
+        scale multiplies the bucket size and refill rate (e.g. for shared IPs).
+        Returns 0 when allowed, else the seconds until enough tokens are back.
+        """
+        limit = self.limits[cost_class]
+        capacity = limit['burst'] * scale
+        rate = limit['per_minute'] * scale / 60.0
+        params = {'key': f"{cost_class}:{key}", 'capacity': capacity, 'rate': rate, 'cost': cost, 'now': time.time()}
+
+        connection = self._connection()
+        if connection.execute(_CONSUME_SQL, params).fetchone() is not None:
+            self._maybe_prune(connection, params['now'])
+            return 0.0
+
+        row = connection.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (params['key'],)).fetchone()
+        available = min(capacity, row[0] + (params['now'] - row[1]) * rate) if row else capacity
+        return max(0.001, (cost - available) / rate)
+
+    def _maybe_prune(self, connection, now):
+        # A bucket idle long enough to be full again is the same as no bucket
+        self._calls += 1
+        if self._calls % 1000:
+            return
+        refill = max(limit['burst'] / (limit['per_minute'] / 60.0) for limit in self.limits.values())
+        connection.execute("DELETE FROM buckets WHERE updated < ?", (now - refill * settings.RATE_LIMIT_IP_MULTIPLIER,))
+
+    def refund(self, key, cost_class, scale=1, cost=1):
+        """Give back tokens taken by consume() (capped at the bucket size)"""
+        capacity = self.limits[cost_class]['burst'] * scale
+        self._connection().execute("UPDATE buckets SET tokens = MIN(?, tokens + ?) WHERE key = ?",
+                                   (capacity, cost, f"{cost_class}:{key}"))
+
+    def _try(self, keys, cost_class):
+        """All keys get a token or none: tokens already taken are refunded when a later bucket is empty"""
+        taken = []
+        for key, scale in keys:
+            retry_after = self.consume(key, cost_class, scale)
+            if retry_after:
+                for taken_key, taken_scale in taken:
+                    self.refund(taken_key, cost_class, taken_scale)
+                return retry_after
+            taken.append((key, scale))
+        return 0.0
+
+    def check(self, keys, cost_class):
+        """
+        keys: [(key, scale)] that must all have a token (e.g. session and IP)
+        Returns a RateLimitDecision; 'queue' classes block until allowed or rejected.
+        """
+        if not settings.RATE_LIMIT_ENABLED:
+            return RateLimitDecision(ALLOW, 0.0)
+        action = self.limits[cost_class]['action']
+        deadline = time.monotonic() + settings.RATE_LIMIT_MAX_WAIT
+        while True:
+            retry_after = self._try(keys, cost_class)
+            if not retry_after:
+                return RateLimitDecision(ALLOW, 0.0)
+            if action != QUEUE:
+                return RateLimitDecision(action, retry_after)
+            if time.monotonic() + retry_after > deadline:
+                return RateLimitDecision(REJECT, retry_after)
+            time.sleep(retry_after)
+
+    async def acheck(self, keys, cost_class):
+        """check() for async code: waiting for a token doesn't block the event loop"""
+        if not settings.RATE_LIMIT_ENABLED:
+            return RateLimitDecision(ALLOW, 0.0)
+        action = self.limits[cost_class]['action']
+        deadline = time.monotonic() + settings.RATE_LIMIT_MAX_WAIT
+        while True:
+            retry_after = self._try(keys, cost_class)
+            if not retry_after:
+                return RateLimitDecision(ALLOW, 0.0)
+            if action != QUEUE:
+                return RateLimitDecision(action, retry_after)
+            if time.monotonic() + retry_after > deadline:
+                return RateLimitDecision(REJECT, retry_after)
+            await asyncio.sleep(retry_after)
+
+
+def request_keys(request):
+    """Web clients: their session plus a larger bucket for the IP (shared by NAT users)"""
+    keys = []
+    if request.session.session_key:
+        keys.append((f"session:{request.session.session_key}", 1))
+    keys.append((f"ip:{request.META.get('REMOTE_ADDR', 'unknown')}", settings.RATE_LIMIT_IP_MULTIPLIER))
+    return keys
+
+
+def chat_keys(chat_id):
+    return [(f"tg:{chat_id}", 1)]
+
+
+def slow_down_message(decision):
+    return f"You're sending requests too quickly. Please wait {max(1, round(decision.retry_after))} seconds and try again."
+
+
+def rate_limited_response(decision):
+    response = JsonResponse({'success': False, 'error': slow_down_message(decision),
+                             'retry_after': round(decision.retry_after, 1)}, status=429)
+    response['Retry-After'] = str(max(1, round(decision.retry_after)))
+    return response
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,123 @@
+"""
+Full-text search over chat messages
+
+Backed by the index from migration 0008: an FTS5 table on SQLite, a
+tsvector column on Postgres. Both are maintained by the database itself as
+messages are inserted, edited or deleted. Results are ranked (bm25 /
+ts_rank_cd) and come with an HTML snippet whose matches are in <mark>.
+Other databases fall back to an unranked LIKE scan.
+"""
+import re
+
+from django.db import connection
+from django.utils.html import escape
+
+from .models import Message
+
+# Match markers the snippet functions put around hits; replaced after HTML-escaping
+_START, _STOP = '\x02', '\x03'
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+_SQLITE_SQL = """
+SELECT m.id, m.conversation_id, c.title, m.role, m.created_at,
+       snippet(chat_message_fts, 0, char(2), char(3), '…', 16), bm25(chat_message_fts) AS score
+FROM chat_message_fts
+JOIN chat_message m ON m.id = chat_message_fts.rowid
+JOIN chat_conversation c ON c.id = m.conversation_id
+WHERE chat_message_fts MATCH %s {scope}
+ORDER BY score
+LIMIT %s
+"""
+
+_POSTGRES_SQL = f"""
+WITH q AS (SELECT websearch_to_tsquery('english', %s) || websearch_to_tsquery('simple', %s) AS query),
+hits AS (
+    SELECT m.id, m.conversation_id, c.title, m.role, m.created_at, m.content,
+           ts_rank_cd(m.search_vector, q.query) AS rank
+    FROM chat_message m
+    JOIN chat_conversation c ON c.id = m.conversation_id, q
+    WHERE m.search_vector @@ q.query {{scope}}
+    ORDER BY rank DESC
+    LIMIT %s
+)
+SELECT hits.id, hits.conversation_id, hits.title, hits.role, hits.created_at,
+       ts_headline('simple', hits.content, q.query,
+                   'StartSel={_START}, StopSel={_STOP}, MaxWords=30, MinWords=10, MaxFragments=2'),
+       hits.rank
+FROM hits, q
+ORDER BY hits.rank DESC
+"""
+
+
+def _fts5_query(text):
+    """User text -> FTS5 query: every word must match, the last one as a prefix (search-as-you-type)"""
+    words = _WORD.findall(text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def _highlight(snippet):
+    return escape(snippet).replace(_START, '<mark>').replace(_STOP, '</mark>')
+
+
+def search_messages(text, session_key=None, limit=20):
+    """
+    Messages matching `text`, best first, optionally only in one session's conversations.
+    Returns: [{'message_id', 'conversation_id', 'conversation_title', 'role', 'created_at', 'snippet', 'rank'}]
+    """
+    text = text.strip()
+    scope, scope_params = ('AND c.session_key = %s', [session_key]) if session_key else ('', [])
+
+    if connection.vendor == 'sqlite':
+        query = _fts5_query(text)
+        if query is None:
+            return []
+        sql, params = _SQLITE_SQL.format(scope=scope), [query, *scope_params, limit]
+    elif connection.vendor == 'postgresql':
+        if not text:
+            return []
+        sql, params = _POSTGRES_SQL.format(scope=scope), [text, text, *scope_params, limit]
+    else:
+        return _search_like(text, session_key, limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return [{
+        'message_id': message_id,
+        'conversation_id': conversation_id,
+        'conversation_title': title,
+        'role': role,
+        'created_at': created_at,
+        'snippet': _highlight(snippet),
+        'rank': abs(rank),  # bm25 is negative (lower is better); report larger = better
+    } for message_id, conversation_id, title, role, created_at, snippet, rank in rows]
+
+
+def _search_like(text, session_key, limit):
+    if not text:
+        return []
+    messages = Message.objects.filter(content__icontains=text).select_related('conversation')
+    if session_key:
+        messages = messages.filter(conversation__session_key=session_key)
+    results = []
+    for message in messages.order_by('-created_at')[:limit]:
+        content = message.content
+        start = content.lower().find(text.lower())
+        end = start + len(text)
+        # lower() can change lengths (e.g. 'İ'), so the position may not line up with content
+        if start < 0 or content[start:end].lower() != text.lower():
+            excerpt = content[:120] + ('…' if len(content) > 120 else '')
+        else:
+            excerpt = f"{content[max(0, start - 60):start]}{_START}{content[start:end]}{_STOP}{content[end:end + 60]}"
+        results.append({
+            'message_id': message.id,
+            'conversation_id': message.conversation_id,
+            'conversation_title': message.conversation.title,
+            'role': message.role,
+            'created_at': message.created_at,
+            'snippet': _highlight(excerpt),
+            'rank': 0.0,
+        })
+    return results
@@ -0,0 +1,165 @@
+"""
+Bounded, persistent session store for the Telegram bot's per-chat state
+(location, pending /forecast5). History, language and weather context are
+conversations in chat.conversation_service, like on the web.
+
+- hot tier: in-memory LRU of recently active chats, expired after a TTL
+- cold tier: TelegramSession rows in the Django database
+- writes are buffered and flushed in batches (bulk upsert) by a background
+  thread, when the buffer fills up, and on shutdown
+
+Handlers get a plain dict per chat and must report changes through update()
+so they are persisted.
+"""
+import asyncio
+import atexit
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import TelegramSession
+
+
+def _new_session():
+    return {}
+
+
+class SessionStore:
+    def __init__(self, max_entries=None, ttl=None, flush_interval=None, flush_batch=None):
+        self.max_entries = max_entries or settings.TELEGRAM_SESSION_CACHE_SIZE
+        self.ttl = ttl or settings.TELEGRAM_SESSION_TTL
+        self.flush_interval = flush_interval or settings.TELEGRAM_SESSION_FLUSH_INTERVAL
+        self.flush_batch = flush_batch or settings.TELEGRAM_SESSION_FLUSH_BATCH
+
+        self._cache = OrderedDict()  # chat_id -> (session, last_access)
+        self._pending = {}           # chat_id -> snapshot waiting to be written
+        self._flushing = {}          # snapshots currently being written
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._flusher = threading.Thread(target=self._flush_loop, name="session-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    # ----- reads -----
+
+    def _cached(self, chat_id):
+        """Hot-tier or pending lookup without touching the database"""
+        with self._lock:
+            item = self._cache.get(chat_id)
+            if item is not None and time.monotonic() - item[1] <= self.ttl:
+                self._cache[chat_id] = (item[0], time.monotonic())
+                self._cache.move_to_end(chat_id)
+                return item[0]
+            if item is not None:
+                del self._cache[chat_id]
+            pending = self._pending.get(chat_id, self._flushing.get(chat_id))
+            if pending is not None:
+                session = copy.deepcopy(pending)
+                self._remember(chat_id, session)
+                return session
+        return None
+
+    def get(self, chat_id):
+        """Return the (mutable) session dict for a chat, loading it if needed"""
+        session = self._cached(chat_id)
+        if session is not None:
+            return session
+
+        row = TelegramSession.objects.filter(chat_id=chat_id).values_list('data', flat=True).first()
+        session = row if row is not None else _new_session()
+        with self._lock:
+            # Another thread may have loaded it meanwhile
+            item = self._cache.get(chat_id)
+            if item is not None:
+                return item[0]
+            self._remember(chat_id, session)
+        return session
+
+    async def aget(self, chat_id):
+        """get() for async handlers: only a cache miss leaves the event loop"""
+        session = self._cached(chat_id)
+        if session is not None:
+            return session
+        return await asyncio.to_thread(self._get_in_thread, chat_id)
+
+    def _get_in_thread(self, chat_id):
+        close_old_connections()
+        return self.get(chat_id)
+
+    def _remember(self, chat_id, session):
+        self._cache[chat_id] = (session, time.monotonic())
+        self._cache.move_to_end(chat_id)
+        while len(self._cache) > self.max_entries:
+            # Safe to drop: unsaved changes are kept in _pending until flushed
+            self._cache.popitem(last=False)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._cache)
+
+    # ----- writes -----
+
+    def update(self, chat_id, session, **fields):
+        """Apply field changes to a session dict from get() and schedule a write"""
+        with self._lock:
+            session.update(fields)
+            self._remember(chat_id, session)
+            self._pending[chat_id] = copy.deepcopy(session)
+            pending = len(self._pending)
+        if pending >= self.flush_batch:
+            self._wakeup.set()
+        return session
+
+    # ----- write-behind -----
+
+    def _flush_loop(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Session flush error: {e}")
+
+    def flush(self):
+        """Write all pending sessions in one bulk upsert. Returns rows written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._flushing = pending
+            if not pending:
+                return 0
+            now = timezone.now()
+            rows = [TelegramSession(chat_id=chat_id, data=data, updated_at=now) for chat_id, data in pending.items()]
+            try:
+                close_old_connections()
+                TelegramSession.objects.bulk_create(
+                    rows, batch_size=500, update_conflicts=True,
+                    unique_fields=['chat_id'], update_fields=['data', 'updated_at'],
+                )
+            except Exception:
+                # Keep the data for the next attempt unless newer changes replaced it
+                with self._lock:
+                    for chat_id, data in pending.items():
+                        self._pending.setdefault(chat_id, data)
+                raise
+            finally:
+                with self._lock:
+                    self._flushing = {}
+            return len(rows)
+
+    def close(self):
+        """Stop the background flusher and write everything that is pending"""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wakeup.set()
+        self._flusher.join(timeout=5)
+        self.flush()
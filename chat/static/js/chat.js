@@ -340,6 +340,7 @@ document.addEventListener('DOMContentLoaded', function () {
                     const formData = new FormData();
                     formData.append('image', currentImage);
                     formData.append('message', message);
+                    formData.append('conversation_id', messagesContainer.dataset.conversationId);
 
                     userInput.value = '';
                     userInput.style.height = 'auto';
@@ -366,7 +367,8 @@ document.addEventListener('DOMContentLoaded', function () {
                         },
                         body: JSON.stringify({
                             message: message,
-                            language: currentLanguage
+                            language: currentLanguage,
+                            conversation_id: messagesContainer.dataset.conversationId
                         })
                     });
                 }
@@ -382,8 +384,15 @@ document.addEventListener('DOMContentLoaded', function () {
 
                 let fullText = "";
                 let buffer = "";
+                let queued = false;
+                let streamError = null;
                 let lastRenderTime = 0;
-                const RENDER_THROTTLE = 100; // ms
+                const RENDER_THROTTLE = 100; // ms, plain-text fallback only
+
+                // Finished blocks are rendered once; only the last one is redrawn, once per frame
+                const renderer = typeof marked !== 'undefined' && typeof StreamingMarkdown !== 'undefined'
+                    ? new StreamingMarkdown(textDiv, { onRender: scrollToBottom })
+                    : null;
 
                 removeLoading();
 
@@ -402,19 +411,22 @@ document.addEventListener('DOMContentLoaded', function () {
                             if (data.chunk) {
                                 fullText += data.chunk;
 
-                                // Throttle rendering to keep UI responsive
-                                const now = Date.now();
-                                if (now - lastRenderTime > RENDER_THROTTLE) {
-                                    if (typeof marked !== 'undefined') {
-                                        textDiv.innerHTML = marked.parse(fullText);
-                                    } else {
+                                if (renderer) {
+                                    renderer.update(fullText);
+                                } else {
+                                    // Throttle rendering to keep UI responsive
+                                    const now = Date.now();
+                                    if (now - lastRenderTime > RENDER_THROTTLE) {
                                         textDiv.textContent = fullText;
+                                        scrollToBottom();
+                                        lastRenderTime = now;
                                     }
-                                    scrollToBottom();
-                                    lastRenderTime = now;
                                 }
+                            } else if (data.queued) {
+                                // Offline: the service worker keeps it and sends it later
+                                queued = true;
                             } else if (data.error) {
-                                textDiv.textContent += "\n[Error: " + data.error + "]";
+                                streamError = data.error;  // shown after the answer, below
                             } else if (data.full_text) {
                                 fullText = data.full_text;
                             }
@@ -424,12 +436,26 @@ document.addEventListener('DOMContentLoaded', function () {
                     }
                 }
 
+                if (queued) {
+                    if (renderer) renderer.finish('');
+                    textDiv.textContent = "📶 You're offline. Your message is saved and will be sent when you're back online.";
+                    lastMessageDiv.classList.add('queued');
+                    return;
+                }
+
                 // Final render
-                if (typeof marked !== 'undefined') {
+                if (renderer) {
+                    renderer.finish(fullText);
+                } else if (typeof marked !== 'undefined') {
                     textDiv.innerHTML = marked.parse(fullText);
                 } else {
                     textDiv.textContent = fullText;
                 }
+                if (streamError) {
+                    const errorNode = document.createElement('p');
+                    errorNode.textContent = "[Error: " + streamError + "]";
+                    textDiv.appendChild(errorNode);
+                }
                 scrollToBottom();
                 addSpeakerButton(contentDiv, fullText);
 
@@ -494,6 +520,16 @@ document.addEventListener('DOMContentLoaded', function () {
         });
     }
 
+    // 9b. Search past messages (results replace the conversation list while there is a query)
+    const searchInput = document.getElementById('searchInput');
+    if (searchInput) {
+        let searchTimer = null;
+        searchInput.addEventListener('input', function () {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => searchMessages(this.value.trim()), 250);
+        });
+    }
+
     // 10. Initial Render
     if (typeof marked !== 'undefined') {
         document.querySelectorAll('.message').forEach(msgDiv => {
@@ -513,6 +549,39 @@ document.addEventListener('DOMContentLoaded', function () {
     }
     scrollToBottom();
 
+    // 11. Earlier messages: fetched a page at a time when the top of the chat scrolls into view
+    const historySentinel = document.getElementById('historySentinel');
+    if (historySentinel) {
+        if ('IntersectionObserver' in window) {
+            const observer = new IntersectionObserver(entries => {
+                if (entries.some(entry => entry.isIntersecting)) loadEarlierMessages(observer);
+            }, { root: document.getElementById('messagesContainer'), rootMargin: '400px 0px 0px 0px' });
+            observer.observe(historySentinel);
+        } else {
+            document.getElementById('messagesContainer').addEventListener('scroll', function () {
+                if (this.scrollTop < 400) loadEarlierMessages(null);
+            });
+        }
+    }
+
+    // 12. Offline support: cached pages and TTS, queued sends (see chat/templates/chat/sw.js)
+    if ('serviceWorker' in navigator) {
+        navigator.serviceWorker.register('/sw.js').catch(error => console.error('Service worker error:', error));
+
+        navigator.serviceWorker.addEventListener('message', function (event) {
+            if (event.data && event.data.type === 'queue-replayed' && !sendBtn.disabled) {
+                // Queued messages were answered meanwhile; show them
+                window.location.reload();
+            }
+        });
+
+        window.addEventListener('online', function () {
+            if (navigator.serviceWorker.controller) {
+                navigator.serviceWorker.controller.postMessage({ type: 'replay' });
+            }
+        });
+    }
+
 }); // End DOMContentLoaded
 
 
@@ -600,6 +669,131 @@ function scrollToBottom() {
     }
 }
 
+let searchRequest = 0;
+
+async function searchMessages(query) {
+    const results = document.getElementById('searchResults');
+    const list = document.getElementById('conversationsList');
+    if (!results || !list) return;
+
+    if (!query) {
+        results.style.display = 'none';
+        list.style.display = '';
+        return;
+    }
+
+    const requestId = ++searchRequest;
+    try {
+        const response = await fetch(`/chat/api/search/?q=${encodeURIComponent(query)}`);
+        const data = await response.json();
+        if (requestId !== searchRequest) return;  // a newer query was typed meanwhile
+
+        results.innerHTML = '';
+        if (!data.success || !data.results.length) {
+            results.textContent = 'No matching messages';
+        }
+        (data.results || []).forEach(result => {
+            const link = document.createElement('a');
+            link.className = 'search-result';
+            link.href = `/chat/${result.conversation_id}/`;
+
+            const title = document.createElement('span');
+            title.className = 'search-result-title';
+            title.textContent = result.conversation_title;
+            link.appendChild(title);
+
+            const snippet = document.createElement('span');
+            snippet.innerHTML = result.snippet;  // HTML-escaped by the server, matches in <mark>
+            link.appendChild(snippet);
+            results.appendChild(link);
+        });
+        results.style.display = '';
+        list.style.display = 'none';
+    } catch (error) {
+        console.error('Error searching messages:', error);
+    }
+}
+
+let loadingHistory = false;
+
+async function loadEarlierMessages(observer) {
+    const messagesContainer = document.getElementById('messagesContainer');
+    const sentinel = document.getElementById('historySentinel');
+    if (loadingHistory || !messagesContainer || !sentinel || !sentinel.dataset.before) return;
+
+    loadingHistory = true;
+    sentinel.classList.add('loading');
+    try {
+        const conversationId = messagesContainer.dataset.conversationId;
+        const response = await fetch(`/chat/api/history/${conversationId}/?before=${encodeURIComponent(sentinel.dataset.before)}`);
+        const data = await response.json();
+        if (!data.success) throw new Error(data.error);
+
+        // Insert above the current messages without moving what the user is looking at
+        const previousHeight = messagesContainer.scrollHeight;
+        const fragment = document.createDocumentFragment();
+        data.messages.forEach(message => fragment.appendChild(buildMessageElement(message)));
+        sentinel.after(fragment);
+        messagesContainer.scrollTop += messagesContainer.scrollHeight - previousHeight;
+
+        if (data.before) {
+            sentinel.dataset.before = data.before;
+        } else {
+            if (observer) observer.disconnect();
+            sentinel.remove();
+        }
+    } catch (error) {
+        console.error('Error loading earlier messages:', error);
+    } finally {
+        sentinel.classList.remove('loading');
+        loadingHistory = false;
+    }
+}
+
+function buildMessageElement(message) {
+    // Same markup as the server-rendered messages in index.html
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `message ${message.role}`;
+
+    const avatar = document.createElement('div');
+    avatar.className = 'message-avatar';
+    avatar.textContent = message.role === 'user' ? '👤' : '🌾';
+
+    const contentDiv = document.createElement('div');
+    contentDiv.className = 'message-content';
+
+    const textDiv = document.createElement('div');
+    textDiv.className = 'message-text';
+    if (typeof marked !== 'undefined') {
+        textDiv.innerHTML = marked.parse(message.content);
+    } else {
+        textDiv.classList.add('raw-text');
+        textDiv.textContent = message.content;
+    }
+    textDiv.dataset.rendered = 'true';
+    contentDiv.appendChild(textDiv);
+
+    if (message.image) {
+        const img = document.createElement('img');
+        img.src = message.thumbnail || message.image;
+        img.className = 'message-image';
+        img.loading = 'lazy';
+        img.decoding = 'async';
+        img.onclick = function () {
+            window.open(message.image, '_blank');
+        };
+        contentDiv.appendChild(img);
+    }
+
+    if (message.role === 'assistant') {
+        addSpeakerButton(contentDiv, message.content);
+    }
+
+    messageDiv.appendChild(avatar);
+    messageDiv.appendChild(contentDiv);
+    return messageDiv;
+}
+
 function addMessage(role, content, imageUrl = null, animate = false) {
     const messagesContainer = document.getElementById('messagesContainer');
     if (!messagesContainer) return;
@@ -0,0 +1,147 @@
+// Incremental markdown rendering for streamed answers.
+//
+// Re-parsing the whole answer and replacing innerHTML on every chunk costs
+// O(length) per chunk, O(length^2) per answer. StreamingMarkdown instead
+// keeps the blocks (paragraphs, lists, headings...) that are known to be
+// finished - those followed by another block - as DOM that is never touched
+// again, and only re-renders the trailing block that is still being written.
+// Rendering happens in requestAnimationFrame callbacks with a time budget
+// per frame, so a burst of chunks can't freeze the page.
+//
+// A block using a reference link ([text][label]) whose definition hasn't
+// arrived yet is held in the tail, with everything after it, until the
+// definition line is complete or the stream ends; rendering is then back to
+// re-parsing that tail on each frame, which is correct but not incremental.
+(function (root) {
+    'use strict';
+
+    const FRAME_BUDGET_MS = 8;
+    // [text][label], [label][] or [label] - but not [text](url) or a [label]: definition
+    const REFERENCE = /\[([^\]]*)\](?:\s?\[([^\]]*)\])?(?![(:])/g;
+
+    const now = () => (typeof performance !== 'undefined' ? performance.now() : Date.now());
+
+    class StreamingMarkdown {
+        // element: the .message-text div; options.marked / options.schedule for tests and benchmarks
+        constructor(element, options = {}) {
+            this.element = element;
+            this.marked = options.marked || root.marked;
+            this.schedule = options.schedule ||
+                (typeof requestAnimationFrame !== 'undefined' ? requestAnimationFrame.bind(root) : cb => setTimeout(cb, 16));
+            this.onRender = options.onRender || null;
+            this.budget = options.budget || FRAME_BUDGET_MS;
+
+            this.text = '';
+            this.committed = 0;      // chars of this.text already rendered as finished blocks
+            this.pending = [];       // finished tokens waiting for a frame to be appended
+            this.links = {};         // reference-style link definitions seen so far
+            this.renderedTail = null;
+            this.scheduled = false;
+            this.finished = false;
+
+            this.element.innerHTML = '';
+            this.tail = this._createTail();
+            this.element.appendChild(this.tail);
+        }
+
+        _createTail() {
+            const doc = this.element.ownerDocument || root.document;
+            const tail = doc.createElement('div');
+            tail.className = 'md-tail';
+            return tail;
+        }
+
+        // Whole answer so far (chunks are appended by the caller)
+        update(text) {
+            this.text = text.replace(/\r\n?/g, '\n');  // as marked does, so token lengths match the text
+            this._lex();
+            this._request();
+        }
+
+        // Stream ended: render everything now, including the last block
+        finish(text) {
+            if (text !== undefined) this.text = text.replace(/\r\n?/g, '\n');
+            this.finished = true;
+            this._lex();
+            this._flush(Infinity);
+            this.tail.remove();
+        }
+
+        // Split the not-yet-committed text into finished blocks and the trailing one
+        _lex() {
+            const tokens = this.marked.lexer(this.text.slice(this.committed));
+            let links = tokens.links;
+            if (!this.finished && Object.keys(links).length) {
+                // Only definitions whose line is complete: "[1]: htt" is not the final URL yet
+                const end = this.text.lastIndexOf('\n') + 1;
+                links = end > this.committed ? this.marked.lexer(this.text.slice(this.committed, end)).links : {};
+            }
+            Object.assign(this.links, links);
+
+            // The last non-space block may still grow (a list gets more items, a
+            // paragraph more lines), so it stays in the tail until the stream ends
+            let last = tokens.length - 1;
+            while (last >= 0 && tokens[last].type === 'space') last--;
+            let done = this.finished ? tokens.length : Math.max(0, last);
+
+            for (let i = 0; i < done; i++) {
+                // A reference link whose definition may still arrive stays in the tail (so does the rest)
+                if (!this.finished && this._unresolvedReference(tokens[i])) {
+                    done = i;
+                    break;
+                }
+                this.committed += tokens[i].raw.length;
+                if (tokens[i].type !== 'space') this.pending.push(tokens[i]);
+            }
+            this.tailTokens = tokens.slice(done).filter(token => token.type !== 'space');
+        }
+
+        _unresolvedReference(token) {
+            if (token.type === 'code' || token.type === 'space') return false;
+            for (const match of token.raw.matchAll(REFERENCE)) {
+                const label = (match[2] || match[1]).trim().toLowerCase().replace(/\s+/g, ' ');
+                if (!label || label === 'x') continue;  // task list boxes
+                if (!this.links[label]) return true;
+            }
+            return false;
+        }
+
+        _request() {
+            if (this.scheduled || this.finished) return;
+            this.scheduled = true;
+            this.schedule(() => {
+                this.scheduled = false;
+                this._flush(this.budget);
+                if (this.pending.length) this._request();  // out of budget: continue next frame
+            });
+        }
+
+        _render(tokens) {
+            const list = tokens.slice();
+            list.links = this.links;
+            return this.marked.parser(list);
+        }
+
+        // Append finished blocks, then redraw the tail if time is left in this frame
+        _flush(budget) {
+            const started = now();
+            while (this.pending.length && now() - started < budget) {
+                this.tail.insertAdjacentHTML('beforebegin', this._render([this.pending.shift()]));
+            }
+            if (!this.pending.length) {
+                const html = this._render(this.tailTokens || []);
+                if (html !== this.renderedTail) {
+                    this.tail.innerHTML = html;
+                    this.renderedTail = html;
+                }
+            }
+            if (this.onRender) this.onRender();
+        }
+    }
+
+    if (typeof module !== 'undefined' && module.exports) {
+        module.exports = { StreamingMarkdown };
+    } else {
+        root.StreamingMarkdown = StreamingMarkdown;
+    }
+})(typeof globalThis !== 'undefined' ? globalThis : this);
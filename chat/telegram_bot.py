@@ -0,0 +1,520 @@
+"""
+FarmBuddy Telegram bot: handlers and application setup
+
+Shared by the polling management command (run_telegram_bot) and the webhook
+view served by the web app's ASGI stack.
+"""
+import os
+import logging
+import asyncio
+from functools import partial
+
+from django.conf import settings
+from telegram import Update
+from telegram.ext import ApplicationBuilder, BaseUpdateProcessor, ContextTypes, CommandHandler, MessageHandler, filters
+from telegram.request import HTTPXRequest
+
+from utils.gemini_api import ask_gemini, analyze_plant_image
+from utils.weather_api import get_weather, get_forecast, get_weather_by_city, get_forecast_by_city
+from utils.speech import get_speech_engine
+from utils.image_processing import preprocess_image
+from utils.executors import ExecutorBusy, llm_executor, audio_executor, weather_executor
+from chat import answer_cache
+from chat.conversation_service import conversation_service
+from chat.diagnosis_cache import diagnosis_cache
+from chat.session_store import SessionStore
+from chat.rate_limit import ALLOW, DEGRADE, RateLimited, rate_limiter, chat_keys, slow_down_message
+from chat.telegram_streaming import send_markdown, stream_reply
+
+BUSY_MESSAGE = "🌾 I'm helping a lot of farmers right now. Please try again in a minute."
+
+LANGUAGE_NAMES = {
+    'en': 'English',
+    'ha': 'Hausa',
+    'ig': 'Igbo',
+    'yo': 'Yoruba',
+}
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Process updates from different chats concurrently, but updates from the
+    same chat strictly one after another in arrival order.
+
+    At most `max_concurrent_updates` handlers run at once. Updates waiting for
+    their chat's turn don't take a slot, so one busy chat can't stall others;
+    `max_pending_updates` bounds how many may wait in total.
+    """
+
+    def __init__(self, max_concurrent_updates, max_pending_updates=None):
+        super().__init__(max_pending_updates or max_concurrent_updates * 8)
+        self._running = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._chat_locks = {}  # chat_id -> [lock, updates waiting or running]
+
+    async def do_process_update(self, update, coroutine):
+        chat = getattr(update, 'effective_chat', None)
+        if chat is None:
+            async with self._running:
+                await coroutine
+            return
+
+        entry = self._chat_locks.setdefault(chat.id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._running:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chat_locks[chat.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+_webhook_application = None
+_webhook_bot = None
+_webhook_lock = None
+
+
+async def get_webhook_application():
+    """
+    Started Application for webhook mode, created on first use inside the
+    ASGI server's event loop (it must outlive the request). Returns None when
+    TELEGRAM_BOT_TOKEN is not set.
+    """
+    global _webhook_application, _webhook_bot, _webhook_lock
+    if _webhook_application is not None:
+        return _webhook_application
+
+    token = os.getenv('TELEGRAM_BOT_TOKEN')
+    if not token:
+        return None
+    if _webhook_lock is None:
+        _webhook_lock = asyncio.Lock()
+    async with _webhook_lock:
+        if _webhook_application is None:
+            bot = FarmBuddyBot()
+            application = bot.build_application(token, webhook=True)
+            await application.initialize()
+            await application.start()
+            _webhook_application, _webhook_bot = application, bot
+    return _webhook_application
+
+
+async def stop_webhook_application():
+    """Stop webhook processing and persist pending sessions (ASGI lifespan shutdown, farmbuddy_web.asgi)"""
+    global _webhook_application, _webhook_bot
+    if _webhook_application is None:
+        return
+    application, bot = _webhook_application, _webhook_bot
+    _webhook_application = _webhook_bot = None
+    await application.stop()
+    await application.shutdown()
+    await asyncio.to_thread(bot.sessions.close)
+
+
+class FarmBuddyBot:
+    def __init__(self):
+        # History, language and weather context: the same Conversation/Message rows as the web app
+        self.conversations = conversation_service
+        # Bot-only state (location, pending /forecast5): bounded in-memory tier, write-behind to the database
+        self.sessions = SessionStore()
+
+    def build_application(self, token, webhook=False):
+        """Create the telegram Application with all handlers registered"""
+        request = HTTPXRequest(connect_timeout=60, read_timeout=60, write_timeout=60, pool_timeout=60,
+                               connection_pool_size=settings.TELEGRAM_MAX_CONCURRENT_UPDATES + 8)
+        builder = (ApplicationBuilder().token(token).request(request)
+                   .concurrent_updates(PerChatUpdateProcessor(settings.TELEGRAM_MAX_CONCURRENT_UPDATES)))
+        if settings.TELEGRAM_API_URL:
+            builder = builder.base_url(settings.TELEGRAM_API_URL)
+            if settings.TELEGRAM_API_URL.endswith('/bot'):
+                # Same layout as api.telegram.org: files are served under /file/bot<token>/
+                builder = builder.base_file_url(settings.TELEGRAM_API_URL[:-len('bot')] + 'file/bot')
+        if webhook:
+            # Updates are pushed in by the webhook view instead of fetched by an Updater
+            builder = builder.updater(None)
+        application = builder.build()
+
+        application.add_handler(CommandHandler('start', self.start))
+        application.add_handler(CommandHandler('clear', self.clear_history))
+        application.add_handler(CommandHandler('forecast5', self.forecast5))
+        application.add_handler(CommandHandler('forecast', self.current_weather))
+        application.add_handler(CommandHandler('language', self.set_language))
+        
+        application.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), self.handle_message))
+        application.add_handler(MessageHandler(filters.VOICE, self.handle_voice))
+        application.add_handler(MessageHandler(filters.PHOTO, self.handle_photo))
+        application.add_handler(MessageHandler(filters.LOCATION, self.handle_location))
+        application.add_error_handler(self.handle_error)
+        return application
+
+    async def handle_error(self, update, context: ContextTypes.DEFAULT_TYPE):
+        """Tell the user when work was shed because an executor is full"""
+        chat = getattr(update, 'effective_chat', None)
+        if isinstance(context.error, ExecutorBusy) and chat is not None:
+            await context.bot.send_message(chat.id, BUSY_MESSAGE)
+        else:
+            logging.error(f"Telegram handler error: {context.error}")
+
+    async def reply(self, bot, chat_id, generate, placeholder=None):
+        """
+        Send the answer produced by generate(stream=...) and return its text.
+        With TELEGRAM_STREAM_REPLIES it is shown progressively as it arrives.
+        """
+        if settings.TELEGRAM_STREAM_REPLIES:
+            return await stream_reply(bot, chat_id, partial(generate, stream=True), placeholder=placeholder,
+                                      executor=llm_executor)
+
+        response_future = llm_executor.submit(generate, stream=False)
+        if placeholder:
+            await bot.send_message(chat_id, placeholder)
+        response = await asyncio.wrap_future(response_future)
+        await send_markdown(bot, chat_id, response)
+        return response
+
+    async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=(
+                "Hello! I am FarmBuddy 🌾.\n"
+                "I can help you with agricultural advice.\n\n"
+                "📍 **Features:**\n"
+                "- **Send Location**: Updates weather context for advice.\n"
+                "- **/forecast [city]**: Current weather (e.g., `/forecast Ikeja`).\n"
+                "- **/forecast5 [city]**: 5-day forecast.\n"
+                "- **Send Photo**: Analyze plants for diseases.\n"
+                "- **/clear**: Start a new conversation.\n"
+                "- **/language [en|ha|ig|yo]**: Set your language.\n"
+                "- **Voice/Text**: Ask me anything!"
+            ),
+            parse_mode='Markdown'
+        )
+
+    async def clear_history(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat_id = update.effective_chat.id
+        # The old conversation is kept (and eventually archived); the chat continues in a new one
+        await self.conversations.anew_telegram_conversation(chat_id)
+        # Always confirm clearing
+        await context.bot.send_message(chat_id, "🧹 Conversation history cleared.")
+
+    async def set_language(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat_id = update.effective_chat.id
+        args = context.args
+        
+        if not args or args[0].lower() not in LANGUAGE_NAMES:
+            options = ", ".join(f"`{code}` ({name})" for code, name in LANGUAGE_NAMES.items())
+            await context.bot.send_message(chat_id, f"Usage: `/language <code>`. Options: {options}", parse_mode='Markdown')
+            return
+        
+        language = args[0].lower()
+        conversation = await self.conversations.atelegram_conversation(chat_id)
+        await self.conversations.aset_context(conversation, language=language)
+        await context.bot.send_message(chat_id, f"🌍 Language set to {LANGUAGE_NAMES[language]}.")
+
+    async def current_weather(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat_id = update.effective_chat.id
+        args = context.args
+        
+        weather_data = None
+        
+        await context.bot.send_chat_action(chat_id=chat_id, action='typing')
+        
+        if args:
+            city_name = " ".join(args)
+            weather_data = await weather_executor.run(get_weather_by_city, city_name)
+        else:
+            session = await self.sessions.aget(chat_id)
+            lat = session.get('lat')
+            lon = session.get('lon')
+            if lat and lon:
+                weather_data = await weather_executor.run(get_weather, lat, lon)
+            else:
+                await context.bot.send_message(chat_id, "⚠️ Please send your location first or specify a city (e.g., `/forecast Ikeja`).")
+                return
+
+        if weather_data and 'error' not in weather_data:
+            city = weather_data['name']
+            desc = weather_data['weather'][0]['description'].capitalize()
+            temp = weather_data['main']['temp']
+            humidity = weather_data['main']['humidity']
+            wind = weather_data['wind']['speed']
+            
+            msg = (f"**Current Weather in {city}** 🌡️\n"
+                   f"- Condition: {desc}\n"
+                   f"- Temp: {temp}°C\n"
+                   f"- Humidity: {humidity}%\n"
+                   f"- Wind: {wind} m/s")
+            await context.bot.send_message(chat_id, msg.replace("**", "*"), parse_mode='Markdown')
+        else:
+            err = weather_data.get('error', 'Unknown error') if weather_data else "Unknown error"
+            await context.bot.send_message(chat_id, f"Could not get weather: {err}")
+
+    async def forecast5(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat_id = update.effective_chat.id
+        args = context.args
+        
+        forecast_data = None
+        
+        await context.bot.send_chat_action(chat_id=chat_id, action='typing')
+        
+        if args:
+            city_name = " ".join(args)
+            forecast_data = await weather_executor.run(get_forecast_by_city, city_name)
+        else:
+            session = await self.sessions.aget(chat_id)
+            lat = session.get('lat')
+            lon = session.get('lon')
+            if lat and lon:
+                forecast_data = await weather_executor.run(get_forecast, lat, lon)
+            else:
+                await context.bot.send_message(chat_id, "⚠️ Please send your location first or specify a city (e.g., `/forecast5 Ikeja`).")
+                # Set flag to auto-send forecast when location is received
+                self.sessions.update(chat_id, session, awaiting_forecast=True)
+                return
+        
+        if forecast_data and 'list' in forecast_data:
+            await self.send_forecast_message(context, chat_id, forecast_data)
+        else:
+            err = forecast_data.get('error', 'Unknown error') if forecast_data else "Unknown error"
+            await context.bot.send_message(chat_id, f"Could not retrieve forecast: {err}")
+            
+    async def send_forecast_message(self, context, chat_id, forecast_data):
+        city_name = forecast_data.get('city', {}).get('name', 'Unknown')
+        msg = f"**5-Day Forecast for {city_name}** 🌦️\n\n"
+        
+        daily_forecasts = {}
+        for item in forecast_data['list']:
+            date = item['dt_txt'].split(' ')[0]
+            if date not in daily_forecasts:
+                daily_forecasts[date] = item
+                
+        for date, item in list(daily_forecasts.items())[:5]:
+            temp = item['main']['temp']
+            desc = item['weather'][0]['description']
+            msg += f"📅 *{date}*: {desc.capitalize()}, {temp:.1f}°C\n"
+        
+        msg += "\n*Ask me for advice based on this forecast!*"
+        await context.bot.send_message(chat_id, msg.replace("**", "*"), parse_mode='Markdown')
+
+    async def handle_photo(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat_id = update.effective_chat.id
+        photo = update.message.photo[-1] # Get highest resolution
+        
+        await context.bot.send_chat_action(chat_id=chat_id, action='typing')
+        
+        try:
+            # Keep the photo in memory: no disk I/O, works on a read-only filesystem
+            file = await context.bot.get_file(photo.file_id)
+            image_bytes = bytes(await file.download_as_bytearray())
+            
+            response = await self.reply(context.bot, chat_id, partial(self.diagnose_photo, image_bytes, chat_id=chat_id),
+                                        placeholder="🔍 Analyzing image...")
+            
+            # Add to history (Multimodal history is tricky in simple list, just add text summary for now)
+            conversation = await self.conversations.atelegram_conversation(chat_id)
+            await self.conversations.aappend(conversation, 'user', '[Sent a photo for analysis]')
+            await self.conversations.aappend(conversation, 'assistant', response)
+                
+        except ExecutorBusy:
+            await context.bot.send_message(chat_id=chat_id, text=BUSY_MESSAGE)
+        except RateLimited as e:
+            await context.bot.send_message(chat_id=chat_id, text=str(e))
+        except Exception as e:
+            await context.bot.send_message(chat_id=chat_id, text=f"Error analyzing photo: {str(e)}")
+
+    def diagnose_photo(self, image_source, stream=False, chat_id=None):
+        """
+        Preprocess, reuse a cached diagnosis for near-duplicates, else ask Gemini.
+        Gemini calls count against chat_id's 'vision' rate limit.
+        """
+        prepared = preprocess_image(image_source)
+        image_hash, cached_diagnosis = diagnosis_cache.lookup(prepared.image)
+        if not cached_diagnosis and chat_id is not None:
+            decision = rate_limiter.check(chat_keys(chat_id), 'vision')
+            if decision.action == DEGRADE:
+                # Over the limit: accept a looser match instead of calling Gemini
+                _, cached_diagnosis = diagnosis_cache.lookup(prepared.image, settings.RATE_LIMIT_DEGRADED_DISTANCE)
+            if not decision.allowed and not cached_diagnosis:
+                raise RateLimited(decision)
+        if cached_diagnosis:
+            return iter([cached_diagnosis]) if stream else cached_diagnosis
+        
+        if stream:
+            return self.remember_diagnosis(image_hash, analyze_plant_image(prepared, stream=True))
+        response = analyze_plant_image(prepared, conversation_history=None)
+        diagnosis_cache.remember(image_hash, response)
+        return response
+
+    def remember_diagnosis(self, image_hash, chunks):
+        """Pass a streamed diagnosis through, caching it once complete"""
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        diagnosis_cache.remember(image_hash, "".join(parts))
+
+    async def handle_location(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat_id = update.effective_chat.id
+        lat = update.message.location.latitude
+        lon = update.message.location.longitude
+        
+        session = await self.sessions.aget(chat_id)
+        self.sessions.update(chat_id, session, lat=lat, lon=lon)
+        
+        await context.bot.send_chat_action(chat_id=chat_id, action='typing')
+        
+        try:
+            # Fetch weather and forecast concurrently
+            weather_task = weather_executor.run(get_weather, lat, lon)
+            forecast_task = weather_executor.run(get_forecast, lat, lon)
+            
+            weather_data, forecast_data = await asyncio.gather(weather_task, forecast_task)
+            
+            context_parts = []
+            
+            # Process current weather
+            if 'error' not in weather_data:
+                desc = weather_data['weather'][0]['description'].capitalize()
+                temp = weather_data['main']['temp']
+                humidity = weather_data['main']['humidity']
+                wind = weather_data['wind']['speed']
+                city = weather_data['name']
+                
+                context_parts.append(f"Location: {city}. Current Weather: {desc}, {temp}°C, Humidity: {humidity}%, Wind: {wind}m/s.")
+                
+                msg = (f"✅ **Location set to {city}** 📍\n\n"
+                       f"**Current Weather:**\n"
+                       f"- Condition: {desc}\n"
+                       f"- Temp: {temp}°C\n"
+                       f"- Humidity: {humidity}%\n"
+                       f"- Wind: {wind} m/s\n\n"
+                       f"💡 **Tip:** Type `/forecast5` for a 5-day forecast!")
+                
+                await context.bot.send_message(chat_id, msg.replace("**", "*"), parse_mode='Markdown')
+            else:
+                 await context.bot.send_message(chat_id, "⚠️ Could not fetch current weather.")
+
+            # Process forecast for context
+            if 'error' not in forecast_data and 'list' in forecast_data:
+                # Add a brief summary of forecast to context (e.g., next 3 days rain check)
+                rain_likely = any('rain' in x['weather'][0]['main'].lower() for x in forecast_data['list'][:24]) # Check next 3 days (approx 24 points? 3hr intervals -> 8 per day -> 24 items)
+                context_parts.append(f"Forecast: {'Rain likely' if rain_likely else 'No rain expected'} in next 3 days.")
+                
+                # Check for awaiting_forecast flag
+                if session.get('awaiting_forecast'):
+                    await self.send_forecast_message(context, chat_id, forecast_data)
+                    self.sessions.update(chat_id, session, awaiting_forecast=False)
+            
+            # Update conversation context
+            if context_parts:
+                conversation = await self.conversations.atelegram_conversation(chat_id)
+                await self.conversations.aset_context(conversation, weather_context=" ".join(context_parts))
+                await context.bot.send_message(chat_id, "I have updated my advice based on your local weather! 🌦️")
+            else:
+                await context.bot.send_message(chat_id, "⚠️ Weather data unavailable.", parse_mode='Markdown')
+            
+        except ExecutorBusy:
+            await context.bot.send_message(chat_id, BUSY_MESSAGE)
+        except Exception as e:
+            await context.bot.send_message(chat_id, f"Error processing location: {str(e)}")
+
+    async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user_text = update.message.text
+        chat_id = update.effective_chat.id
+        
+        conversation = await self.conversations.atelegram_conversation(chat_id)
+        conversation_context = await self.conversations.acontext(conversation)
+        
+        decision = await rate_limiter.acheck(chat_keys(chat_id), 'chat')
+        if decision.action not in (ALLOW, DEGRADE):
+            await context.bot.send_message(chat_id=chat_id, text=slow_down_message(decision))
+            return
+        
+        await context.bot.send_chat_action(chat_id=chat_id, action='typing')
+
+        try:
+            await self.answer_question(context.bot, chat_id, conversation, conversation_context, user_text, decision)
+        except ExecutorBusy:
+            await context.bot.send_message(chat_id=chat_id, text=BUSY_MESSAGE)
+        except Exception as e:
+            await context.bot.send_message(chat_id=chat_id, text=f"Sorry, I encountered an error: {str(e)}")
+
+    async def answer_question(self, bot, chat_id, conversation, conversation_context, question, decision):
+        """
+        Answer with the recent history (CHAT_HISTORY_WINDOW, as on the web) and
+        save both turns. When 'chat' degrades, Gemini isn't called: a recent
+        answer to the same question is repeated, or the user is asked to slow down.
+        """
+        language = conversation_context['language'] or 'en'
+        weather_context = conversation_context['weather_context']
+        if decision.allowed:
+            window = await self.conversations.awindow(conversation)
+            history = window + [{'role': 'user', 'content': question}]
+            response = await self.reply(bot, chat_id, partial(ask_gemini, history,
+                                                              weather_context=weather_context,
+                                                              language=language))
+            # Shared only when it depends on nothing but the question
+            personal = window or weather_context
+            await asyncio.to_thread(answer_cache.remember, question, language, response,
+                                    conversation.id if personal else None)
+        else:
+            response = await asyncio.to_thread(answer_cache.lookup, question, language, conversation.id)
+            if response is None:
+                await bot.send_message(chat_id=chat_id, text=slow_down_message(decision))
+                return None
+            await send_markdown(bot, chat_id, response)
+
+        await self.conversations.aappend(conversation, 'user', question)
+        await self.conversations.aappend(conversation, 'assistant', response)
+        return response
+
+    async def handle_voice(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat_id = update.effective_chat.id
+        voice = update.message.voice
+        conversation = await self.conversations.atelegram_conversation(chat_id)
+        conversation_context = await self.conversations.acontext(conversation)
+        language = conversation_context['language'] or 'en'
+        
+        decision = await rate_limiter.acheck(chat_keys(chat_id), 'stt')
+        if not decision.allowed:
+            await context.bot.send_message(chat_id=chat_id, text=slow_down_message(decision))
+            return
+        
+        await context.bot.send_chat_action(chat_id=chat_id, action='typing')
+        
+        try:
+            file = await context.bot.get_file(voice.file_id)
+            audio_bytes = bytes(await file.download_as_bytearray())
+            
+            text = await audio_executor.run(self.process_voice_file, audio_bytes, language)
+            
+            if text:
+                await context.bot.send_message(chat_id=chat_id, text=f"🎤 You said: \"{text}\"")
+                
+                decision = await rate_limiter.acheck(chat_keys(chat_id), 'chat')
+                if decision.action not in (ALLOW, DEGRADE):
+                    await context.bot.send_message(chat_id=chat_id, text=slow_down_message(decision))
+                    return
+                
+                await self.answer_question(context.bot, chat_id, conversation, conversation_context, text, decision)
+            else:
+                await context.bot.send_message(chat_id=chat_id, text="Sorry, I couldn't understand the audio.")
+
+        except ExecutorBusy:
+            await context.bot.send_message(chat_id=chat_id, text=BUSY_MESSAGE)
+        except Exception as e:
+            await context.bot.send_message(chat_id=chat_id, text=f"Error processing voice: {str(e)}")
+
+    def process_voice_file(self, audio_bytes, language='en'):
+        """Transcribe an in-memory OGG/Opus voice note with the configured STT engine"""
+        try:
+            return get_speech_engine().transcribe(audio_bytes, language=language)
+        except Exception as e:
+            logging.error(f"Voice processing error: {e}")
+            return None
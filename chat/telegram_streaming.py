@@ -0,0 +1,235 @@
+"""
+Progressive Telegram replies: show an answer while Gemini is still writing it
+
+A placeholder message is edited as chunks arrive. Edits are coalesced to at
+most one per TELEGRAM_STREAM_EDIT_INTERVAL (Telegram rate-limits edits),
+partial text gets its open Markdown entity closed so it always parses, and
+answers longer than a Telegram message continue in a new message.
+"""
+import asyncio
+import time
+
+from django.conf import settings
+from telegram.error import BadRequest, RetryAfter
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+SPLIT_AT = TELEGRAM_MESSAGE_LIMIT - 96  # room for closing markers and a reopened entity
+
+
+def to_telegram_markdown(text):
+    """Gemini's **bold** and ### headers -> Telegram's legacy Markdown"""
+    return text.replace("**", "*").replace("### ", "*").replace("###", "*")
+
+
+def open_entity(text):
+    """
+    Return (entity, start) for the legacy-Markdown entity still open at the end
+    of text ('*', '_', '`', '```', '[' or '(' for a link), or (None, None).
+    """
+    entity, start = None, None
+    i = 0
+    while i < len(text):
+        if entity in (None, '```') and text.startswith('```', i):
+            entity, start = (None, None) if entity else ('```', i)
+            i += 3
+            continue
+        char = text[i]
+        if entity is None:
+            if char == '\\':
+                i += 2
+                continue
+            if char in '*_`[':
+                entity, start = char, i
+        elif entity == '[':
+            if char == ']':
+                if text.startswith('(', i + 1):
+                    entity = '('
+                    i += 1
+                else:
+                    entity, start = None, None
+        elif entity == '(':
+            if char == ')':
+                entity, start = None, None
+        elif char == entity:
+            entity, start = None, None
+        i += 1
+    return entity, start
+
+
+def balance_markdown(text):
+    """Make partial text parse: close an open entity, hide an unfinished link"""
+    entity, start = open_entity(text)
+    if entity in ('[', '('):
+        return text[:start]
+    if entity:
+        return text + entity
+    return text
+
+
+def split_markdown(text, limit=SPLIT_AT):
+    """
+    Split text that is too long for one message at a paragraph, line or word
+    boundary. Returns (head, cut, reopen): head is ready to send, text[cut:]
+    goes to the next message prefixed with `reopen`.
+    """
+    cut = -1
+    for separator in ('\n\n', '\n', ' '):
+        cut = text.rfind(separator, limit // 2, limit)
+        if cut != -1:
+            break
+    if cut == -1:
+        cut = limit
+
+    entity, start = open_entity(text[:cut])
+    if entity in ('[', '(') and start:
+        # Don't break a link in two
+        return text[:start], start, ''
+    if entity in ('[', '('):
+        entity = None
+    return text[:cut] + (entity or ''), cut, entity or ''
+
+
+async def send_markdown(bot, chat_id, text):
+    """Send a complete answer, split across messages if needed"""
+    formatted = to_telegram_markdown(text)
+    while formatted:
+        if len(formatted) > SPLIT_AT:
+            piece, cut, reopen = split_markdown(formatted)
+            formatted = reopen + formatted[cut:].lstrip()
+        else:
+            piece, formatted = formatted, ''
+        try:
+            await bot.send_message(chat_id=chat_id, text=piece, parse_mode='Markdown')
+        except BadRequest:
+            await bot.send_message(chat_id=chat_id, text=piece)
+
+
+class StreamingReply:
+    def __init__(self, bot, chat_id, edit_interval=None):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.edit_interval = settings.TELEGRAM_STREAM_EDIT_INTERVAL if edit_interval is None else edit_interval
+        self.text = ''         # raw answer so far
+        self.message = None    # Telegram message currently being edited
+        self.offset = 0        # where that message starts in the formatted answer
+        self.reopen = ''       # Markdown entity carried over from the previous message
+        self.shown = None      # what the current message displays
+        self.has_content = False
+        self.dirty = False
+        self.last_edit = 0.0
+
+    async def start(self, placeholder):
+        self.message = await self.bot.send_message(self.chat_id, placeholder)
+        self.shown = placeholder
+
+    def append(self, chunk):
+        self.text += chunk
+        self.dirty = True
+
+    def next_edit_in(self):
+        """Seconds until the next edit is allowed, or None if nothing is waiting"""
+        if not self.dirty:
+            return None
+        return max(0.0, self.last_edit + self.edit_interval - time.monotonic())
+
+    async def flush(self):
+        """Bring Telegram up to date with the text received so far"""
+        self.dirty = False
+        formatted = to_telegram_markdown(self.text)
+        body = self.reopen + formatted[self.offset:]
+        while len(body) > SPLIT_AT:
+            head, cut, reopen = split_markdown(body)
+            await self._show(head)
+            self.message, self.shown = None, None
+            self.offset += max(0, cut - len(self.reopen))
+            while self.offset < len(formatted) and formatted[self.offset].isspace():
+                self.offset += 1
+            self.reopen = reopen
+            body = self.reopen + formatted[self.offset:]
+
+        body = balance_markdown(body)
+        if body.strip():
+            await self._show(body)
+
+    async def discard(self):
+        """Remove the placeholder when no content was ever shown"""
+        if self.message is not None and not self.has_content:
+            try:
+                await self.bot.delete_message(self.chat_id, self.message.message_id)
+            except Exception:
+                pass
+
+    async def _show(self, text):
+        if text == self.shown:
+            return
+        try:
+            await self._send(text, parse_mode='Markdown')
+        except RetryAfter as e:
+            retry_after = getattr(e.retry_after, 'total_seconds', lambda: e.retry_after)()
+            await asyncio.sleep(retry_after)
+            return await self._show(text)
+        except BadRequest as e:
+            if 'not modified' not in str(e).lower():
+                # Markdown the model got wrong: show it as plain text
+                await self._send(text)
+        self.shown = text
+        self.has_content = True
+        self.last_edit = time.monotonic()
+
+    async def _send(self, text, parse_mode=None):
+        if self.message is None:
+            self.message = await self.bot.send_message(self.chat_id, text, parse_mode=parse_mode)
+        else:
+            await self.bot.edit_message_text(text, chat_id=self.chat_id, message_id=self.message.message_id,
+                                             parse_mode=parse_mode)
+
+
+async def stream_reply(bot, chat_id, generate, placeholder=None, executor=None):
+    """
+    Run the blocking chunk generator generate() in a worker thread (on
+    `executor`, a utils.executors pool, if given) and show its output in
+    Telegram as it arrives. Returns the full answer text.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+
+    def produce():
+        try:
+            for chunk in generate():
+                loop.call_soon_threadsafe(queue.put_nowait, chunk)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    # Submit first so a full executor is reported before anything is sent
+    if executor is not None:
+        executor.submit(produce)
+    else:
+        loop.run_in_executor(None, produce)
+
+    reply = StreamingReply(bot, chat_id)
+    await reply.start(placeholder or "⏳ ...")
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), reply.next_edit_in())
+            except asyncio.TimeoutError:
+                await reply.flush()
+                continue
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            reply.append(item)
+            if reply.next_edit_in() == 0:
+                await reply.flush()
+        await reply.flush()
+    except Exception:
+        await reply.discard()
+        raise
+
+    if not reply.has_content:
+        await reply.discard()
+    return reply.text
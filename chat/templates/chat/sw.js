@@ -0,0 +1,191 @@
+// FarmBuddy service worker, served by chat.views.service_worker at /sw.js so
+// it controls every chat page. For farmers on patchy 2G/3G:
+// - app shell (hashed static files): cache first, refreshed on each deploy
+//   (without a manifest, as under DEBUG, whenever one of the files changes)
+// - chat pages and message history: network first, cached copy when the
+//   network is down or slower than NETWORK_TIMEOUT_MS
+// - messages and photos sent while offline: queued in IndexedDB and sent
+//   when the connection is back (Background Sync, 'online' or next start)
+// - TTS audio: cached by text and language, so replays cost no data
+const VERSION = '{{ version|escapejs }}';
+const SHELL_CACHE = `farmbuddy-shell-${VERSION}`;
+const PAGE_CACHE = 'farmbuddy-pages';
+const TTS_CACHE = 'farmbuddy-tts';
+const SHELL = [{% for url in shell %}'{{ url|escapejs }}', {% endfor %}];
+const QUEUED_PATHS = ['/chat/send/', '/chat/upload/', '/send/', '/upload/'];
+const SPEAK_PATHS = ['/chat/api/speak/', '/api/speak/'];
+const CHAT_PAGE = /^\/(chat\/)?(\d+\/)?$/;
+const NETWORK_TIMEOUT_MS = 3000;
+const MAX_PAGES = 30;
+const MAX_TTS = 50;
+
+self.addEventListener('install', event => {
+    event.waitUntil(caches.open(SHELL_CACHE).then(cache => cache.addAll(SHELL)).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        const names = await caches.keys();
+        await Promise.all(names.filter(name => name.startsWith('farmbuddy-shell-') && name !== SHELL_CACHE)
+            .map(name => caches.delete(name)));
+        await self.clients.claim();
+        replayQueue();
+    })());
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) return;
+
+    if (request.method === 'POST') {
+        if (QUEUED_PATHS.includes(url.pathname)) event.respondWith(sendOrQueue(request));
+        else if (SPEAK_PATHS.includes(url.pathname)) event.respondWith(cachedSpeech(request));
+        return;
+    }
+    if (request.method !== 'GET') return;
+
+    if (SHELL.includes(url.pathname)) {
+        event.respondWith(cacheFirst(request, SHELL_CACHE));
+    } else if ((request.mode === 'navigate' && CHAT_PAGE.test(url.pathname)) || url.pathname.includes('/api/history/')) {
+        event.respondWith(networkFirst(request, PAGE_CACHE, MAX_PAGES));
+    }
+});
+
+self.addEventListener('sync', event => {
+    if (event.tag === 'send-queue') {
+        // Rejecting makes the browser retry the sync later
+        event.waitUntil(replayQueue().then(left => {
+            if (left) throw new Error(`${left} queued messages still waiting for the network`);
+        }));
+    }
+});
+
+self.addEventListener('message', event => {
+    if (event.data && event.data.type === 'replay') event.waitUntil(replayQueue());
+});
+
+// ---- caching strategies ----
+
+async function cacheFirst(request, cacheName) {
+    const cached = await caches.match(request, { cacheName });
+    if (cached) return cached;
+    const response = await fetch(request);
+    if (response.ok) {
+        const cache = await caches.open(cacheName);
+        await cache.put(request, response.clone());
+    }
+    return response;
+}
+
+async function networkFirst(request, cacheName, maxEntries) {
+    const cache = await caches.open(cacheName);
+    const network = fetch(request).then(async response => {
+        if (response.ok) {
+            await cache.put(request, response.clone());
+            await trim(cache, maxEntries);
+        }
+        return response;
+    });
+
+    // Slow network: answer from the cache (if there is a copy) while the fetch refreshes it
+    const timeout = new Promise(resolve => setTimeout(resolve, NETWORK_TIMEOUT_MS));
+    const first = await Promise.race([network.catch(() => null), timeout]);
+    if (first) return first;
+    const cached = await cache.match(request);
+    if (cached) return cached;
+    return network;
+}
+
+async function trim(cache, maxEntries) {
+    const keys = await cache.keys();  // oldest first
+    await Promise.all(keys.slice(0, Math.max(0, keys.length - maxEntries)).map(key => cache.delete(key)));
+}
+
+async function cachedSpeech(request) {
+    const body = await request.clone().text();
+    const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(body));
+    const hash = Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+    const key = new Request(`/__tts__/${hash}`);
+
+    const cache = await caches.open(TTS_CACHE);
+    const cached = await cache.match(key);
+    if (cached) return cached;
+
+    const response = await fetch(request);
+    if (response.ok) {
+        await cache.put(key, response.clone());
+        await trim(cache, MAX_TTS);
+    }
+    return response;
+}
+
+// ---- offline send queue ----
+
+async function sendOrQueue(request) {
+    const copy = request.clone();
+    try {
+        return await fetch(request);
+    } catch (error) {
+        const item = {
+            url: copy.url,
+            headers: Array.from(copy.headers.entries()),
+            body: await copy.arrayBuffer(),
+            queuedAt: Date.now(),
+        };
+        await outbox('readwrite', store => store.add(item));
+        if (self.registration.sync) {
+            self.registration.sync.register('send-queue').catch(() => {});
+        }
+        // chat.js shows "will be sent when you're back online"
+        return new Response(JSON.stringify({ queued: true }) + '\n',
+            { status: 202, headers: { 'Content-Type': 'application/x-ndjson' } });
+    }
+}
+
+let replaying = null;
+
+// Send queued requests in order; resolves to the number still waiting
+function replayQueue() {
+    if (!replaying) replaying = sendQueued().finally(() => { replaying = null; });
+    return replaying;
+}
+
+async function sendQueued() {
+    const items = await outbox('readonly', store => store.getAll());
+    let sent = 0;
+    for (const item of items) {
+        let response;
+        try {
+            response = await fetch(item.url, {
+                method: 'POST', headers: item.headers, body: item.body, credentials: 'same-origin',
+            });
+        } catch (error) {
+            break;  // still offline
+        }
+        // Rate-limited or server trouble: keep it for the next attempt
+        if (response.status === 429 || response.status >= 500) break;
+        await response.text();  // the server saves the answer once the stream is read to the end
+        await outbox('readwrite', store => store.delete(item.id));
+        sent++;
+    }
+    if (sent) {
+        const windows = await self.clients.matchAll({ type: 'window' });
+        windows.forEach(client => client.postMessage({ type: 'queue-replayed', sent }));
+    }
+    return items.length - sent;
+}
+
+function outbox(mode, action) {
+    return new Promise((resolve, reject) => {
+        const open = indexedDB.open('farmbuddy', 1);
+        open.onupgradeneeded = () => open.result.createObjectStore('outbox', { keyPath: 'id', autoIncrement: true });
+        open.onerror = () => reject(open.error);
+        open.onsuccess = () => {
+            const transaction = open.result.transaction('outbox', mode);
+            const request = action(transaction.objectStore('outbox'));
+            transaction.oncomplete = () => resolve(request.result);
+            transaction.onerror = () => reject(transaction.error);
+        };
+    });
+}
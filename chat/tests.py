@@ -1,3 +1,557 @@
-from django.test import TestCase
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+import numpy as np
+from PIL import Image
+
+from utils.executors import BoundedExecutor
+from utils.image_hash import HashIndex, dhash, hamming_distances, to_signed, to_unsigned
+from utils.model_registry import ModelRegistry
+
+from . import answer_cache, page_cache
+from .archive import ConversationArchive
+from .conversation_service import ConversationService
+from .management.commands.compact_images import Command as CompactImagesCommand
+from .message_buffer import MessageBuffer
+from .models import Conversation, Message, TelegramSession
+from .rate_limit import ALLOW, DEGRADE, REJECT, RateLimiter
+from .session_store import SessionStore
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+PLAIN_STATIC = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHE, STORAGES=PLAIN_STATIC)
+class ConversationAccessTests(TestCase):
+    def setUp(self):
+        self.client.get(reverse('index'))  # creates the session and its first conversation
+        self.session_key = self.client.session.session_key
+
+    def test_other_sessions_conversation_redirects_to_index(self):
+        foreign = Conversation.objects.create(session_key='s' * 32, title="Someone else's chat")
+
+        response = self.client.get(reverse('conversation', args=[foreign.id]))
+
+        self.assertRedirects(response, reverse('index'), fetch_redirect_response=False)
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.session_key, 's' * 32)
+
+    def test_legacy_conversation_is_not_claimed_by_url(self):
+        legacy = Conversation.objects.create(session_key=None, title="Before session scoping")
+
+        response = self.client.get(reverse('conversation', args=[legacy.id]))
+
+        self.assertRedirects(response, reverse('index'), fetch_redirect_response=False)
+        legacy.refresh_from_db()
+        self.assertIsNone(legacy.session_key)
+
+    def test_legacy_conversation_is_adopted_by_the_session_using_it(self):
+        legacy = Conversation.objects.create(session_key=None, title="Before session scoping")
+        session = self.client.session
+        session['conversation_id'] = legacy.id
+        session.save()
+
+        response = self.client.get(reverse('conversation', args=[legacy.id]))
+
+        self.assertEqual(response.status_code, 200)
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.session_key, self.session_key)
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class ServiceWorkerTests(TestCase):
+    def test_version_follows_shell_assets_without_a_manifest(self):
+        path = finders.find('js/chat.js')
+        stat = os.stat(path)
+        before = self.client.get(reverse('service_worker')).content
+        try:
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+            after = self.client.get(reverse('service_worker')).content
+        finally:
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        self.assertNotEqual(before, after)
+
+
+def _temporary_directory(test):
+    directory = tempfile.mkdtemp(prefix='farmbuddy-test-')
+    test.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+    return directory
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ConversationArchiveTests(TestCase):
+    def setUp(self):
+        self.archive = ConversationArchive(path=os.path.join(_temporary_directory(self), 'archive.sqlite3'))
+        self.cutoff = timezone.now() - timedelta(days=90)
+        self.conversation = Conversation.objects.create(session_key='s' * 32, title="Maize spacing")
+        started = self.cutoff - timedelta(days=10)
+        Message.objects.create(conversation=self.conversation, role='user', content="How far apart?",
+                               image='plant_images/maize.webp', created_at=started)
+        Message.objects.create(conversation=self.conversation, role='assistant', content="75cm between rows",
+                               created_at=started + timedelta(minutes=1))
+        # updated_at is auto_now: backdate it like real inactivity
+        Conversation.objects.filter(id=self.conversation.id).update(updated_at=started + timedelta(minutes=1))
+
+    def archive_batch(self):
+        return self.archive.archive_batch(
+            [{'id': self.conversation.id, 'session_key': self.conversation.session_key,
+              'title': self.conversation.title}], self.cutoff)
+
+    def contents(self):
+        return list(self.conversation.messages.order_by('created_at', 'id').values_list('content', flat=True))
+
+    def test_archive_and_restore(self):
+        self.assertEqual(self.archive_batch(), (1, 2))
+
+        self.conversation.refresh_from_db()
+        self.assertIsNotNone(self.conversation.archived_at)
+        self.assertFalse(self.conversation.messages.exists())
+        self.assertEqual(self.archive.image_names(), {'plant_images/maize.webp'})
+
+        self.assertEqual(self.archive.restore(self.conversation), 2)
+
+        self.assertEqual(self.contents(), ["How far apart?", "75cm between rows"])
+        self.assertEqual(self.conversation.messages.get(role='user').image.name, 'plant_images/maize.webp')
+        self.conversation.refresh_from_db()
+        self.assertIsNone(self.conversation.archived_at)
+        self.assertEqual(self.archive.stats(), (0, 0, 0))
+
+    def test_message_written_during_archiving_is_kept_and_merged_back(self):
+        store = self.archive.store
+
+        def store_then_reply(*args):
+            store(*args)
+            # Arrives after the copy, without touching updated_at (write-behind flush, another process)
+            Message.objects.create(conversation=self.conversation, role='user', content="And for beans?")
+
+        with mock.patch.object(self.archive, 'store', side_effect=store_then_reply):
+            self.assertEqual(self.archive_batch(), (1, 2))
+        self.assertEqual(self.contents(), ["And for beans?"])
+
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.archive.restore(self.conversation), 2)
+
+        self.assertEqual(self.contents(), ["How far apart?", "75cm between rows", "And for beans?"])
+
+    def test_conversation_active_again_is_not_archived(self):
+        Conversation.objects.filter(id=self.conversation.id).update(updated_at=timezone.now())
+
+        self.assertEqual(self.archive_batch(), (0, 0))
+
+        self.assertEqual(self.conversation.messages.count(), 2)
+        self.assertEqual(self.archive.stats(), (0, 0, 0))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CompactImagesTests(TestCase):
+    def setUp(self):
+        media_root = override_settings(MEDIA_ROOT=_temporary_directory(self))
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        png = io.BytesIO()
+        Image.effect_noise((800, 800), 64).convert('RGB').save(png, 'PNG')
+        self.name = default_storage.save('plant_images/field.png', ContentFile(png.getvalue()))
+        conversation = Conversation.objects.create(session_key='s' * 32)
+        self.message = Message.objects.create(conversation=conversation, role='user', content="", image=self.name)
+
+    def compact(self, **kwargs):
+        return CompactImagesCommand().compact_message(self.message, 60, dry_run=False, **kwargs)
+
+    def test_unreferenced_original_is_deleted(self):
+        self.assertGreater(self.compact(grace=timedelta(0)), 0)
+
+        self.assertTrue(self.message.image.name.endswith('.webp'))
+        self.assertFalse(default_storage.exists(self.name))
+
+    def test_file_of_an_archived_message_is_kept(self):
+        self.assertGreater(self.compact(archived_names={self.name}, grace=timedelta(0)), 0)
+
+        self.assertTrue(self.message.image.name.endswith('.webp'))
+        self.assertTrue(default_storage.exists(self.name))
+
+    def test_recently_stored_original_is_kept(self):
+        # e.g. reused by an identical upload whose message is still queued
+        self.assertGreater(self.compact(grace=timedelta(hours=1)), 0)
+
+        self.assertTrue(default_storage.exists(self.name))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class TelegramConversationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = ConversationService()
+
+    def test_current_conversation_survives_cache_eviction(self):
+        previous = self.service.telegram_conversation(42)
+        current = self.service.new_telegram_conversation(42)
+        Conversation.objects.filter(id=previous.id).update(updated_at=timezone.now() + timedelta(hours=1))
+        cache.clear()
+
+        self.assertEqual(self.service.telegram_conversation(42).id, current.id)
+        self.assertEqual(TelegramSession.objects.get(chat_id=42).conversation_id, current.id)
+
+    def test_append_restores_an_archived_conversation(self):
+        conversation = self.service.telegram_conversation(7)
+        self.service.append(conversation, 'user', "Hello")
+        Conversation.objects.filter(id=conversation.id).update(updated_at=timezone.now() - timedelta(days=100))
+        archive = ConversationArchive(path=os.path.join(_temporary_directory(self), 'archive.sqlite3'))
+
+        with mock.patch('chat.conversation_service.conversation_archive', archive):
+            archive.archive_batch([{'id': conversation.id, 'session_key': conversation.session_key,
+                                    'title': conversation.title}], timezone.now() - timedelta(days=90))
+            service = ConversationService()  # another process: nothing hot
+            service.append(service.telegram_conversation(7), 'user', "Still there?")
+
+        conversation.refresh_from_db()
+        self.assertIsNone(conversation.archived_at)
+        self.assertEqual(list(conversation.messages.order_by('created_at', 'id').values_list('content', flat=True)),
+                         ["Hello", "Still there?"])
+
+
+class TelegramHistoryMigrationTests(TransactionTestCase):
+    before = [('chat', '0009_conversation_archived_at')]
+    after = [('chat', '0010_conversation_context')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_histories_move_to_conversations_and_back(self):
+        apps = self.migrate(self.before)
+        apps.get_model('chat', 'TelegramSession').objects.create(chat_id=42, updated_at=timezone.now(), data={
+            'history': [{'role': 'user', 'content': "When do I plant yam?"},
+                        {'role': 'assistant', 'content': "At the start of the rains"}],
+            'language': 'ha',
+            'location': {'lat': 9.06, 'lon': 7.49},
+        })
+
+        apps = self.migrate(self.after)
+        conversation = apps.get_model('chat', 'Conversation').objects.get(session_key='telegram:42')
+        self.assertEqual(conversation.language, 'ha')
+        self.assertEqual(list(apps.get_model('chat', 'Message').objects.filter(conversation=conversation)
+                              .order_by('created_at').values_list('role', 'content')),
+                         [('user', "When do I plant yam?"), ('assistant', "At the start of the rains")])
+        self.assertEqual(apps.get_model('chat', 'TelegramSession').objects.get(chat_id=42).data,
+                         {'location': {'lat': 9.06, 'lon': 7.49}})
+
+        apps = self.migrate(self.before)
+        self.assertEqual(apps.get_model('chat', 'TelegramSession').objects.get(chat_id=42).data, {
+            'history': [{'role': 'user', 'content': "When do I plant yam?"},
+                        {'role': 'assistant', 'content': "At the start of the rains"}],
+            'language': 'ha',
+            'location': {'lat': 9.06, 'lon': 7.49},
+        })
+        self.assertFalse(apps.get_model('chat', 'Conversation').objects.filter(session_key='telegram:42').exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class AnswerCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_answer_from_a_conversations_context_stays_in_it(self):
+        answer_cache.remember("Will it rain in Kano?", 'en', "Yes, 20mm tomorrow", conversation_id=1)
+
+        self.assertEqual(answer_cache.lookup("will it rain in kano", 'en', 1), "Yes, 20mm tomorrow")
+        self.assertIsNone(answer_cache.lookup("will it rain in kano", 'en', 2))
+
+    def test_context_free_answer_is_shared(self):
+        answer_cache.remember("What is NPK?", 'en', "Nitrogen, phosphorus, potassium")
+
+        self.assertEqual(answer_cache.lookup("what is npk", 'en', 2), "Nitrogen, phosphorus, potassium")
+        self.assertIsNone(answer_cache.lookup("what is npk", 'ha', 2))
+
+
+class BoundedExecutorTests(TestCase):
+    def test_cancelled_queued_jobs_free_their_slots(self):
+        executor = BoundedExecutor('test', max_workers=1, max_queue=2)
+        self.addCleanup(executor.shutdown)
+        release = threading.Event()
+        started = threading.Event()
+        executor.submit(lambda: started.set() or release.wait())
+        started.wait(5)
+
+        for future in [executor.submit(int) for _ in range(2)]:
+            self.assertTrue(future.cancel())
+        release.set()
+
+        self.assertEqual(executor.stats()['queued'], 0)
+        self.assertEqual(executor.submit(int, '7').result(5), 7)
+
+
+class TelegramWebhookTests(TestCase):
+    @override_settings(TELEGRAM_WEBHOOK_SECRET='secret')
+    def test_webhook_under_wsgi_is_unavailable(self):
+        response = self.client.post(reverse('telegram_webhook'), '{"update_id": 1}', content_type='application/json',
+                                    headers={'X-Telegram-Bot-Api-Secret-Token': 'secret'})
+
+        self.assertEqual(response.status_code, 503)
+
+    def test_lifespan_shutdown_stops_the_webhook_bot(self):
+        from farmbuddy_web.asgi import application
+
+        messages = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+        sent = []
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        with mock.patch('chat.telegram_bot.stop_webhook_application') as stop:
+            asyncio.run(application({'type': 'lifespan'}, receive, send))
+
+        stop.assert_awaited_once()
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+
+class ModelRegistryTests(TestCase):
+    def test_concurrent_requests_load_a_model_once(self):
+        registry = ModelRegistry('test')
+        loads = []
+
+        def loader():
+            loads.append(1)
+            time.sleep(0.05)  # every thread asks while the first load is running
+            return object()
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.get('ha', loader))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(len(results), 8)
+        self.assertEqual(len({id(model) for model in results}), 1)
+
+    def test_model_in_use_is_not_evicted(self):
+        registry = ModelRegistry('test', max_bytes=100, size_fn=lambda model: 80)
+
+        with registry.acquire('ha', object):
+            registry.get('yo', object)  # over budget, but 'ha' is running and 'yo' was just asked for
+            self.assertIn('ha', registry)
+            self.assertIn('yo', registry)
+
+        # Released: the least recently used model goes
+        self.assertNotIn('ha', registry)
+        self.assertIn('yo', registry)
+
+    def test_failed_load_is_retried(self):
+        registry = ModelRegistry('test')
+
+        def broken():
+            raise OSError("download failed")
+
+        with self.assertRaises(OSError):
+            registry.get('ha', broken)
+        self.assertEqual(registry.get('ha', lambda: 'model'), 'model')
+
+
+@override_settings(RATE_LIMIT_ENABLED=True, RATE_LIMIT_MAX_WAIT=1)
+class RateLimiterTests(TestCase):
+    LIMITS = {
+        'chat': {'per_minute': 60, 'burst': 2, 'action': 'degrade'},
+        'vision': {'per_minute': 60, 'burst': 1, 'action': 'reject'},
+        'stt': {'per_minute': 6000, 'burst': 1, 'action': 'queue'},  # a token every 10ms
+        'tts': {'per_minute': 6, 'burst': 1, 'action': 'queue'},  # one every 10s: longer than the wait
+    }
+
+    def setUp(self):
+        self.limiter = RateLimiter(path=os.path.join(_temporary_directory(self), 'ratelimit.sqlite3'),
+                                   limits=self.LIMITS)
+
+    def test_burst_then_degrade(self):
+        keys = [('session:a', 1)]
+
+        self.assertEqual([self.limiter.check(keys, 'chat').action for _ in range(3)], [ALLOW, ALLOW, DEGRADE])
+        self.assertGreater(self.limiter.check(keys, 'chat').retry_after, 0)
+        # Other clients have their own buckets
+        self.assertEqual(self.limiter.check([('session:b', 1)], 'chat').action, ALLOW)
+
+    def test_reject_action(self):
+        keys = [('session:a', 1)]
+
+        self.assertEqual(self.limiter.check(keys, 'vision').action, ALLOW)
+        self.assertEqual(self.limiter.check(keys, 'vision').action, REJECT)
+
+    def test_queue_waits_for_a_token_or_rejects(self):
+        keys = [('session:a', 1)]
+        self.limiter.check(keys, 'stt')
+        self.assertEqual(self.limiter.check(keys, 'stt').action, ALLOW)  # after a short wait
+
+        self.limiter.check(keys, 'tts')
+        self.assertEqual(self.limiter.check(keys, 'tts').action, REJECT)
+
+    def test_tokens_are_refunded_when_another_bucket_is_empty(self):
+        session, shared_ip = ('session:a', 1), ('ip:1.2.3.4', 1)
+        self.limiter.check([('session:b', 1), shared_ip], 'chat')
+        self.limiter.check([('session:c', 1), shared_ip], 'chat')
+
+        self.assertEqual(self.limiter.check([session, shared_ip], 'chat').action, DEGRADE)
+        # The session's token taken before the IP bucket refused was given back
+        self.assertEqual([self.limiter.check([session], 'chat').action for _ in range(3)], [ALLOW, ALLOW, DEGRADE])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class MessageBufferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Only explicit flushes: the background thread would write on its own connection
+        self.buffer = MessageBuffer(enabled=True, flush_interval=3600, flush_batch=1000)
+        self.addCleanup(self.buffer.close)
+        self.addCleanup(self.buffer.flush)  # first, here: nothing left for the thread when it stops
+        self.conversation = Conversation.objects.create(session_key='s' * 32)
+        Message.objects.create(conversation=self.conversation, role='user', content="Saved earlier")
+
+    def test_queued_messages_are_read_back_before_the_flush(self):
+        self.buffer.add(self.conversation, 'user', "When do I harvest?")
+        self.buffer.add(self.conversation, 'assistant', "After 90 days")
+
+        self.assertEqual(self.conversation.messages.count(), 1)
+        self.assertEqual([row['content'] for row in self.buffer.history(self.conversation)],
+                         ["Saved earlier", "When do I harvest?", "After 90 days"])
+        self.assertEqual(self.buffer.count(self.conversation), 3)
+
+    def test_flush_writes_the_batch_and_invalidates_cached_pages(self):
+        before = page_cache.touch_messages(self.conversation.id)
+        self.buffer.add(self.conversation, 'user', "When do I harvest?")
+
+        self.assertEqual(self.buffer.flush(), 1)
+
+        self.assertEqual(list(self.conversation.messages.order_by('created_at').values_list('content', flat=True)),
+                         ["Saved earlier", "When do I harvest?"])
+        self.assertNotEqual(page_cache.messages_version(self.conversation.id), before)
+        self.assertEqual(self.buffer.count(self.conversation), 2)
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_sync_flushes_only_when_the_conversation_has_queued_messages(self):
+        other = Conversation.objects.create(session_key='s' * 32)
+        self.buffer.add(other, 'user', "Elsewhere")
+
+        self.buffer.sync(self.conversation.id)
+        self.assertFalse(other.messages.exists())
+        self.buffer.sync(other.id)
+        self.assertTrue(other.messages.exists())
+
+    def test_discarded_conversation_is_not_written(self):
+        self.buffer.add(self.conversation, 'user', "Deleted with its chat")
+
+        self.buffer.discard(self.conversation.id)
+
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.conversation.messages.count(), 1)
+
+    def test_disabled_buffer_saves_immediately(self):
+        message = MessageBuffer(enabled=False).add(self.conversation, 'user', "Right away")
+
+        self.assertIsNotNone(message.id)
+        self.assertEqual(self.conversation.messages.count(), 2)
+
+
+class SessionStoreTests(TestCase):
+    def store(self, **kwargs):
+        # Only explicit flushes: the background thread would write on its own connection
+        store = SessionStore(flush_interval=3600, flush_batch=1000, **kwargs)
+        self.addCleanup(store.close)
+        self.addCleanup(store.flush)  # first, here: nothing left for the thread when it stops
+        return store
+
+    def test_round_trip_through_the_database(self):
+        store = self.store()
+        store.update(42, store.get(42), location={'lat': 9.06, 'lon': 7.49})
+
+        self.assertFalse(TelegramSession.objects.filter(chat_id=42).exists())
+        self.assertEqual(store.flush(), 1)
+
+        self.assertEqual(self.store().get(42), {'location': {'lat': 9.06, 'lon': 7.49}})
+
+    def test_later_flush_updates_the_row(self):
+        store = self.store()
+        session = store.update(42, store.get(42), location={'lat': 9.06, 'lon': 7.49})
+        store.flush()
+        store.update(42, session, pending_forecast=True)
+        store.flush()
+
+        self.assertEqual(TelegramSession.objects.get(chat_id=42).data,
+                         {'location': {'lat': 9.06, 'lon': 7.49}, 'pending_forecast': True})
+
+    def test_evicted_chat_keeps_unsaved_changes(self):
+        store = self.store(max_entries=1)
+        store.update(1, store.get(1), location={'lat': 1, 'lon': 1})
+        store.update(2, store.get(2), location={'lat': 2, 'lon': 2})  # pushes chat 1 out of memory
+
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.get(1), {'location': {'lat': 1, 'lon': 1}})
+
+    def test_unknown_chat_starts_empty(self):
+        self.assertEqual(self.store().get(7), {})
+
+
+class ImageHashTests(TestCase):
+    def photo(self, seed):
+        # Smooth random field: like a photo, a small resize or re-encode keeps its gradients
+        rng = np.random.default_rng(seed)
+        return Image.fromarray(rng.integers(0, 256, (12, 12, 3), dtype=np.uint8)).resize((480, 480))
+
+    def distance(self, a, b):
+        return bin(a ^ b).count('1')
+
+    def test_recompressed_and_resized_copy_is_close(self):
+        original = self.photo(1)
+        jpeg = io.BytesIO()
+        original.resize((300, 300)).save(jpeg, 'JPEG', quality=40)
+        copy = Image.open(io.BytesIO(jpeg.getvalue()))
+
+        self.assertLessEqual(self.distance(dhash(original), dhash(copy)), 6)
+        self.assertGreater(self.distance(dhash(original), dhash(self.photo(2))), 12)
+
+    def test_signed_storage_round_trip(self):
+        for value in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+            self.assertTrue(-(1 << 63) <= to_signed(value) < (1 << 63))
+            self.assertEqual(to_unsigned(to_signed(value)), value)
+
+    def test_hamming_distances(self):
+        values = [0, (1 << 64) - 1, 0x0F0F, 1 << 63]
+        distances = hamming_distances(np.array(values, dtype=np.uint64), 0xFF)
+
+        self.assertEqual([int(d) for d in distances], [self.distance(v, 0xFF) for v in values])
+
+    def test_index_finds_the_nearest_hash_within_the_distance(self):
+        index = HashIndex(capacity=2)
+        self.assertIsNone(index.nearest(0, 64))
+        index.add(1, to_signed(0xFFFF000000000000))  # stored signed, as in ImageDiagnosis
+        index.add_many([2, 3, 4], [0b1111, 0b0111, to_signed(1 << 63)])  # grows past capacity
+
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index.nearest(0b0011, 2), (3, 1))
+        self.assertEqual(index.nearest(0xFFFF000000000001, 2), (1, 1))
+        self.assertIsNone(index.nearest(0xF0F0F0F0, 3))
@@ -0,0 +1,92 @@
+"""
+Streaming upload handler for plant photos
+
+Image uploads are checked while the request body is still arriving: format
+and dimensions are sniffed from the header bytes and oversize or invalid
+files abort the upload; the rest of the body is read and discarded (not
+buffered) so the client still receives the JSON error response.
+Accepted files stay in memory, capped at MAX_IMAGE_BYTES.
+"""
+import io
+
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers, StopUpload
+
+from utils.image_processing import MAX_IMAGE_BYTES, check_image_header, sniff_image_header
+
+# Give up on header sniffing after this many bytes (large EXIF blocks come first in JPEGs)
+MAX_HEADER_BYTES = 256 * 1024
+# Multipart framing and small form fields on top of the image itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class ImageUploadHandler(FileUploadHandler):
+    def __init__(self, request=None, field_name='image', max_size=MAX_IMAGE_BYTES):
+        super().__init__(request)
+        self.image_field = field_name
+        self.max_size = max_size
+        self.error = None
+        self.content_length = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.content_length = content_length
+
+    def reject(self, message):
+        self.error = message
+        # No connection reset: many servers would drop the connection before the 400 reaches the browser
+        raise StopUpload(connection_reset=False)
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.active = field_name == self.image_field
+        if not self.active:
+            return
+
+        if self.content_length and self.content_length > self.max_size + MULTIPART_OVERHEAD:
+            self.reject(f"Image too large. Maximum size is 5MB, your file is {self.content_length / (1024*1024):.1f}MB")
+
+        self.file = io.BytesIO()
+        self.header = None
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return None
+
+        if start + len(raw_data) > self.max_size:
+            self.reject("Image too large. Maximum size is 5MB")
+        self.file.write(raw_data)
+
+        if self.header is None:
+            self._sniff(final=False)
+        return None
+
+    def _sniff(self, final):
+        data = self.file.getvalue()
+        self.header = sniff_image_header(data)
+        if self.header is None:
+            if final or len(data) >= MAX_HEADER_BYTES:
+                self.reject("Invalid image file")
+            return
+        is_valid, error_msg = check_image_header(*self.header)
+        if not is_valid:
+            self.reject(error_msg)
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        if self.header is None:
+            self._sniff(final=True)
+
+        self.file.seek(0)
+        uploaded = InMemoryUploadedFile(
+            file=self.file,
+            field_name=self.field_name,
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+        )
+        uploaded.image_format, uploaded.image_size = self.header
+        return uploaded
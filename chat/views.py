@@ -1,124 +1,283 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods
-from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_http_methods
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+import hashlib
 import json
 import sys
 import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import partial
 
 # Add parent directory to path to import utils
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.gemini_api import ask_gemini
 from utils.weather_api import get_weather, get_forecast, format_weather_for_ai, format_forecast_for_ai
+from utils.model_registry import tts_models, stt_models, classifier_models
+from utils.executors import llm_executor, audio_executor, weather_executor
 
+from . import page_cache
+from .archive import conversation_archive
+from .conversation_service import conversation_service
 from .models import Conversation, Message
+from .diagnosis_cache import diagnosis_cache
+from .message_buffer import message_buffer
+from .upload_handlers import ImageUploadHandler
+from .media_storage import THUMBNAIL_FOLDER, store_content_addressed
+from .search import search_messages
+from .rate_limit import ALLOW, DEGRADE, rate_limiter, request_keys, rate_limited_response
+from . import answer_cache
 
 
+def _session_key(request):
+    """The browser's session key, created on first visit. Conversations belong to it."""
+    if not request.session.session_key:
+        request.session.create()
+    return request.session.session_key
+
+
+def _session_conversations(request):
+    return Conversation.objects.filter(session_key=_session_key(request))
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _message_cursor(message):
+    """Opaque (created_at, id) position of a message: '<microseconds>-<id>'"""
+    return f"{(message.created_at - _EPOCH) // timedelta(microseconds=1)}-{message.id}"
+
+
+def _parse_cursor(value):
+    """Inverse of _message_cursor. Returns an unsaved Message carrying created_at and id, or None."""
+    try:
+        micros, message_id = (int(part) for part in value.split('-'))
+    except (AttributeError, ValueError):
+        return None
+    return Message(id=message_id, created_at=_EPOCH + timedelta(microseconds=micros))
+
+
+def _message_page(conversation, before=None, limit=None):
+    """
+    Newest `limit` messages of a conversation older than `before` (anything
+    with created_at and id). Keyset on (created_at, id), so deep pages cost
+    the same as the first.
+    Returns: (messages oldest first, has_more)
+    """
+    limit = limit or settings.CHAT_MESSAGE_PAGE_SIZE
+    messages = conversation.messages.order_by('-created_at', '-id')
+    if before is not None:
+        messages = messages.filter(Q(created_at__lt=before.created_at) |
+                                   Q(created_at=before.created_at, id__lt=before.id))
+    page = list(messages[:limit + 1])
+    return page[:limit][::-1], len(page) > limit
+
+
+class _LatestPage:
+    """The conversation's latest message page, only queried on a fragment cache miss"""
+
+    def __init__(self, conversation):
+        self.conversation = conversation
+
+    @cached_property
+    def _page(self):
+        conversation_archive.restore(self.conversation)
+        message_buffer.sync(self.conversation.id)
+        return _message_page(self.conversation)
+
+    @property
+    def messages(self):
+        return self._page[0]
+
+    @property
+    def history_cursor(self):
+        messages, has_more = self._page
+        return _message_cursor(messages[0]) if has_more else ''
+
+
+def _adopt_legacy_conversation(conversation_id, session_key):
+    """
+    Give a conversation from before session scoping (no session_key) to the
+    session whose cookie already pointed at it. Never by URL alone: ids are
+    sequential, so anyone could walk them. Returns True if adopted.
+    """
+    if Conversation.objects.filter(id=conversation_id, session_key__isnull=True).update(session_key=session_key):
+        page_cache.touch_sidebar(session_key)
+        return True
+    return False
+
+
+def _index_etag(request, conversation_id=None):
+    conversation_id = conversation_id or request.session.get('conversation_id')
+    if not conversation_id or not request.session.session_key:
+        return None
+    return page_cache.page_etag(request.session.session_key, conversation_id,
+                                request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''))
+
+
+@gzip_page
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_index_etag)
 def index(request, conversation_id=None):
-    """Main chat interface"""
+    """Main chat interface (304 when nothing on the page changed since the browser's copy)"""
+    session_key = _session_key(request)
+    conversations = _session_conversations(request)
+
     # If specific conversation requested via URL
     if conversation_id:
+        if str(request.session.get('conversation_id')) == str(conversation_id):
+            _adopt_legacy_conversation(conversation_id, session_key)
         try:
-            current_conversation = Conversation.objects.get(id=conversation_id)
+            current_conversation = conversations.get(id=conversation_id)
             request.session['conversation_id'] = current_conversation.id
         except Conversation.DoesNotExist:
             return redirect('index')
     else:
         # Get or create current conversation from session
+        current_conversation = None
         session_conv_id = request.session.get('conversation_id')
         if session_conv_id:
-            try:
-                current_conversation = Conversation.objects.get(id=session_conv_id)
-            except Conversation.DoesNotExist:
-                # Fallback to latest conversation
-                latest = Conversation.objects.order_by('-updated_at').first()
-                if latest:
-                    current_conversation = latest
-                else:
-                    current_conversation = Conversation.objects.create()
-                request.session['conversation_id'] = current_conversation.id
-        else:
-            # Try to get latest conversation
-            latest = Conversation.objects.order_by('-updated_at').first()
-            if latest:
-                current_conversation = latest
-            else:
-                current_conversation = Conversation.objects.create()
+            current_conversation = conversations.filter(id=session_conv_id).first()
+            if current_conversation is None and _adopt_legacy_conversation(session_conv_id, session_key):
+                current_conversation = conversations.filter(id=session_conv_id).first()
+        if current_conversation is None:
+            # Fallback to this session's latest conversation
+            current_conversation = conversations.order_by('-updated_at').first()
+            if current_conversation is None:
+                current_conversation = Conversation.objects.create(session_key=session_key)
+                page_cache.touch_sidebar(session_key)
             request.session['conversation_id'] = current_conversation.id
     
-    # Get messages for current conversation
-    messages = current_conversation.messages.all()
-    
-    # Get all conversations for sidebar (ordered by updated_at)
-    conversations = Conversation.objects.all().order_by('-updated_at')[:20]
-    
+    # Both are lazy: the template caches the sidebar and message list as fragments
+    # (keyed by page_cache versions) and only queries on a miss.
+    # Only the latest page of messages; chat.js loads earlier ones as the user scrolls up.
+    sidebar_version, messages_version = page_cache.versions(session_key, current_conversation.id)
     context = {
         'current_conversation': current_conversation,
-        'messages': messages,
-        'conversations': conversations,
+        'page': _LatestPage(current_conversation),
+        'conversations': conversations.order_by('-updated_at').values('id', 'title')[:20],
+        'session_key': session_key,
+        'sidebar_version': sidebar_version,
+        'messages_version': messages_version,
     }
     
     return render(request, 'chat/index.html', context)
 
 
+SHELL_ASSETS = ['css/chat.css', 'js/marked.min.js', 'js/stream_render.js', 'js/chat.js']
+
+
+def _shell_version():
+    """Changes whenever a shell asset does, so browsers install the new worker and its cache"""
+    manifest_hash = getattr(staticfiles_storage, 'manifest_hash', '')
+    if manifest_hash:
+        return manifest_hash
+    # DEBUG / no manifest: the URLs are unhashed, so the files themselves decide
+    digest = hashlib.sha1()
+    for name in SHELL_ASSETS:
+        path = finders.find(name)
+        if path:
+            stat = os.stat(path)
+            digest.update(f"{name}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+    return f"dev-{digest.hexdigest()[:12]}"
+
+
+@require_http_methods(["GET"])
+def service_worker(request):
+    """Offline service worker (chat/sw.js), served from the site root so it controls every chat page"""
+    context = {
+        'version': _shell_version(),
+        'shell': [static(name) for name in SHELL_ASSETS],
+    }
+    response = render(request, 'chat/sw.js', context, content_type='application/javascript')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
 @require_http_methods(["POST"])
 def send_message(request):
     """Handle sending a message and getting AI response"""
     try:
         data = json.loads(request.body)
         user_message = data.get('message', '').strip()
-        language = data.get('language', 'en')
         
         if not user_message:
             return JsonResponse({'success': False, 'error': 'Empty message'})
         
-        # Get current conversation
-        conversation_id = request.session.get('conversation_id')
-        conversation = Conversation.objects.get(id=conversation_id)
+        decision = rate_limiter.check(request_keys(request), 'chat')
+        if decision.action not in (ALLOW, DEGRADE):
+            return rate_limited_response(decision)
         
-        # Save user message
-        Message.objects.create(
-            conversation=conversation,
-            role='user',
-            content=user_message
-        )
+        # The page's conversation (messages queued offline may be sent after the user switched)
+        conversation_id = data.get('conversation_id') or request.session.get('conversation_id')
+        conversation = _session_conversations(request).get(id=conversation_id)
+        
+        # The page's language selector wins; it is remembered with the conversation
+        context = conversation_service.context(conversation)
+        language = data.get('language') or context['language'] or 'en'
+        conversation_service.set_context(conversation, language=language)
+        
+        # Over the limit: no Gemini call, only a recent answer to the same question
+        cached_answer = None
+        if not decision.allowed:
+            cached_answer = answer_cache.lookup(user_message, language, conversation.id)
+            if cached_answer is None:
+                return rate_limited_response(decision)
+        
+        # Save user message (queued when write-behind is on)
+        conversation_service.append(conversation, 'user', user_message)
         
         from django.http import StreamingHttpResponse
 
-        # Get conversation history for context
-        messages_history = list(conversation.messages.all().values('role', 'content'))
+        # Recent history for context
+        window = conversation_service.window(conversation)
+        first_exchange = len(window) == 1
         
         # Generator for streaming response
         def response_generator():
             full_response = ""
             try:
-                weather_context = request.session.get('weather_context')
+                weather_context = context['weather_context'] or request.session.get('weather_context')
                 # Request streaming from Gemini
-                stream = ask_gemini(messages_history, weather_context=weather_context, stream=True, language=language)
+                if cached_answer is not None:
+                    stream = [cached_answer]
+                else:
+                    stream = ask_gemini(window, weather_context=weather_context, stream=True, language=language)
                 
                 for chunk in stream:
                     full_response += chunk
                     # Yield chunk as JSON line (NDJSON style or simple data)
                     yield json.dumps({'chunk': chunk}) + "\n"
                 
-                # Save full response to DB after streaming is complete
-                Message.objects.create(
-                    conversation=conversation,
-                    role='assistant',
-                    content=full_response
-                )
+                # Save full response after streaming is complete
+                conversation_service.append(conversation, 'assistant', full_response)
+                if cached_answer is None:
+                    # Shared only when it depends on nothing but the question
+                    personal = not first_exchange or weather_context
+                    answer_cache.remember(user_message, language, full_response,
+                                          conversation.id if personal else None)
                 
                 # Signal completion
                 yield json.dumps({'success': True, 'full_text': full_response}) + "\n"
                 
                 # Update title in background if needed (logic moved here to run after response)
-                if conversation.messages.count() == 2:
+                if first_exchange:
                      def update_title_background(conv_id, text):
                         try:
                             from utils.gemini_api import summarize_title
                             c = Conversation.objects.get(id=conv_id)
                             c.title = summarize_title(text)
-                            c.save()
+                            # Only the title: language/weather_context may have changed since the get()
+                            c.save(update_fields=['title', 'updated_at'])
+                            page_cache.touch_sidebar(c.session_key)
                         except Exception as e:
                             print(f"Error updating title: {e}")
 
@@ -141,24 +300,86 @@ def send_message(request):
         }, status=500)
 
 
+@require_http_methods(["GET"])
+def message_history(request, conversation_id):
+    """
+    Earlier messages of a conversation, a page at a time.
+    ?before=<cursor> (from the page or the previous response), ?limit=<n>
+    """
+    conversation = get_object_or_404(_session_conversations(request), id=conversation_id)
+    before = _parse_cursor(request.GET.get('before'))
+    if before is None:
+        return JsonResponse({'success': False, 'error': 'Missing or invalid cursor'}, status=400)
+    try:
+        limit = min(max(1, int(request.GET.get('limit', settings.CHAT_MESSAGE_PAGE_SIZE))), 200)
+    except ValueError:
+        limit = settings.CHAT_MESSAGE_PAGE_SIZE
+
+    conversation_archive.restore(conversation)
+    message_buffer.sync(conversation.id)
+    messages, has_more = _message_page(conversation, before, limit)
+    return JsonResponse({
+        'success': True,
+        'messages': [{
+            'id': message.id,
+            'role': message.role,
+            'content': message.content,
+            'image': message.image.url if message.image else None,
+            'thumbnail': message.thumbnail.url if message.thumbnail else None,
+        } for message in messages],
+        'before': _message_cursor(messages[0]) if has_more else None,
+    })
+
+
+@require_http_methods(["GET"])
+def search(request):
+    """
+    Full-text search over this session's messages, best matches first.
+    ?q=<text>, ?limit=<n>; staff users can add ?all=1 to search every conversation.
+    """
+    query = request.GET.get('q', '').strip()[:200]
+    try:
+        limit = min(max(1, int(request.GET.get('limit', 20))), 50)
+    except ValueError:
+        limit = 20
+    everyone = request.GET.get('all') == '1' and request.user.is_staff
+
+    # Include the messages this session just sent when write-behind is on
+    message_buffer.sync(request.session.get('conversation_id'))
+    results = search_messages(query, session_key=None if everyone else _session_key(request), limit=limit)
+    return JsonResponse({'success': True, 'query': query, 'results': results})
+
+
 @require_http_methods(["POST"])
 def new_conversation(request):
     """Create a new conversation"""
     try:
-        conversation = Conversation.objects.create()
+        conversation = Conversation.objects.create(session_key=_session_key(request))
+        page_cache.touch_sidebar(conversation.session_key)
         request.session['conversation_id'] = conversation.id
         return JsonResponse({'success': True, 'conversation_id': conversation.id})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+@csrf_exempt
 @require_http_methods(["POST"])
 def upload_image(request):
     """Handle plant image upload and analysis"""
+    # Must be installed before anything reads request.POST (CSRF is checked below)
+    upload_handler = ImageUploadHandler(request)
+    request.upload_handlers = [upload_handler]
+    return _upload_image(request, upload_handler)
+
+
+@csrf_protect
+def _upload_image(request, upload_handler):
     try:
         from utils.gemini_api import analyze_plant_image
-        from utils.image_processing import validate_image
-        from django.core.files.storage import default_storage
+        from utils.image_processing import validate_image, preprocess_image
+        
+        if upload_handler.error:
+            return JsonResponse({'success': False, 'error': upload_handler.error}, status=400)
         
         if 'image' not in request.FILES:
             return JsonResponse({'success': False, 'error': 'No image provided'}, status=400)
@@ -170,25 +391,34 @@ def upload_image(request):
         if not is_valid:
             return JsonResponse({'success': False, 'error': error_msg}, status=400)
         
-        # Get current conversation
-        conversation_id = request.session.get('conversation_id')
-        conversation = Conversation.objects.get(id=conversation_id)
+        # The page's conversation (photos queued offline may be sent after the user switched)
+        conversation_id = request.POST.get('conversation_id') or request.session.get('conversation_id')
+        conversation = _session_conversations(request).get(id=conversation_id)
         
         # Get optional text caption
         text_content = request.POST.get('message', '').strip()
         if not text_content:
             text_content = '[Plant image uploaded for analysis]'
             
-        # Save user message with image
-        user_message = Message.objects.create(
-            conversation=conversation,
-            role='user',
-            content=text_content,
-            image=image_file
-        )
+        # Decode once: model payload, resized metadata-free copy and thumbnail for storage
+        prepared = preprocess_image(image_file)
         
-        # Get the saved image path
-        image_path = user_message.image.path
+        # Re-sent or forwarded photos reuse the earlier diagnosis
+        image_hash, cached_diagnosis = diagnosis_cache.lookup(prepared.image)
+        if not cached_diagnosis:
+            decision = rate_limiter.check(request_keys(request), 'vision')
+            if decision.action == DEGRADE:
+                # Over the limit: accept a looser match instead of calling Gemini
+                _, cached_diagnosis = diagnosis_cache.lookup(prepared.image, settings.RATE_LIMIT_DEGRADED_DISTANCE)
+            if not decision.allowed and not cached_diagnosis:
+                return rate_limited_response(decision)
+        
+        # Save user message with image (identical uploads share the same files)
+        user_message = conversation_service.append(
+            conversation, 'user', text_content,
+            image=store_content_addressed(prepared.stored_bytes, 'jpg'),
+            thumbnail=store_content_addressed(prepared.thumbnail_bytes, 'webp', THUMBNAIL_FOLDER)
+        )
         
         from django.http import StreamingHttpResponse
 
@@ -196,26 +426,29 @@ def upload_image(request):
         def vision_response_generator():
             full_response = ""
             try:
-                # Analyze image with Gemini Vision in streaming mode
-                stream = analyze_plant_image(image_path, stream=True)
-                
-                for chunk in stream:
-                    full_response += chunk
-                    yield json.dumps({'chunk': chunk}) + "\n"
+                if cached_diagnosis:
+                    full_response = cached_diagnosis
+                    yield json.dumps({'chunk': cached_diagnosis}) + "\n"
+                else:
+                    # Analyze image with Gemini Vision in streaming mode
+                    stream = analyze_plant_image(prepared, stream=True)
+                    
+                    for chunk in stream:
+                        full_response += chunk
+                        yield json.dumps({'chunk': chunk}) + "\n"
+                    
+                    diagnosis_cache.remember(image_hash, full_response)
                 
-                # Save AI response to DB
-                Message.objects.create(
-                    conversation=conversation,
-                    role='assistant',
-                    content=full_response
-                )
+                # Save AI response
+                conversation_service.append(conversation, 'assistant', full_response)
                 
                 # Signal completion
-                yield json.dumps({'success': True, 'full_text': full_response, 'image_url': user_message.image.url}) + "\n"
+                yield json.dumps({'success': True, 'full_text': full_response, 'image_url': user_message.image.url, 'thumbnail_url': user_message.thumbnail.url}) + "\n"
                 
-                if conversation.messages.count() == 2:
+                if len(conversation_service.window(conversation)) == 2:
                     conversation.title = "Plant Disease Analysis"
-                    conversation.save()
+                    conversation.save(update_fields=['title', 'updated_at'])
+                    page_cache.touch_sidebar(conversation.session_key)
 
             except Exception as e:
                 print(f"Error in vision stream: {e}")
@@ -235,7 +468,7 @@ def upload_image(request):
 def rename_conversation(request, conversation_id):
     """Rename a conversation"""
     try:
-        conversation = get_object_or_404(Conversation, id=conversation_id)
+        conversation = get_object_or_404(_session_conversations(request), id=conversation_id)
         data = json.loads(request.body)
         new_title = data.get('title', '').strip()
         
@@ -243,7 +476,8 @@ def rename_conversation(request, conversation_id):
             return JsonResponse({'success': False, 'error': 'Empty title'}, status=400)
             
         conversation.title = new_title[:200]
-        conversation.save()
+        conversation.save(update_fields=['title', 'updated_at'])
+        page_cache.touch_sidebar(conversation.session_key)
         
         return JsonResponse({'success': True, 'title': conversation.title})
     except Exception as e:
@@ -254,8 +488,13 @@ def rename_conversation(request, conversation_id):
 def delete_conversation(request, conversation_id):
     """Delete a conversation"""
     try:
-        conversation = get_object_or_404(Conversation, id=conversation_id)
+        conversation = get_object_or_404(_session_conversations(request), id=conversation_id)
+        message_buffer.discard(conversation.id)
         conversation.delete()
+        conversation_archive.discard(conversation_id)
+        page_cache.touch_sidebar(conversation.session_key)
+        # SQLite can hand the id to the next new conversation: drop its cached pages and history window
+        page_cache.touch_messages(conversation_id)
         
         # If deleted current conversation, clear session
         if str(request.session.get('conversation_id')) == str(conversation_id):
@@ -285,8 +524,11 @@ def get_weather_data(request):
         
         full_report = f"{current_report}\n\n{forecast_report}"
         
-        # Store in session for use in next chat message
+        # Store for use in the next chat message: the current conversation, and the session for new ones
         request.session['weather_context'] = full_report
+        conversation = _session_conversations(request).filter(id=request.session.get('conversation_id')).first()
+        if conversation is not None:
+            conversation_service.set_context(conversation, weather_context=full_report)
         
         return JsonResponse({
             'success': True, 
@@ -299,59 +541,52 @@ def get_weather_data(request):
 
 @require_http_methods(["POST"])
 def transcribe_audio(request):
-    """Transcribe audio using Gemini"""
+    """Transcribe audio using Gemini (with optional local CPU fallback)"""
     try:
-        from utils.gemini_api import analyze_plant_image # Reuse analyzing logic structure
-        import google.generativeai as genai
+        from utils.gemini_api import transcribe_audio_bytes
+        from utils.audio_processing import compact_audio
+        from utils.speech import LOCAL_STT_FALLBACK, transcribe_local
         
         if 'audio' not in request.FILES:
             return JsonResponse({'success': False, 'error': 'No audio provided'}, status=400)
             
+        decision = rate_limiter.check(request_keys(request), 'stt')
+        if not decision.allowed:
+            return rate_limited_response(decision)
+        
         audio_file = request.FILES['audio']
         language = request.POST.get('language', 'en')
         
-        # Save temp file
-        temp_path = f"temp_{audio_file.name}"
-        with open(temp_path, 'wb+') as destination:
-            for chunk in audio_file.chunks():
-                destination.write(chunk)
-                
+        # Keep everything in memory; no temp files in the working directory
+        audio_bytes = audio_file.read()
+        
+        # Downsample to compact mono Opus before sending
         try:
-            # Upload to Gemini
-            myfile = genai.upload_file(temp_path)
-            model = genai.GenerativeModel("gemini-flash-lite-latest")
-            
-            prompt = f"Transcribe this audio exactly as spoken. The language is likely {language} (Hausa/Igbo/Yoruba/English). Return ONLY the transcription text, no other commentary."
-            
-            result = model.generate_content([myfile, prompt])
-            transcription = result.text.strip()
-            
-            # Cleanup
-            os.remove(temp_path)
-            
-            return JsonResponse({'success': True, 'text': transcription})
-            
-        except Exception as ignored:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            raise ignored
+            payload, mime_type = compact_audio(audio_bytes)
+        except Exception as e:
+            print(f"Audio transcode failed, sending original: {e}")
+            payload, mime_type = audio_bytes, audio_file.content_type or 'audio/webm'
+        
+        try:
+            transcription = transcribe_audio_bytes(payload, mime_type, language=language)
+        except Exception as e:
+            if not LOCAL_STT_FALLBACK:
+                raise
+            print(f"Remote transcription failed, using local STT: {e}")
+            transcription = transcribe_local(audio_bytes, language=language)
+        
+        return JsonResponse({'success': True, 'text': transcription})
 
     except Exception as e:
         try:
-            print(f"Streaming Error: {e}")
+            print(f"Transcription Error: {e}")
         except:
             pass
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
-# Global cache for MMS models
-mms_models = {}
-
 def load_mms_model(lang_code):
-    """Load and cache MMS model for a given language code"""
-    if lang_code in mms_models:
-        return mms_models[lang_code]
-    
+    """Load MMS tokenizer and model for a given language code (uncached)"""
     # Map app codes to MMS codes
     # yo -> yor, ig -> ibo, ha -> hau
     iso_codes = {
@@ -362,16 +597,23 @@ def load_mms_model(lang_code):
     mms_code = iso_codes.get(lang_code, lang_code)
     
     model_id = f"facebook/mms-tts-{mms_code}"
-    try:
-        from transformers import VitsModel, AutoTokenizer
-        print(f"Loading MMS Model: {model_id}...")
-        tokenizer = AutoTokenizer.from_pretrained(model_id)
-        model = VitsModel.from_pretrained(model_id)
-        mms_models[lang_code] = (tokenizer, model)
-        return tokenizer, model
-    except Exception as e:
-        print(f"Error loading MMS model {model_id}: {e}")
-        return None, None
+    from transformers import VitsModel, AutoTokenizer
+    print(f"Loading MMS Model: {model_id}...")
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = VitsModel.from_pretrained(model_id)
+    model.eval()
+    return tokenizer, model
+
+
+@require_http_methods(["GET"])
+def model_status(request):
+    """Report which local models are currently loaded"""
+    return JsonResponse({'success': True, 'registries': [tts_models.stats(), stt_models.stats(), classifier_models.stats()]})
+
+@require_http_methods(["GET"])
+def executor_status(request):
+    """Report queue depth, shed requests and queue/run times of the worker pools"""
+    return JsonResponse({'success': True, 'executors': [llm_executor.stats(), audio_executor.stats(), weather_executor.stats()]})
 
 @require_http_methods(["POST"])
 def speak_text(request):
@@ -379,9 +621,6 @@ def speak_text(request):
     try:
         from django.http import HttpResponse
         import io
-        import torch
-        import scipy.io.wavfile as wav
-        import numpy as np
         
         data = json.loads(request.body)
         text = data.get('text', '').strip()
@@ -390,6 +629,10 @@ def speak_text(request):
         if not text:
             return JsonResponse({'success': False, 'error': 'No text provided'}, status=400)
         
+        decision = rate_limiter.check(request_keys(request), 'tts')
+        if not decision.allowed:
+            return rate_limited_response(decision)
+        
         # Clean text
         clean_text = text.replace('*', '').replace('#', '')
         
@@ -399,42 +642,43 @@ def speak_text(request):
         # Strategy Selection
         if language in ['ha', 'yo']:
             # Use Meta MMS (Native Quality)
-            tokenizer, model = load_mms_model(language)
+            import torch
+            import scipy.io.wavfile as wav
             
-            if tokenizer and model:
-                inputs = tokenizer(clean_text, return_tensors="pt")
-                with torch.no_grad():
-                    output = model(**inputs).waveform
-                
-                # Convert to wav
-                output_np = output.numpy().squeeze()
-                
-                # Write to BytesIO
-                wav.write(audio_fp, model.config.sampling_rate, output_np)
-                audio_fp.seek(0)
-            else:
-                 return JsonResponse({'success': False, 'error': f'Failed to load model for {language}'}, status=500)
+            try:
+                with tts_models.acquire(language, partial(load_mms_model, language)) as (tokenizer, model):
+                    inputs = tokenizer(clean_text, return_tensors="pt")
+                    with torch.no_grad():
+                        output = model(**inputs).waveform
+                    sampling_rate = model.config.sampling_rate
+            except Exception as e:
+                print(f"Error loading MMS model for {language}: {e}")
+                return JsonResponse({'success': False, 'error': f'Failed to load model for {language}'}, status=500)
+            
+            # Convert to wav
+            output_np = output.numpy().squeeze()
+            
+            # Write to BytesIO
+            wav.write(audio_fp, sampling_rate, output_np)
+            audio_fp.seek(0)
         
         else:
             # Igbo or English -> edge-tts (Nigerian English Accent)
-            import asyncio
-            import edge_tts
+            from django.http import StreamingHttpResponse
+            from itertools import chain
+            from utils.tts import stream_edge_tts
             
             content_type = 'audio/mpeg'
             # Use Ezinne for Igbo specifically, Abeo for others
             voice = "en-NG-EzinneNeural" if language == 'ig' else "en-NG-AbeoNeural"
             
-            async def get_edge_audio():
-                communicate = edge_tts.Communicate(clean_text, voice)
-                async for chunk in communicate.stream():
-                    if chunk["type"] == "audio":
-                        audio_fp.write(chunk["data"])
-
             try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                loop.run_until_complete(get_edge_audio())
-                loop.close()
+                # Wait for the first chunk so failures can still fall back to gTTS
+                audio_stream = stream_edge_tts(clean_text, voice)
+                first_chunk = next(audio_stream)
+                response = StreamingHttpResponse(chain([first_chunk], audio_stream), content_type=content_type)
+                response['Content-Disposition'] = 'inline; filename="response.mp3"'
+                return response
             except Exception as e:
                 print(f"EdgeTTS Error: {e}")
                 # Fallback to gTTS if edge-tts fails
@@ -457,3 +701,40 @@ def speak_text(request):
         except:
             pass
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def telegram_webhook(request):
+    """
+    Receive Telegram updates (webhook mode). Needs an ASGI server so the bot's
+    update processing keeps running in the server's event loop.
+    """
+    import hmac
+    from django.core.handlers.asgi import ASGIRequest
+    from django.http import HttpResponse
+
+    secret = settings.TELEGRAM_WEBHOOK_SECRET
+    received = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not secret or not hmac.compare_digest(received, secret):
+        return JsonResponse({'success': False, 'error': 'Forbidden'}, status=403)
+
+    # Under WSGI this view runs in a throwaway event loop per request: queued updates would never be processed
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'success': False, 'error': 'Webhook mode needs an ASGI server'}, status=503)
+
+    from telegram import Update
+    from .telegram_bot import get_webhook_application
+
+    application = await get_webhook_application()
+    if application is None:
+        return JsonResponse({'success': False, 'error': 'Telegram bot is not configured'}, status=503)
+
+    try:
+        update = Update.de_json(json.loads(request.body), application.bot)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid update'}, status=400)
+
+    # Answer right away; the update is processed in the background
+    await application.update_queue.put(update)
+    return HttpResponse(status=200)
@@ -13,4 +13,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'farmbuddy_web.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    """Django, plus the lifespan protocol: on shutdown, stop the webhook bot (chat.telegram_bot)"""
+    if scope['type'] != 'lifespan':
+        return await django_application(scope, receive, send)
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            from chat.telegram_bot import stop_webhook_application
+            await stop_webhook_application()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
@@ -17,6 +17,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 
 import os
+import sys
 from dotenv import load_dotenv
 
 # Load .env file
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',  # static files: hashed names cached for a year, gzip/brotli
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -77,12 +79,51 @@ WSGI_APPLICATION = 'farmbuddy_web.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_PROFILE=sqlite (default): one file, tuned so streaming writers don't lock out readers
+#   (WAL, wait instead of failing on a busy database, writers take the lock up front)
+# DB_PROFILE=postgres: for several web/bot processes; needs `pip install "psycopg[binary,pool]"`
+DB_PROFILE = os.getenv('DB_PROFILE', 'sqlite').lower()
+
+if DB_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'farmbuddy'),
+            'USER': os.getenv('DB_USER', 'farmbuddy'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),  # seconds a connection is reused
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.getenv('DB_POOL', 'False').lower() == 'true':
+        # psycopg connection pool shared by the process's threads (replaces CONN_MAX_AGE)
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX', '20')),
+            'timeout': 10,
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME', str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': {
+                'timeout': 20,  # seconds to wait on a locked database (busy_timeout)
+                'transaction_mode': 'IMMEDIATE',  # no deadlocked read->write upgrades
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    f"PRAGMA mmap_size={int(os.getenv('DB_SQLITE_MMAP_MB', '256')) * 1024 * 1024};"
+                    'PRAGMA cache_size=-20000;'  # 20MB page cache per connection
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+        }
     }
-}
 
 
 # Password validation
@@ -120,6 +161,29 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'  # python manage.py collectstatic
+
+# collectstatic writes content-hashed copies (chat.3f2a1c.js) plus .gz and .br versions.
+# Tests run with DEBUG=False and no collectstatic, where the manifest storage can't resolve
+# {% static %}: they use the files as they are.
+TESTING = sys.argv[1:2] == ['test']
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if TESTING
+                    else 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+}
+
+# Shared by all web processes: cached page fragments and their version tokens (chat.page_cache)
+if os.getenv('REDIS_URL'):
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': os.getenv('REDIS_URL')}}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_DIR', str(BASE_DIR / 'cache')),
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        }
+    }
 
 # Media files (user uploads)
 MEDIA_URL = '/media/'
@@ -128,6 +192,61 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# Increase upload limits (10MB)
+# Upload limits. Plant photos use chat.upload_handlers.ImageUploadHandler (5MB cap);
+# other uploads (voice clips) spill to a temp file above 2.5MB instead of sitting in memory.
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
-FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(2.5 * 1024 * 1024)
+
+# Messages rendered per page of a conversation (older ones are paged in)
+CHAT_MESSAGE_PAGE_SIZE = 50
+
+# Write-behind for web chat messages: queue inserts and write them in batches (chat.message_buffer)
+CHAT_WRITE_BEHIND = os.getenv('CHAT_WRITE_BEHIND', 'False').lower() == 'true'
+CHAT_FLUSH_INTERVAL = 1  # seconds between flushes
+CHAT_FLUSH_BATCH = 200  # flush early once this many messages are queued
+
+# Conversation history shared by the web app and the bot (chat.conversation_service)
+CHAT_HISTORY_WINDOW = 20  # recent messages sent to the model with each question
+CHAT_HISTORY_MAX_CHARS = 4000  # longer messages are cut in that window (stored in full)
+CHAT_HOT_CONVERSATIONS = int(os.getenv('CHAT_HOT_CONVERSATIONS', '5000'))  # history windows kept in memory
+CHAT_HOT_TTL = 30 * 60  # seconds of inactivity before a window leaves memory
+
+# Archive of inactive conversations (python manage.py archive_conversations, chat.archive).
+# Their messages move to a compressed SQLite file; the conversation stays in the sidebar and is restored when opened.
+CHAT_ARCHIVE_DB = os.getenv('CHAT_ARCHIVE_DB', str(BASE_DIR / 'archive.sqlite3'))
+CHAT_ARCHIVE_AFTER_DAYS = int(os.getenv('CHAT_ARCHIVE_AFTER_DAYS', '90'))  # inactivity before a conversation is archived
+
+# Reuse previous plant diagnoses for near-identical photos (perceptual hash)
+DIAGNOSIS_CACHE_ENABLED = os.getenv('DIAGNOSIS_CACHE_ENABLED', 'True').lower() == 'true'
+DIAGNOSIS_CACHE_MAX_DISTANCE = int(os.getenv('DIAGNOSIS_CACHE_MAX_DISTANCE', '6'))  # bits out of 64
+DIAGNOSIS_CACHE_REFRESH = 30  # seconds between picking up other processes' entries
+
+# Telegram bot sessions: in-memory LRU tier in front of the TelegramSession table
+TELEGRAM_SESSION_CACHE_SIZE = int(os.getenv('TELEGRAM_SESSION_CACHE_SIZE', '5000'))  # chats kept in memory
+TELEGRAM_SESSION_TTL = 30 * 60  # seconds of inactivity before a chat leaves memory
+TELEGRAM_SESSION_FLUSH_INTERVAL = 2  # seconds between write-behind flushes
+TELEGRAM_SESSION_FLUSH_BATCH = 200  # flush early once this many chats are dirty
+
+# Telegram update processing (polling and webhook)
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')  # required for /chat/telegram/webhook/
+TELEGRAM_MAX_CONCURRENT_UPDATES = int(os.getenv('TELEGRAM_MAX_CONCURRENT_UPDATES', '32'))  # handlers running at once
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '')  # e.g. a self-hosted Bot API server: http://localhost:8081/bot
+
+# Show bot answers while they are generated by editing a placeholder message
+TELEGRAM_STREAM_REPLIES = os.getenv('TELEGRAM_STREAM_REPLIES', 'True').lower() == 'true'
+TELEGRAM_STREAM_EDIT_INTERVAL = 1.0  # seconds between edits (Telegram rate-limits message edits)
+
+# Per-client token buckets for expensive calls, shared by all processes through a SQLite file.
+# action when a bucket is empty: 'queue' (wait up to RATE_LIMIT_MAX_WAIT), 'degrade' or 'reject'
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+RATE_LIMIT_DB = os.getenv('RATE_LIMIT_DB', str(BASE_DIR / 'ratelimit.sqlite3'))
+RATE_LIMITS = {
+    'chat': {'burst': 10, 'per_minute': 20, 'action': 'queue'},     # degrade: recent answer to the same question
+    'vision': {'burst': 4, 'per_minute': 6, 'action': 'degrade'},   # degrade: looser diagnosis-cache match
+    'tts': {'burst': 10, 'per_minute': 30, 'action': 'reject'},
+    'stt': {'burst': 6, 'per_minute': 15, 'action': 'reject'},
+}
+RATE_LIMIT_MAX_WAIT = 10  # seconds a 'queue' request may wait for a token
+RATE_LIMIT_IP_MULTIPLIER = 5  # IP buckets are this much larger than per-session ones
+RATE_LIMIT_DEGRADED_DISTANCE = 12  # bits: diagnosis-cache match accepted when 'vision' degrades
+ANSWER_CACHE_TTL = 24 * 3600  # seconds a chat answer can be repeated when 'chat' degrades (chat.answer_cache)
@@ -0,0 +1,50 @@
+"""
+Audio processing utilities for speech-to-text
+
+Everything here works on in-memory bytes: ffmpeg is driven through stdin/stdout
+pipes so no temporary files are written to disk.
+"""
+import subprocess
+
+import numpy as np
+
+# Speech models (Gemini, Whisper, MMS) all work well at 16kHz mono
+TARGET_SAMPLE_RATE = 16000
+# Opus at 24kbps keeps speech intelligible at ~3KB per second of audio
+COMPACT_BITRATE = "24k"
+FFMPEG_TIMEOUT = 60  # seconds
+
+
+def _run_ffmpeg(data, output_args):
+    """Pipe `data` through ffmpeg and return its stdout bytes"""
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0", *output_args, "pipe:1"]
+    try:
+        result = subprocess.run(cmd, input=data, capture_output=True, timeout=FFMPEG_TIMEOUT, check=True)
+    except FileNotFoundError:
+        raise Exception("FFmpeg is not installed or not on PATH")
+    except subprocess.CalledProcessError as e:
+        raise Exception(f"FFmpeg could not decode audio: {e.stderr.decode(errors='ignore').strip()}")
+    return result.stdout
+
+
+def compact_audio(data, sample_rate=TARGET_SAMPLE_RATE, bitrate=COMPACT_BITRATE):
+    """
+    Transcode any audio container to mono Opus/OGG at `sample_rate`.
+    Returns: (audio bytes, mime type)
+    """
+    output = _run_ffmpeg(data, ["-vn", "-ac", "1", "-ar", str(sample_rate),
+                                "-c:a", "libopus", "-b:a", bitrate, "-f", "ogg"])
+    return output, "audio/ogg"
+
+
+def decode_to_samples(data, sample_rate=TARGET_SAMPLE_RATE):
+    """
+    Decode any audio container to mono float32 samples in [-1, 1].
+    Returns: numpy array
+    """
+    pcm = _run_ffmpeg(data, ["-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-c:a", "pcm_s16le"])
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def duration_seconds(samples, sample_rate=TARGET_SAMPLE_RATE):
+    return len(samples) / float(sample_rate)
@@ -0,0 +1,117 @@
+"""
+Named, bounded thread pools for blocking work, one per workload class
+
+Separate pools keep a burst of one kind of work (e.g. CPU-heavy voice
+decoding) from starving another (chat replies waiting on Gemini). Each pool
+has a queue limit: once that many jobs are waiting, new ones are rejected
+with ExecutorBusy so callers can shed load instead of queueing forever.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorBusy(Exception):
+    """Raised when a pool's queue is full"""
+
+    def __init__(self, name):
+        super().__init__(f"The {name} executor is at capacity")
+        self.name = name
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class BoundedExecutor:
+    def __init__(self, name, max_workers, max_queue, samples=1000):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-worker")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._queue_times = deque(maxlen=samples)
+        self._run_times = deque(maxlen=samples)
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule fn(*args, **kwargs). Raises ExecutorBusy when the queue is full."""
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._rejected += 1
+                raise ExecutorBusy(self.name)
+            self._queued += 1
+        ticket = [True]  # still counted in _queued
+        future = self._pool.submit(self._call, ticket, time.perf_counter(), fn, args, kwargs)
+        # A future cancelled while queued (e.g. its awaiting handler was cancelled) never reaches _call
+        future.add_done_callback(lambda _: self._leave_queue(ticket))
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs) from async code"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def _leave_queue(self, ticket):
+        """Take a job out of the queue count, once (from _call or its future's done callback)"""
+        with self._lock:
+            if ticket[0]:
+                ticket[0] = False
+                self._queued -= 1
+
+    def _call(self, ticket, submitted_at, fn, args, kwargs):
+        started = time.perf_counter()
+        self._leave_queue(ticket)
+        with self._lock:
+            self._running += 1
+            self._queue_times.append(started - submitted_at)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._run_times.append(time.perf_counter() - started)
+
+    def stats(self):
+        with self._lock:
+            queue_times = list(self._queue_times)
+            run_times = list(self._run_times)
+            stats = {
+                'name': self.name,
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'queued': self._queued,
+                'running': self._running,
+                'completed': self._completed,
+                'rejected': self._rejected,
+            }
+        for label, values in (('queue', queue_times), ('run', run_times)):
+            for pct in (50, 95):
+                value = _percentile(values, pct)
+                stats[f'{label}_p{pct}_ms'] = None if value is None else round(value * 1000, 1)
+        return stats
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, str(default)))
+
+
+# Process-wide pools, one per workload class
+llm_executor = BoundedExecutor(
+    "llm", _env_int("EXECUTOR_LLM_WORKERS", 16), _env_int("EXECUTOR_LLM_QUEUE", 64))
+audio_executor = BoundedExecutor(
+    "audio", _env_int("EXECUTOR_AUDIO_WORKERS", max(1, (os.cpu_count() or 2) // 2)), _env_int("EXECUTOR_AUDIO_QUEUE", 8))
+weather_executor = BoundedExecutor(
+    "weather", _env_int("EXECUTOR_WEATHER_WORKERS", 8), _env_int("EXECUTOR_WEATHER_QUEUE", 32))
@@ -89,18 +89,30 @@ def ask_gemini(messages_history: list, weather_context=None, stream=False, langu
             return "I'm sorry, I cannot answer that request due to safety guidelines."
 
 
-def analyze_plant_image(image_path, conversation_history=None, stream=False):
+def analyze_plant_image(image, conversation_history=None, stream=False, use_classifier=True):
     """
     Analyze a plant image for disease detection using Gemini Vision
-    image_path: Path to the uploaded plant image
+    image: PreparedImage from utils.image_processing, or a path/bytes/file to preprocess
     conversation_history: Optional conversation context
     stream: If True, returns a generator
+    use_classifier: Run the optional local pre-classifier first (see utils.plant_classifier)
     """
-    from PIL import Image
+    from utils.image_processing import PreparedImage, preprocess_image
+    from utils.plant_classifier import classify_plant, format_hints, templated_answer
     
     try:
-        # Load the image
-        img = Image.open(image_path)
+        # Decode, orient and downsize once; send a compact JPEG payload
+        prepared = image if isinstance(image, PreparedImage) else preprocess_image(image)
+        img = prepared.model_part
+        
+        # Confident local predictions for common cases skip the vision model entirely
+        predictions = classify_plant(prepared.image) if use_classifier else None
+        answer = templated_answer(predictions)
+        if answer:
+            if stream:
+                def template_gen(): yield answer
+                return template_gen()
+            return answer
         
         # Create prompt for plant disease analysis
         prompt = """You are FarmBuddy, an expert agricultural advisor specializing in plant disease diagnosis.
@@ -114,6 +126,10 @@ Analyze this plant leaf image and provide:
 
 Use simple English and be practical. If you cannot identify a specific disease, explain what you observe and suggest consulting a local agricultural extension agent."""
 
+        hints = format_hints(predictions)
+        if hints:
+            prompt += f"\n\n{hints}"
+
         response = model.generate_content([prompt, img], stream=stream)
         
         if stream:
@@ -136,6 +152,32 @@ Use simple English and be practical. If you cannot identify a specific disease,
         return f"Error analyzing image: {str(e)}"
 
 
+# Gemini rejects inline request payloads above ~20MB; larger audio goes through the File API
+INLINE_AUDIO_LIMIT = 15 * 1024 * 1024
+
+# Cached client for transcription (no persona system instruction)
+transcription_model = genai.GenerativeModel("gemini-flash-lite-latest")
+
+
+def transcribe_audio_bytes(audio_bytes, mime_type, language='en'):
+    """
+    Transcribe in-memory audio with Gemini
+    audio_bytes: Encoded audio (ideally compact mono Opus, see utils.audio_processing)
+    mime_type: MIME type of audio_bytes, e.g. 'audio/ogg'
+    language: Expected language code ('en', 'ha', 'ig', 'yo')
+    """
+    prompt = f"Transcribe this audio exactly as spoken. The language is likely {language} (Hausa/Igbo/Yoruba/English). Return ONLY the transcription text, no other commentary."
+
+    if len(audio_bytes) <= INLINE_AUDIO_LIMIT:
+        audio_part = {"mime_type": mime_type, "data": audio_bytes}
+    else:
+        import io
+        audio_part = genai.upload_file(io.BytesIO(audio_bytes), mime_type=mime_type)
+
+    result = transcription_model.generate_content([audio_part, prompt])
+    return result.text.strip()
+
+
 def summarize_title(text):
     """
     Generate a short 5-word summary title for a conversation based on the first prompt
@@ -0,0 +1,100 @@
+"""
+Perceptual hashing for near-duplicate image detection
+
+dHash compares neighbouring pixel brightness on a tiny grayscale thumbnail, so
+re-compressed, resized or slightly re-exposed copies of a photo produce hashes
+that differ in only a few bits.
+"""
+import threading
+
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8  # 8x8 gradient grid -> 64-bit hash
+
+# Popcount lookup table for numpy versions without np.bitwise_count
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def dhash(img, hash_size=HASH_SIZE):
+    """
+    Difference hash of a PIL image
+    Returns: unsigned 64-bit int
+    """
+    gray = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def to_signed(value):
+    """Map an unsigned 64-bit hash to the signed range of a BigIntegerField"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def hamming_distances(hashes, value):
+    """Bit distance between every hash in a uint64 array and `value`"""
+    xored = np.bitwise_xor(hashes, np.uint64(value))
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(xored)
+    return _POPCOUNT[xored.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class HashIndex:
+    """
+    Append-only in-memory index of 64-bit hashes (8 bytes per image) with a
+    vectorised linear Hamming scan; hundreds of thousands of entries scan in
+    a few milliseconds.
+    """
+
+    def __init__(self, capacity=1024):
+        self._hashes = np.zeros(capacity, dtype=np.uint64)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def add(self, item_id, value):
+        with self._lock:
+            if self._size == len(self._hashes):
+                self._hashes = np.resize(self._hashes, len(self._hashes) * 2)
+                self._ids = np.resize(self._ids, len(self._ids) * 2)
+            self._hashes[self._size] = np.uint64(to_unsigned(value))
+            self._ids[self._size] = item_id
+            self._size += 1
+
+    def add_many(self, item_ids, values):
+        with self._lock:
+            needed = self._size + len(values)
+            if needed > len(self._hashes):
+                capacity = max(needed, len(self._hashes) * 2)
+                self._hashes = np.resize(self._hashes, capacity)
+                self._ids = np.resize(self._ids, capacity)
+            self._hashes[self._size:needed] = np.array([to_unsigned(v) for v in values], dtype=np.uint64)
+            self._ids[self._size:needed] = np.asarray(item_ids, dtype=np.int64)
+            self._size = needed
+
+    def nearest(self, value, max_distance):
+        """
+        Closest stored hash within `max_distance` bits
+        Returns: (item_id, distance) or None
+        """
+        with self._lock:
+            hashes = self._hashes[:self._size]
+            ids = self._ids[:self._size]
+        if not len(hashes):
+            return None
+        distances = hamming_distances(hashes, to_unsigned(value))
+        best = int(np.argmin(distances))
+        if distances[best] > max_distance:
+            return None
+        return int(ids[best]), int(distances[best])
@@ -6,55 +6,152 @@ import io
 import os
 
 
+MAX_IMAGE_BYTES = 5 * 1024 * 1024  # 5MB
+MAX_IMAGE_PIXELS = 40 * 1000 * 1000  # 40MP, larger photos are rejected before decoding
+ALLOWED_FORMATS = ['JPEG', 'JPG', 'PNG', 'WEBP']
+
+
+def sniff_image_header(data):
+    """
+    Read format and dimensions from the first bytes of an image without decoding pixels
+    Returns: (format, (width, height)) or None if the header is incomplete/unknown
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            return img.format, img.size
+    except Exception:
+        return None
+
+
+def check_image_header(image_format, size):
+    """
+    Validate sniffed header information
+    Returns: (is_valid, error_message)
+    """
+    if not image_format or image_format.upper() not in ALLOWED_FORMATS:
+        return False, f"Invalid format. Allowed formats: {', '.join(ALLOWED_FORMATS)}"
+    width, height = size
+    if width * height > MAX_IMAGE_PIXELS:
+        return False, f"Image dimensions too large ({width}x{height})"
+    return True, None
+
+
 def validate_image(file):
     """
     Validate uploaded image file
     Returns: (is_valid, error_message)
     """
     # Check file size (5MB limit)
-    max_size = 5 * 1024 * 1024  # 5MB
-    if file.size > max_size:
+    if file.size > MAX_IMAGE_BYTES:
         return False, f"Image too large. Maximum size is 5MB, your file is {file.size / (1024*1024):.1f}MB"
     
-    # Check file format
-    allowed_formats = ['JPEG', 'JPG', 'PNG', 'WEBP']
+    # Uploads parsed by ImageUploadHandler already carry their sniffed header
+    image_format = getattr(file, 'image_format', None)
+    image_size = getattr(file, 'image_size', None)
+    if image_format and image_size:
+        return check_image_header(image_format, image_size)
+    
+    # Check file format (reads the header only, pixels are decoded later)
     try:
         img = Image.open(file)
-        if img.format.upper() not in allowed_formats:
-            return False, f"Invalid format. Allowed formats: {', '.join(allowed_formats)}"
+        image_format, image_size = img.format, img.size
         # Do not close img here as it might close the underlying file
         file.seek(0)  # Reset file pointer
-        return True, None
     except Exception as e:
         return False, f"Invalid image file: {str(e)}"
+    return check_image_header(image_format, image_size)
 
 
-def compress_image(image_file, max_size=(1024, 1024), quality=85):
+# Gemini tiles images into 768x768 crops; anything larger only adds upload bytes and tokens
+VISION_IMAGE_SIZE = int(os.getenv("VISION_IMAGE_SIZE", "768"))
+# Size of the copy kept in media/ and shown in the chat history
+STORED_IMAGE_SIZE = int(os.getenv("STORED_IMAGE_SIZE", "1024"))
+# Chat history shows images at most 300px wide
+THUMBNAIL_SIZE = 320
+JPEG_QUALITY = 85
+WEBP_QUALITY = 70
+
+
+class PreparedImage:
+    """Result of preprocess_image: one decode, several encodings"""
+
+    def __init__(self, image, model_bytes, stored_bytes, thumbnail_bytes, original_size, decode_seconds):
+        self.image = image                  # PIL image at VISION_IMAGE_SIZE (RGB)
+        self.model_bytes = model_bytes      # JPEG payload for the vision model
+        self.stored_bytes = stored_bytes    # JPEG copy to keep in storage
+        self.thumbnail_bytes = thumbnail_bytes  # small WebP for the chat history
+        self.original_size = original_size  # (width, height) of the upload
+        self.decode_seconds = decode_seconds
+
+    @property
+    def model_part(self):
+        """Inline content part for Gemini"""
+        return {"mime_type": "image/jpeg", "data": self.model_bytes}
+
+
+def _encode_jpeg(img, quality=JPEG_QUALITY):
+    output = io.BytesIO()
+    # Saving without exif= drops all metadata (GPS, camera info, ...)
+    img.save(output, format='JPEG', quality=quality, optimize=True)
+    return output.getvalue()
+
+
+def encode_webp(img, quality=WEBP_QUALITY):
+    output = io.BytesIO()
+    img.save(output, format='WEBP', quality=quality, method=4)
+    return output.getvalue()
+
+
+def preprocess_image(source, model_size=VISION_IMAGE_SIZE, stored_size=STORED_IMAGE_SIZE, quality=JPEG_QUALITY):
     """
-    Compress image for storage and transmission
-    Returns: compressed image bytes
+    Decode an uploaded image once and produce the model payload and stored copy.
+    source: file path, file-like object or bytes
+    Returns: PreparedImage
     """
+    import time
+    from PIL import ImageOps
+
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    started = time.perf_counter()
     try:
-        # Open image
-        img = Image.open(image_file)
-        
-        # Convert RGBA to RGB if necessary
+        img = Image.open(source)
+        original_size = img.size
+
+        # Let libjpeg decode at a reduced scale (1/2, 1/4, 1/8) when possible
+        largest = max(model_size, stored_size)
+        img.draft('RGB', (largest, largest))
+
+        img = ImageOps.exif_transpose(img)
+
         if img.mode == 'RGBA':
             rgb_img = Image.new('RGB', img.size, (255, 255, 255))
             rgb_img.paste(img, mask=img.split()[3])
             img = rgb_img
-        
-        # Resize if larger than max_size
-        img.thumbnail(max_size, Image.Resampling.LANCZOS)
-        
-        # Compress to bytes
-        output = io.BytesIO()
-        img.save(output, format='JPEG', quality=quality, optimize=True)
-        output.seek(0)
-        
-        return output
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        stored = img.copy()
+        stored.thumbnail((stored_size, stored_size), Image.Resampling.LANCZOS)
+        img.thumbnail((model_size, model_size), Image.Resampling.LANCZOS)
+        thumbnail = img.copy()
+        thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.LANCZOS)
+        decode_seconds = time.perf_counter() - started
     except Exception as e:
-        raise Exception(f"Error compressing image: {str(e)}")
+        raise Exception(f"Error processing image: {str(e)}")
+
+    return PreparedImage(img, _encode_jpeg(img, quality), _encode_jpeg(stored, quality),
+                         encode_webp(thumbnail), original_size, decode_seconds)
+
+
+def compress_image(image_file, max_size=(1024, 1024), quality=85):
+    """
+    Compress image for storage and transmission
+    Returns: compressed image bytes
+    """
+    prepared = preprocess_image(image_file, stored_size=max(max_size), quality=quality)
+    return io.BytesIO(prepared.stored_bytes)
 
 
 def prepare_image_for_gemini(image_path):
@@ -62,8 +159,4 @@ def prepare_image_for_gemini(image_path):
     Prepare image for Gemini Vision API
     Returns: PIL Image object
     """
-    try:
-        img = Image.open(image_path)
-        return img
-    except Exception as e:
-        raise Exception(f"Error loading image: {str(e)}")
+    return preprocess_image(image_path).image
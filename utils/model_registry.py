@@ -0,0 +1,215 @@
+"""
+Shared registry for heavyweight local models (TTS, STT, classifiers, ...)
+
+Models are loaded lazily, at most once per key even under concurrent requests,
+and evicted least-recently-used first when the configured memory budget is
+exceeded. A model that is currently running inference is never evicted.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Default budget for all resident models (bytes). 0 disables the limit.
+DEFAULT_MAX_BYTES = int(os.getenv("MODEL_REGISTRY_MAX_BYTES", str(2 * 1024 ** 3)))
+
+
+def estimate_model_size(obj):
+    """
+    Best-effort estimate of the memory used by a loaded model.
+    Understands torch modules, tuples/lists of them (e.g. (tokenizer, model))
+    and transformers pipelines (sized by their .model).
+    """
+    if obj is None:
+        return 0
+    if isinstance(obj, (tuple, list)):
+        return sum(estimate_model_size(item) for item in obj)
+
+    # A transformers Pipeline has no parameters of its own; its weights are in .model
+    model = getattr(obj, "model", None)
+    if model is not None and not callable(getattr(obj, "parameters", None)):
+        return estimate_model_size(model)
+
+    parameters = getattr(obj, "parameters", None)
+    if callable(parameters):
+        try:
+            size = sum(p.numel() * p.element_size() for p in obj.parameters())
+            buffers = getattr(obj, "buffers", None)
+            if callable(buffers):
+                size += sum(b.numel() * b.element_size() for b in obj.buffers())
+            return size
+        except Exception:
+            return 0
+
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return 0
+
+
+class _Entry:
+    def __init__(self):
+        self.value = None
+        self.size = 0
+        self.refs = 0
+        self.loaded_at = None
+        self.last_used = None
+        self.load_seconds = None
+        self.error = None
+        self.ready = threading.Event()
+
+
+class ModelRegistry:
+    """
+    Thread-safe, size-bounded LRU cache of loaded models.
+
+    Usage:
+        registry = ModelRegistry("tts")
+        with registry.acquire("ha", loader) as model:
+            ...  # model will not be evicted while inside this block
+    """
+
+    def __init__(self, name, max_bytes=None, size_fn=estimate_model_size):
+        self.name = name
+        self.max_bytes = DEFAULT_MAX_BYTES if max_bytes is None else max_bytes
+        self.size_fn = size_fn
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, loader):
+        """
+        Return the model for `key`, loading it with `loader()` if needed.
+        Concurrent callers for the same key wait for a single load.
+        The returned model is not pinned; use acquire() around inference.
+        """
+        entry = self._get_entry(key, loader, pin=False)
+        return entry.value
+
+    @contextmanager
+    def acquire(self, key, loader):
+        """Pin the model for `key` for the duration of the block."""
+        entry = self._get_entry(key, loader, pin=True)
+        try:
+            yield entry.value
+        finally:
+            with self._lock:
+                entry.refs -= 1
+                entry.last_used = time.time()
+                self._evict_locked()
+
+    def _get_entry(self, key, loader, pin):
+        with self._lock:
+            entry = self._entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = _Entry()
+                self._entries[key] = entry
+            else:
+                self._entries.move_to_end(key)
+            if pin:
+                entry.refs += 1
+
+        if owner:
+            self._load(key, entry, loader)
+        else:
+            entry.ready.wait()
+
+        if entry.error is not None:
+            if pin:
+                with self._lock:
+                    entry.refs -= 1
+            raise entry.error
+
+        with self._lock:
+            entry.last_used = time.time()
+        return entry
+
+    def _load(self, key, entry, loader):
+        started = time.perf_counter()
+        try:
+            value = loader()
+            size = self.size_fn(value)
+        except Exception as e:
+            entry.error = e
+            with self._lock:
+                # Drop the failed entry so a later request can retry
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            entry.ready.set()
+            return
+
+        with self._lock:
+            entry.value = value
+            entry.size = size
+            entry.loaded_at = time.time()
+            entry.load_seconds = time.perf_counter() - started
+            self._evict_locked()
+        entry.ready.set()
+
+    def _evict_locked(self):
+        if not self.max_bytes:
+            return
+        total = self._total_bytes_locked()
+        for key in list(self._entries.keys()):
+            if total <= self.max_bytes:
+                break
+            entry = self._entries[key]
+            if entry.refs > 0 or not entry.ready.is_set():
+                continue
+            print(f"[{self.name}] Evicting model {key} ({entry.size / (1024 * 1024):.1f}MB)")
+            del self._entries[key]
+            total -= entry.size
+
+    def _total_bytes_locked(self):
+        return sum(e.size for e in self._entries.values() if e.ready.is_set())
+
+    def evict(self, key):
+        """Remove a model unless it is in use. Returns True if it was removed."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.refs > 0 or not entry.ready.is_set():
+                return False
+            del self._entries[key]
+            return True
+
+    def clear(self):
+        """Drop every model that is not currently in use."""
+        with self._lock:
+            for key in list(self._entries.keys()):
+                entry = self._entries[key]
+                if entry.refs == 0 and entry.ready.is_set():
+                    del self._entries[key]
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry.ready.is_set() and entry.error is None
+
+    def stats(self):
+        """Describe what is loaded, in LRU order (oldest first)."""
+        with self._lock:
+            models = [
+                {
+                    'key': key,
+                    'size_bytes': entry.size,
+                    'in_use': entry.refs,
+                    'loading': not entry.ready.is_set(),
+                    'loaded_at': entry.loaded_at,
+                    'last_used': entry.last_used,
+                    'load_seconds': entry.load_seconds,
+                }
+                for key, entry in self._entries.items()
+            ]
+            return {
+                'name': self.name,
+                'max_bytes': self.max_bytes,
+                'total_bytes': self._total_bytes_locked(),
+                'models': models,
+            }
+
+
+# Process-wide registries, one per model family
+tts_models = ModelRegistry("tts")
+stt_models = ModelRegistry("stt")
+classifier_models = ModelRegistry("classifier")
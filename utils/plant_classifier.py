@@ -0,0 +1,166 @@
+"""
+Optional local plant disease pre-classifier
+
+A small image classifier (ONNX or TorchScript, e.g. a MobileNet trained on
+PlantVillage-style labels) runs on the CPU before the vision model:
+- confident "not a plant" predictions and common diseases get a templated answer
+- otherwise its top-k guesses are passed to Gemini as hints
+
+Disabled unless PLANT_CLASSIFIER_MODEL points at a model file. Labels are read
+from PLANT_CLASSIFIER_LABELS (one per line, in output order).
+"""
+import os
+
+import numpy as np
+from PIL import Image
+
+from utils.model_registry import classifier_models
+
+PLANT_CLASSIFIER_MODEL = os.getenv("PLANT_CLASSIFIER_MODEL", "")
+PLANT_CLASSIFIER_LABELS = os.getenv("PLANT_CLASSIFIER_LABELS", "")
+# Minimum top-1 confidence to answer from a template without calling Gemini
+SHORT_CIRCUIT_CONFIDENCE = float(os.getenv("PLANT_CLASSIFIER_CONFIDENCE", "0.9"))
+# Minimum confidence for a guess to be mentioned to Gemini as a hint
+HINT_CONFIDENCE = 0.15
+INPUT_SIZE = 224
+TOP_K = 3
+
+_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+NOT_A_PLANT_LABELS = {'background', 'background_without_leaves', 'not_a_plant'}
+
+TEMPLATED_ANSWERS = {
+    'not_a_plant': """I could not find a plant leaf in this photo.
+
+Please take a new photo:
+- Hold one affected leaf flat in good daylight
+- Fill most of the picture with the leaf
+- Keep the camera steady so the spots or marks are sharp""",
+
+    'cassava_mosaic_disease': """1. **Disease Identification**: Cassava Mosaic Disease (virus spread by whiteflies and infected cuttings)
+2. **Confidence Level**: High (local classifier)
+3. **Symptoms Observed**: Yellow and green mosaic patches, twisted and shrunken leaves
+4. **Recommended Treatment**: There is no cure for infected plants. Uproot and burn badly affected plants early. Control whiteflies with neem extract spray.
+5. **Prevention Tips**: Plant resistant varieties (e.g. TME 419) and only take cuttings from healthy plants. Keep the farm free of weeds.""",
+
+    'maize_northern_leaf_blight': """1. **Disease Identification**: Northern Leaf Blight of maize (fungus)
+2. **Confidence Level**: High (local classifier)
+3. **Symptoms Observed**: Long grey-green to tan cigar-shaped lesions on the leaves
+4. **Recommended Treatment**: Remove and destroy badly infected lower leaves. If it spreads before tasseling, a mancozeb fungicide spray can help.
+5. **Prevention Tips**: Rotate maize with legumes and plough in crop residues after harvest. Use tolerant varieties and avoid very dense planting.""",
+
+    'tomato_early_blight': """1. **Disease Identification**: Early Blight of tomato (fungus)
+2. **Confidence Level**: High (local classifier)
+3. **Symptoms Observed**: Brown spots with rings like a target, starting on older lower leaves, with yellowing around them
+4. **Recommended Treatment**: Pick off and burn infected leaves. Spray copper-based or mancozeb fungicide every 7-10 days in wet weather.
+5. **Prevention Tips**: Stake plants and mulch so soil does not splash onto leaves. Water at the base in the morning and rotate tomatoes with non-solanaceous crops.""",
+
+    'tomato_late_blight': """1. **Disease Identification**: Late Blight of tomato (water mould)
+2. **Confidence Level**: High (local classifier)
+3. **Symptoms Observed**: Large dark, greasy-looking patches on leaves and stems, white mould underneath in humid weather
+4. **Recommended Treatment**: Act quickly: remove and burn infected plants and spray the rest with a copper or mancozeb fungicide.
+5. **Prevention Tips**: Give plants space for air flow and avoid overhead watering. Do not plant tomatoes next to potatoes.""",
+}
+
+
+def normalize_label(label):
+    """'Tomato___Early_blight' -> 'tomato_early_blight'"""
+    return "_".join(part for part in label.strip().lower().replace(' ', '_').split('_') if part)
+
+
+def _to_input(images):
+    batch = []
+    for img in images:
+        img = img.convert('RGB').resize((INPUT_SIZE, INPUT_SIZE), Image.Resampling.BILINEAR)
+        array = (np.asarray(img, dtype=np.float32) / 255.0 - _MEAN) / _STD
+        batch.append(array.transpose(2, 0, 1))
+    return np.stack(batch).astype(np.float32)
+
+
+def _softmax(logits):
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class PlantClassifier:
+    def __init__(self, model_path, labels):
+        self.model_path = model_path
+        self.labels = labels
+        self.nbytes = os.path.getsize(model_path)  # used by the model registry
+        if model_path.endswith('.onnx'):
+            import onnxruntime as ort
+            self._session = ort.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+            self._input_name = self._session.get_inputs()[0].name
+            self._torch_model = None
+        else:
+            import torch
+            self._torch_model = torch.jit.load(model_path, map_location='cpu').eval()
+            self._session = None
+
+    def _logits(self, batch):
+        if self._session is not None:
+            return self._session.run(None, {self._input_name: batch})[0]
+        import torch
+        with torch.no_grad():
+            return self._torch_model(torch.from_numpy(batch)).numpy()
+
+    def predict(self, images, top_k=TOP_K):
+        """
+        Classify a list of PIL images
+        Returns: list of [(label, confidence), ...] (top_k per image, best first)
+        """
+        probabilities = _softmax(self._logits(_to_input(images)))
+        results = []
+        for row in probabilities:
+            best = np.argsort(row)[::-1][:top_k]
+            results.append([(self.labels[i], float(row[i])) for i in best])
+        return results
+
+
+def load_plant_classifier(model_path=PLANT_CLASSIFIER_MODEL, labels_path=PLANT_CLASSIFIER_LABELS):
+    """Load the classifier and its labels (uncached)"""
+    with open(labels_path, encoding='utf-8') as f:
+        labels = [normalize_label(line) for line in f if line.strip()]
+    print(f"Loading plant classifier: {model_path}...")
+    return PlantClassifier(model_path, labels)
+
+
+def classify_plant(img, top_k=TOP_K):
+    """
+    Run the local classifier on a PIL image
+    Returns: list of (label, confidence) or None if no classifier is configured/available
+    """
+    if not PLANT_CLASSIFIER_MODEL:
+        return None
+    try:
+        with classifier_models.acquire(PLANT_CLASSIFIER_MODEL, load_plant_classifier) as classifier:
+            return classifier.predict([img], top_k=top_k)[0]
+    except Exception as e:
+        print(f"Plant classifier error: {e}")
+        return None
+
+
+def templated_answer(predictions):
+    """Return a ready-made answer when the top prediction is confident and common"""
+    if not predictions:
+        return None
+    label, confidence = predictions[0]
+    if confidence < SHORT_CIRCUIT_CONFIDENCE:
+        return None
+    if label in NOT_A_PLANT_LABELS:
+        return TEMPLATED_ANSWERS['not_a_plant']
+    return TEMPLATED_ANSWERS.get(label)
+
+
+def format_hints(predictions):
+    """Describe the classifier's guesses for the vision prompt"""
+    if not predictions:
+        return None
+    guesses = [f"{label.replace('_', ' ')} ({confidence:.0%})"
+               for label, confidence in predictions if confidence >= HINT_CONFIDENCE]
+    if not guesses:
+        return None
+    return ("A local image classifier suggests: " + ", ".join(guesses) + ". "
+            "Confirm or correct this and keep each section brief.")
@@ -0,0 +1,173 @@
+"""
+Pluggable speech-to-text engines
+
+- local:  Whisper/MMS-class model on the CPU, loaded once through the shared
+          model registry; concurrent requests are batched together
+- gemini: Gemini inline audio transcription
+- google: Google Web Speech API via SpeechRecognition (the default)
+
+All engines take encoded audio bytes (OGG, WebM, WAV, ...) and decode them in
+memory with ffmpeg pipes.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from utils.audio_processing import TARGET_SAMPLE_RATE, compact_audio, decode_to_samples
+from utils.model_registry import stt_models
+
+STT_ENGINE = os.getenv("STT_ENGINE", "google")  # "local" downloads LOCAL_STT_MODEL on first use (needs torch)
+LOCAL_STT_MODEL = os.getenv("LOCAL_STT_MODEL", "openai/whisper-small")
+LOCAL_STT_FALLBACK = os.getenv("LOCAL_STT_FALLBACK", "False").lower() == "true"
+STT_MAX_BATCH = int(os.getenv("STT_MAX_BATCH", "8"))
+STT_BATCH_WAIT = float(os.getenv("STT_BATCH_WAIT", "0.05"))  # seconds to wait for more clips
+
+# App language codes -> Whisper language names (Whisper has no Igbo support)
+WHISPER_LANGUAGES = {
+    'en': 'english',
+    'ha': 'hausa',
+    'yo': 'yoruba',
+}
+
+# App language codes -> BCP-47 tags for the Google Web Speech API
+GOOGLE_LANGUAGES = {
+    'en': 'en-NG',
+    'ha': 'ha-NG',
+    'ig': 'ig-NG',
+    'yo': 'yo-NG',
+}
+
+
+def load_local_stt(model_id=LOCAL_STT_MODEL):
+    """Build a CPU speech-recognition pipeline (uncached)"""
+    from transformers import pipeline
+    print(f"Loading STT Model: {model_id}...")
+    return pipeline("automatic-speech-recognition", model=model_id, device=-1, chunk_length_s=30)
+
+
+class SpeechEngine:
+    """Base class: turn encoded audio bytes into text"""
+    name = None
+
+    def transcribe(self, audio_bytes, language='en'):
+        raise NotImplementedError
+
+
+class LocalSpeechEngine(SpeechEngine):
+    """
+    CPU model shared by every caller in the process.
+    Decoding happens in the calling thread; inference runs on one worker
+    thread that groups concurrent clips of the same language into a batch.
+    """
+    name = 'local'
+
+    def __init__(self, model_id=LOCAL_STT_MODEL, max_batch=STT_MAX_BATCH, max_wait=STT_BATCH_WAIT):
+        self.model_id = model_id
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def transcribe(self, audio_bytes, language='en'):
+        return self.transcribe_samples(decode_to_samples(audio_bytes), language)
+
+    def transcribe_samples(self, samples, language='en'):
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((samples, language, future))
+        return future.result()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="stt-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            by_language = {}
+            for item in batch:
+                by_language.setdefault(item[1], []).append(item)
+
+            for language, items in by_language.items():
+                try:
+                    texts = self._transcribe_batch([samples for samples, _, _ in items], language)
+                    for (_, _, future), text in zip(items, texts):
+                        future.set_result(text)
+                except Exception as e:
+                    for _, _, future in items:
+                        future.set_exception(e)
+
+    def _transcribe_batch(self, batch_samples, language):
+        inputs = [{"raw": samples, "sampling_rate": TARGET_SAMPLE_RATE} for samples in batch_samples]
+
+        kwargs = {"batch_size": len(inputs)}
+        if 'whisper' in self.model_id and language in WHISPER_LANGUAGES:
+            kwargs["generate_kwargs"] = {"language": WHISPER_LANGUAGES[language], "task": "transcribe"}
+
+        with stt_models.acquire(self.model_id, lambda: load_local_stt(self.model_id)) as asr:
+            results = asr(inputs, **kwargs)
+        return [result["text"].strip() for result in results]
+
+
+class GeminiSpeechEngine(SpeechEngine):
+    """Remote transcription with compact inline audio"""
+    name = 'gemini'
+
+    def transcribe(self, audio_bytes, language='en'):
+        from utils.gemini_api import transcribe_audio_bytes
+        payload, mime_type = compact_audio(audio_bytes)
+        return transcribe_audio_bytes(payload, mime_type, language=language)
+
+
+class GoogleWebSpeechEngine(SpeechEngine):
+    """Google Web Speech API through SpeechRecognition"""
+    name = 'google'
+
+    def transcribe(self, audio_bytes, language='en'):
+        import numpy as np
+        import speech_recognition as sr
+
+        samples = decode_to_samples(audio_bytes)
+        pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+        audio_data = sr.AudioData(pcm, TARGET_SAMPLE_RATE, 2)
+        return sr.Recognizer().recognize_google(audio_data, language=GOOGLE_LANGUAGES.get(language, 'en-NG'))
+
+
+ENGINES = {
+    engine.name: engine
+    for engine in (LocalSpeechEngine, GeminiSpeechEngine, GoogleWebSpeechEngine)
+}
+
+_engine_instances = {}
+_engine_lock = threading.Lock()
+
+
+def get_speech_engine(name=None):
+    """Return the shared engine instance for `name` (default: STT_ENGINE)"""
+    name = name or STT_ENGINE
+    if name not in ENGINES:
+        raise ValueError(f"Unknown STT engine '{name}'. Choose from: {', '.join(ENGINES)}")
+    with _engine_lock:
+        if name not in _engine_instances:
+            _engine_instances[name] = ENGINES[name]()
+        return _engine_instances[name]
+
+
+def transcribe_local(audio_bytes, language='en'):
+    """Transcribe encoded audio bytes on the CPU"""
+    return get_speech_engine('local').transcribe(audio_bytes, language)
@@ -0,0 +1,66 @@
+"""
+Edge-TTS streaming on a persistent background event loop
+
+Django views are synchronous, so instead of creating (and tearing down) a new
+event loop for every request we keep one loop alive in a daemon thread and
+hand audio chunks back to the caller through a queue as they arrive.
+"""
+import asyncio
+import queue
+import threading
+
+EDGE_TTS_TIMEOUT = 30  # seconds to wait for the next audio chunk
+
+_loop = None
+_loop_lock = threading.Lock()
+
+_DONE = object()
+
+
+def _get_loop():
+    """Start the shared background loop on first use"""
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="edge-tts-loop", daemon=True)
+            thread.start()
+        return _loop
+
+
+def stream_edge_tts(text, voice):
+    """
+    Synthesize `text` with edge-tts and yield MP3 chunks as they arrive.
+    Exceptions raised by edge-tts are re-raised in the caller's thread.
+    """
+    import edge_tts
+
+    loop = _get_loop()
+    chunks = queue.Queue()
+
+    async def produce():
+        try:
+            # No shared connector: edge-tts wraps it in a ClientSession that owns it and closes it
+            # when the stream ends, and each stream is its own websocket anyway
+            communicate = edge_tts.Communicate(text, voice)
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    chunks.put(chunk["data"])
+        except Exception as e:
+            chunks.put(e)
+        finally:
+            chunks.put(_DONE)
+
+    future = asyncio.run_coroutine_threadsafe(produce(), loop)
+    try:
+        while True:
+            item = chunks.get(timeout=EDGE_TTS_TIMEOUT)
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Stop synthesis if the client went away mid-stream
+        if not future.done():
+            future.cancel()